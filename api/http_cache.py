@@ -0,0 +1,87 @@
+import hashlib
+import functools
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, Tuple
+
+from flask import Response, g, make_response, request
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# A validator returns (version_key, last_modified) computed from cheap queries, or None to skip validation
+Validator = Callable[..., Optional[Tuple[Any, Optional[datetime]]]]
+
+def make_etag(version_key: Any) -> str:
+    """Derive an ETag from a version key such as (count, max_id, max_updated_at)"""
+    return hashlib.sha1(repr(version_key).encode('utf-8')).hexdigest()[:20]
+
+def cache_control_header(max_age: int, private: bool) -> str:
+    """Cache-Control value: shared caches may store public responses, private ones must revalidate"""
+    if private:
+        return 'private, no-cache'
+    if max_age <= 0:
+        return 'public, no-cache'
+    return f'public, max-age={max_age}, s-maxage={max_age}, stale-while-revalidate={max_age}'
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+def _apply_validators(response: Response, etag: str, last_modified: Optional[datetime], cache_control: str):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    vary = {v.strip() for v in response.headers.get('Vary', '').split(',') if v.strip()}
+    vary.update(('Accept', 'Accept-Encoding'))
+    response.headers['Vary'] = ', '.join(sorted(vary))
+
+def conditional(validator: Validator, max_age: int = 60, private: bool = False):
+    """
+    Decorator answering conditional GETs. The validator runs before the view; when the
+    client's If-None-Match or If-Modified-Since still matches, a 304 is returned without
+    calling the view or serializing a body. Successful responses get ETag, Last-Modified
+    and Cache-Control headers. The version key is left in `g.version_key` for response
+    caches beneath, which must key on it so they never serve a body older than its tag.
+    """
+    cache_control = cache_control_header(max_age, private)
+
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapped(*args, **kwargs):
+            try:
+                validation = validator(*args, **kwargs)
+            except Exception as e:
+                logger.warning(f"Validator for {f.__name__} failed, serving full response: {str(e)}")
+                validation = None
+            if validation is None:
+                return f(*args, **kwargs)
+
+            version_key, last_modified = validation
+            g.version_key = version_key
+            # Representations differ per encoding, so the negotiated headers are part of the tag
+            etag = make_etag((version_key, request.full_path,
+                              request.headers.get('Accept', ''), request.headers.get('Accept-Encoding', '')))
+            last_modified = _as_utc(last_modified)
+
+            not_modified = False
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            elif request.if_modified_since and last_modified is not None:
+                not_modified = last_modified <= request.if_modified_since
+
+            if not_modified:
+                response = Response(status=304)
+                _apply_validators(response, etag, last_modified, cache_control)
+                return response
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                _apply_validators(response, etag, last_modified, cache_control)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,110 @@
+import gzip
+import json
+import logging
+import dataclasses
+from datetime import date
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Response, request
+
+# Accelerators and binary encodings (declared dependencies); each one falls back to
+# JSON or gzip with a warning when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+for _name, _module in (('orjson', orjson), ('msgpack', msgpack), ('cbor2', cbor2), ('brotli', brotli)):
+    if _module is None:
+        logger.warning(f"{_name} is not installed; responses fall back to "
+                       f"{'gzip' if _name == 'brotli' else 'JSON'} for clients asking for it")
+
+# Bodies smaller than this are not worth compressing
+COMPRESSION_MIN_BYTES = 1024
+
+def _builtin(value: Any) -> Any:
+    """
+    Fallback for values the encoders do not know: dataclass DTOs become dicts, dates ISO 8601
+    strings (as orjson writes them), the rest (Decimal, UUID, ...) strings
+    """
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {field.name: getattr(value, field.name) for field in dataclasses.fields(value)}
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+def dumps_json(payload: Any) -> bytes:
+    """Serialize to compact JSON, using orjson when available (it writes dataclasses natively)"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_builtin, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(',', ':'), default=_builtin).encode('utf-8')
+
+def _dumps_msgpack(payload: Any) -> bytes:
+    return msgpack.packb(payload, use_bin_type=True, default=_builtin)
+
+def _dumps_cbor(payload: Any) -> bytes:
+    return cbor2.dumps(payload, default=lambda encoder, value: encoder.encode(_builtin(value)))
+
+def _available_encoders() -> Dict[str, Callable[[Any], bytes]]:
+    encoders = {'application/json': dumps_json}
+    if msgpack is not None:
+        encoders['application/msgpack'] = _dumps_msgpack
+        encoders['application/x-msgpack'] = _dumps_msgpack
+    if cbor2 is not None:
+        encoders['application/cbor'] = _dumps_cbor
+    return encoders
+
+ENCODERS = _available_encoders()
+BINARY_MIMETYPES = ('application/msgpack', 'application/x-msgpack', 'application/cbor')
+
+def negotiate_encoder() -> Tuple[str, Callable[[Any], bytes]]:
+    """Pick the response media type from the Accept header, defaulting to JSON"""
+    mimetype = request.accept_mimetypes.best_match(list(ENCODERS), default='application/json')
+    missing = [m for m in BINARY_MIMETYPES if m not in ENCODERS and request.accept_mimetypes[m]]
+    if mimetype == 'application/json' and missing:
+        logger.warning(f"The encoder for {missing[0]} is not installed; answering with JSON")
+    return mimetype, ENCODERS.get(mimetype, dumps_json)
+
+def compress(body: bytes) -> Tuple[bytes, Optional[str]]:
+    """Compress large bodies with brotli or gzip according to Accept-Encoding"""
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return body, None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return brotli.compress(body, quality=5), 'br'
+    if accepted['gzip']:
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    return body, None
+
+def encode_response(payload: Any, status: int = 200) -> Response:
+    """Serialize a payload with the negotiated encoding and optional compression"""
+    mimetype, encoder = negotiate_encoder()
+    body, content_encoding = compress(encoder(payload))
+
+    response = Response(body, status=status, mimetype=mimetype)
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    return response
+
+def json_response(payload: Any, status: int = 200) -> Response:
+    """A plain JSON response like jsonify, serialized with dumps_json so DTOs need no dict copy"""
+    return Response(dumps_json(payload), status=status, mimetype='application/json')
@@ -1,11 +1,18 @@
-from flask import Blueprint, jsonify, request, current_app
-from models import StoryNode, StoryChoice, UserProgress, ImageAnalysis, Achievement # Added Achievement import
-from database import db
-from typing import Dict, List, Any, Optional
+from flask import Blueprint, g, request
+from api.response_encoding import encode_response
+from api.http_cache import conditional
+from models import StoryNode, StoryChoice, UserProgress, ImageAnalysis, Achievement, UserAchievement # Added Achievement import
+from database import db, note_write, read_replica
+from services.choice_log import record_choice, sync_legacy_history, append_history_entries, get_choice_history, get_choice_counts
+from services.achievement_engine import engine as achievement_engine, evaluate_choice, evaluate_choices, get_earned_achievement_ids
+from services.game_state import save_delta, save_full_state, load_state, VersionConflict, InvalidPatch
+from services.read_models import CharacterSummary, character_summaries
+from services.catalog import catalog_mode, get_catalog
+from typing import Dict, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime
 import functools
-from flask import current_app, make_response
+import os
 import time
 
 unity_api = Blueprint('unity_api', __name__)
@@ -35,12 +42,11 @@ def rate_limit(requests_per_minute=60):
 
             # Check rate limit
             if len(requests[ip]) >= requests_per_minute:
-                response = APIResponse(
+                return APIResponse(
                     success=False,
                     error="Rate limit exceeded. Please wait before making more requests.",
                     metadata={"retry_after": "60 seconds"}
-                ).to_dict()
-                return jsonify(response), 429
+                ).to_response(429)
 
             # Add current request
             requests[ip].append(now)
@@ -49,12 +55,18 @@ def rate_limit(requests_per_minute=60):
     return decorator
 
 def cache_response(timeout=CACHE_TIMEOUT):
-    """Decorator to cache API responses"""
+    """
+    Decorator to cache API responses. Under @conditional the cache is keyed on the
+    validator's version too, so a change is served at once under its new ETag.
+    """
     def decorator(f):
         cache = {}
         @functools.wraps(f)
         def wrapped(*args, **kwargs):
-            cache_key = f"{f.__name__}:{str(args)}:{str(kwargs)}"
+            # Responses are content-negotiated, so the cache is keyed on the negotiation headers too
+            cache_key = (f"{f.__name__}:{str(args)}:{str(kwargs)}:"
+                         f"{request.headers.get('Accept', '')}:{request.headers.get('Accept-Encoding', '')}:"
+                         f"{g.get('version_key')!r}")
             now = datetime.utcnow().timestamp()
 
             if cache_key in cache:
@@ -90,8 +102,73 @@ class APIResponse:
             response['metadata'] = self.metadata
         return response
 
+    def to_response(self, status: int = 200):
+        """Encode as JSON, MessagePack or CBOR depending on the client's Accept header"""
+        return encode_response(self.to_dict(), status)
+
+def _latest(*timestamps):
+    """Most recent of the given timestamps, ignoring missing ones"""
+    present = [t for t in timestamps if t is not None]
+    return max(present) if present else None
+
+def story_node_version(node_id):
+    """Validator for a story node: the node, its image and its choices"""
+    node = db.session.query(StoryNode.created_at, StoryNode.updated_at,
+                            ImageAnalysis.updated_at.label('image_updated_at'))\
+        .outerjoin(ImageAnalysis, StoryNode.image_id == ImageAnalysis.id)\
+        .filter(StoryNode.id == node_id).first()
+    if node is None:
+        return None
+    choice_count, max_choice_id, last_choice = db.session.query(
+        db.func.count(StoryChoice.id), db.func.max(StoryChoice.id),
+        db.func.max(db.func.coalesce(StoryChoice.updated_at, StoryChoice.created_at))
+    ).filter(StoryChoice.node_id == node_id).one()
+    last_modified = _latest(node.created_at, node.updated_at, node.image_updated_at, last_choice)
+    return (node.created_at, node.updated_at, node.image_updated_at, choice_count, max_choice_id,
+            last_choice), last_modified
+
+def catalog_character_summaries():
+    """The character list from the character catalog, shaped like the database version"""
+    characters = get_catalog('character')
+    if not characters:
+        return []
+    return [CharacterSummary(record['id'], record.get('character_name'), record['image_url'],
+                             record.get('character_traits'), record.get('character_role'),
+                             record.get('plot_lines'))
+            for record in characters]
+
+def characters_version():
+    """Validator for the character list: row count, newest id and newest change"""
+    if catalog_mode():
+        characters = get_catalog('character')
+        if not characters:
+            return None
+        modified = datetime.utcfromtimestamp(os.path.getmtime(characters.path))
+        return (characters.path, len(characters), modified), modified
+    count, max_id, last_modified = db.session.query(
+        db.func.count(ImageAnalysis.id),
+        db.func.max(ImageAnalysis.id),
+        db.func.max(db.func.coalesce(ImageAnalysis.updated_at, ImageAnalysis.created_at))
+    ).filter(ImageAnalysis.image_type == 'character').one()
+    return (count, max_id, last_modified), last_modified
+
+def achievements_version(user_id):
+    """Validator for a user's achievements: definitions plus the user's earned set"""
+    definition_count, last_defined = db.session.query(
+        db.func.count(Achievement.id), db.func.max(Achievement.created_at)
+    ).one()
+    earned_count, last_earned = db.session.query(
+        db.func.count(UserAchievement.achievement_id), db.func.max(UserAchievement.earned_at)
+    ).filter(UserAchievement.user_id == user_id).one()
+    legacy_updated = db.session.query(UserProgress.last_updated)\
+        .filter(UserProgress.user_id == user_id).first()
+    legacy_updated = legacy_updated[0] if legacy_updated else None
+    version_key = (definition_count, last_defined, earned_count, last_earned, legacy_updated)
+    return version_key, _latest(last_defined, last_earned, legacy_updated)
+
 @unity_api.route('/story-node/<int:node_id>')
 @rate_limit(requests_per_minute=60)
+@conditional(story_node_version, max_age=60)
 @cache_response(timeout=60)  # Cache story nodes for 1 minute
 def get_story_node(node_id):
     """Get a specific story node and its choices"""
@@ -128,9 +205,9 @@ def get_story_node(node_id):
                 }
             }
         )
-        return jsonify(response.to_dict())
+        return response.to_response()
     except Exception as e:
-        return jsonify(APIResponse(success=False, error=str(e)).to_dict()), 500
+        return APIResponse(success=False, error=str(e)).to_response(500)
 
 @unity_api.route('/select-choice/<int:choice_id>', methods=['POST'])
 @rate_limit(requests_per_minute=30)  # Lower limit for state-changing operations
@@ -142,34 +219,43 @@ def select_choice(choice_id):
         # Get user progress from request
         user_id = request.json.get('user_id')
         if not user_id:
-            return jsonify(APIResponse(success=False, error='user_id is required').to_dict()), 400
+            return APIResponse(success=False, error='user_id is required').to_response(400)
 
         # Update or create user progress
         user_progress = UserProgress.query.filter_by(user_id=user_id).first()
         if not user_progress:
             user_progress = UserProgress(user_id=user_id)
 
-        # Update progress to next node
+        # Update progress to next node and append the choice to the event log
         user_progress.current_node_id = choice.next_node_id
         db.session.add(user_progress)
+        record_choice(user_id, choice.node_id, choice.id, choice.next_node_id)
+        unlocked = evaluate_choice(user_id, choice.node_id, choice.id, choice.next_node_id)
         db.session.commit()
+        note_write(user_id)
 
         response = APIResponse(
             success=True,
             data={
                 'next_node_id': choice.next_node_id,
-                'progress_saved': True
+                'progress_saved': True,
+                'achievements_unlocked': [{
+                    'id': achievement.id,
+                    'name': achievement.name,
+                    'points': achievement.points
+                } for achievement in unlocked]
             },
             metadata={
                 'choice_id': choice_id,
                 'user_id': user_id
             }
         )
-        return jsonify(response.to_dict())
+        return response.to_response()
     except Exception as e:
-        return jsonify(APIResponse(success=False, error=str(e)).to_dict()), 500
+        return APIResponse(success=False, error=str(e)).to_response(500)
 
 @unity_api.route('/user-progress/<string:user_id>')
+@read_replica(user_arg='user_id')
 @rate_limit(requests_per_minute=60)
 def get_user_progress(user_id):
     """Get the current progress for a user"""
@@ -187,28 +273,20 @@ def get_user_progress(user_id):
                 'timestamp': datetime.utcnow().isoformat()
             }
         )
-        return jsonify(response.to_dict())
+        return response.to_response()
     except Exception as e:
-        return jsonify(APIResponse(success=False, error=str(e)).to_dict()), 500
+        return APIResponse(success=False, error=str(e)).to_response(500)
 
 @unity_api.route('/characters')
+@read_replica
 @rate_limit(requests_per_minute=30)
+@conditional(characters_version, max_age=300)
 @cache_response(timeout=300)  # Cache character list for 5 minutes
 def get_characters():
     """Get all available characters"""
     try:
-        characters = ImageAnalysis.query.filter_by(image_type='character').all()
-        character_list = []
-
-        for char in characters:
-            character_list.append({
-                'id': char.id,
-                'name': char.character_name,
-                'image_url': char.image_url,
-                'traits': char.character_traits,
-                'role': char.character_role,
-                'plot_lines': char.plot_lines
-            })
+        # Column-projected rows serialized as they are, without loading the full analyses
+        character_list = catalog_character_summaries() if catalog_mode() else character_summaries()
 
         response = APIResponse(
             success=True,
@@ -218,12 +296,13 @@ def get_characters():
                 'timestamp': datetime.utcnow().isoformat()
             }
         )
-        return jsonify(response.to_dict())
+        return response.to_response()
     except Exception as e:
-        return jsonify(APIResponse(success=False, error=str(e)).to_dict()), 500
+        return APIResponse(success=False, error=str(e)).to_response(500)
 
 
 @unity_api.route('/story-branch/<int:node_id>')
+@read_replica
 def get_story_branch(node_id):
     """Get the complete branch information for a story node"""
     try:
@@ -259,28 +338,31 @@ def get_story_branch(node_id):
                 'sub_branches': sub_branches
             }
         )
-        return jsonify(response.to_dict())
+        return response.to_response()
     except Exception as e:
-        return jsonify(APIResponse(success=False, error=str(e)).to_dict()), 500
+        return APIResponse(success=False, error=str(e)).to_response(500)
 
 @unity_api.route('/achievements/<string:user_id>')
+@read_replica(user_arg='user_id')
+@conditional(achievements_version, private=True)
 def get_user_achievements(user_id):
     """Get all achievements and their status for a user"""
     try:
+        # Earned achievements come from the indexed set, plus any legacy ids saved by the client
+        earned_achievements = get_earned_achievement_ids(user_id)
         progress = UserProgress.query.filter_by(user_id=user_id).first()
-        earned_achievements = progress.achievements_earned if progress else []
+        if progress and progress.achievements_earned:
+            earned_achievements.update(progress.achievements_earned)
 
-        # Get all achievements
-        achievements = Achievement.query.all()
+        # Achievement definitions are served from the in-memory engine cache
         achievement_list = []
-
-        for achievement in achievements:
+        for achievement in achievement_engine.all():
             achievement_list.append({
                 'id': achievement.id,
                 'name': achievement.name,
                 'description': achievement.description,
                 'points': achievement.points,
-                'earned': achievement.id in earned_achievements if earned_achievements else False,
+                'earned': achievement.id in earned_achievements,
                 'criteria': achievement.criteria
             })
 
@@ -291,9 +373,9 @@ def get_user_achievements(user_id):
                 'total_points': sum(a['points'] for a in achievement_list if a['earned'])
             }
         )
-        return jsonify(response.to_dict())
+        return response.to_response()
     except Exception as e:
-        return jsonify(APIResponse(success=False, error=str(e)).to_dict()), 500
+        return APIResponse(success=False, error=str(e)).to_response(500)
 
 @unity_api.route('/save-game-state', methods=['POST'])
 @rate_limit(requests_per_minute=30)  # Lower limit for state-changing operations
@@ -303,7 +385,14 @@ def save_game_state():
         data = request.json
         user_id = data.get('user_id')
         if not user_id:
-            return jsonify(APIResponse(success=False, error='user_id is required').to_dict()), 400
+            return APIResponse(success=False, error='user_id is required').to_response(400)
+
+        base_version = data.get('base_version')
+        if base_version is not None:
+            try:
+                base_version = int(base_version)
+            except (TypeError, ValueError):
+                return APIResponse(success=False, error='base_version must be an integer').to_response(400)
 
         # Get or create user progress
         progress = UserProgress.query.filter_by(user_id=user_id).first()
@@ -312,43 +401,107 @@ def save_game_state():
 
         # Update game state
         progress.current_node_id = data.get('current_node_id', progress.current_node_id)
-        progress.choice_history = data.get('choice_history', progress.choice_history)
+        # Choice history lives in the append-only ChoiceEvent log: new clients send only
+        # the new entries, older clients send the full array and only the tail is appended
+        appended = append_history_entries(user_id, data.get('new_choices') or [])
+        appended += sync_legacy_history(user_id, data.get('choice_history'))
         progress.achievements_earned = data.get('achievements_earned', progress.achievements_earned)
-        progress.game_state = data.get('game_state', progress.game_state)
-
         db.session.add(progress)
+
+        # Versioned saves: clients send a delta (or a full state) against base_version and the
+        # server applies it with a compare-and-swap. Saves without base_version stay last-writer-wins.
+        state_version = None
+        if 'game_state_delta' in data:
+            if base_version is None:
+                return APIResponse(success=False, error='base_version is required with game_state_delta').to_response(400)
+            state_version = save_delta(progress, data['game_state_delta'], base_version,
+                                       data.get('delta_format', 'merge'))
+        elif 'game_state' in data:
+            state_version = save_full_state(progress, data['game_state'], base_version)
+
+        # Choices saved in bulk unlock achievements like ones made through select-choice
+        unlocked = evaluate_choices(user_id, [(event.node_id, event.choice_id, event.next_node_id)
+                                              for event in appended])
         db.session.commit()
+        note_write(user_id)
 
         response = APIResponse(
             success=True,
-            data={'state_saved': True},
+            data={
+                'state_saved': True,
+                'state_version': state_version if state_version is not None else progress.state_version,
+                'achievements_unlocked': [{
+                    'id': achievement.id,
+                    'name': achievement.name,
+                    'points': achievement.points
+                } for achievement in unlocked]
+            },
             metadata={
                 'user_id': user_id,
                 'saved_at': progress.last_updated.isoformat()
             }
         )
-        return jsonify(response.to_dict())
+        return response.to_response()
+    except VersionConflict as e:
+        db.session.rollback()
+        return APIResponse(
+            success=False,
+            error=str(e),
+            metadata={'current_version': e.current_version}
+        ).to_response(409)
+    except InvalidPatch as e:
+        db.session.rollback()
+        return APIResponse(success=False, error=str(e)).to_response(400)
     except Exception as e:
-        return jsonify(APIResponse(success=False, error=str(e)).to_dict()), 500
+        db.session.rollback()
+        return APIResponse(success=False, error=str(e)).to_response(500)
 
 @unity_api.route('/load-game-state/<string:user_id>')
+@read_replica(user_arg='user_id')
 def load_game_state(user_id):
     """Load comprehensive game state for Unity client"""
     try:
         progress = UserProgress.query.filter_by(user_id=user_id).first()
         if not progress:
-            return jsonify(APIResponse(success=False, error='No saved game state found').to_dict()), 404
+            return APIResponse(success=False, error='No saved game state found').to_response(404)
+
+        # Fall back to the legacy JSONB array for users who have not logged any events yet
+        choice_history = get_choice_history(user_id) or progress.choice_history or []
+
+        # Latest snapshot plus at most SNAPSHOT_INTERVAL pending deltas
+        game_state, state_version = load_state(progress.id)
 
         response = APIResponse(
             success=True,
             data={
                 'current_node_id': progress.current_node_id,
-                'choice_history': progress.choice_history,
+                'choice_history': choice_history,
                 'achievements_earned': progress.achievements_earned,
-                'game_state': progress.game_state,
+                'game_state': game_state,
+                'state_version': state_version,
                 'last_updated': progress.last_updated.isoformat()
             }
         )
-        return jsonify(response.to_dict())
+        return response.to_response()
+    except Exception as e:
+        return APIResponse(success=False, error=str(e)).to_response(500)
+
+@unity_api.route('/choice-stats/<int:node_id>')
+@rate_limit(requests_per_minute=60)
+def get_choice_stats(node_id):
+    """Get how often each choice on a story node has been selected"""
+    try:
+        counts = get_choice_counts(node_id)
+
+        response = APIResponse(
+            success=True,
+            data={
+                'node_id': node_id,
+                'choices': [{'choice_id': choice_id, 'count': count}
+                            for choice_id, count in counts.items()],
+                'total': sum(counts.values())
+            }
+        )
+        return response.to_response()
     except Exception as e:
-        return jsonify(APIResponse(success=False, error=str(e)).to_dict()), 500
\ No newline at end of file
+        return APIResponse(success=False, error=str(e)).to_response(500)
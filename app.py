@@ -1,165 +1,260 @@
 import os
 import logging
 import json
-from flask import Flask, render_template, request, jsonify, url_for, redirect, flash
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, Optional
+from flask import Blueprint, Flask, render_template, request, jsonify, url_for, redirect, flash
+from jinja2 import FileSystemBytecodeCache
 from dotenv import load_dotenv
 from services.local_llm_service import analyze_artwork, generate_image_description
 from services.local_story_maker import generate_story, get_story_options
-from database import db
-from models import AIInstruction, ImageAnalysis, StoryGeneration, StoryNode
+from database import db, configure_engine, engine_options, pool_stats, read_replica, replica_binds, router
+from models import AIInstruction, ImageAnalysis, StoryGeneration, StoryNode, story_images
 from flask_cors import CORS
-from api.unity_routes import unity_api
+from api.http_cache import conditional
+from api.response_encoding import json_response
+from services.search import SEARCH_KINDS, search_library, find_character_by_name, like_pattern
+from services.pagination import MAX_PER_PAGE, COUNT_MODES, keyset_page, offset_page, count_rows, pagination_info
+from services.library_stats import get_library_stats
+from services.bulk_ops import DEFAULT_BATCH_SIZE, archive_path_for, delete_images, delete_stories
+from services.catalog import catalog_mode, get_catalog
+from services import connection_guard, read_models
+
+load_dotenv()
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+# Compiled templates are cached on disk, so restarted and newly booted workers skip Jinja compilation
+JINJA_CACHE_DIR = os.environ.get("JINJA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "jinja-bytecode-cache"))
 
-# Debug environment variables
-logger.info("===== APPLICATION STARTUP =====")
-logger.info(f"Environment variables available: {', '.join(list(os.environ.keys()))}")
-logger.info(f"OpenAI API key set: {'Yes' if os.environ.get('OPENAI_API_KEY') else 'No'}")
-logger.info(f"Running in deployment: {'Yes' if os.environ.get('REPLIT_DEPLOYMENT') == '1' else 'No'}")
-
-# Look for any potential OpenAI API keys in unexpected variables
-for env_var, value in os.environ.items():
-    if isinstance(value, str) and value.startswith("sk-"):
-        logger.info(f"Found potential API key in: {env_var}")
-        # If it's not already set as OPENAI_API_KEY, set it
-        if not os.environ.get("OPENAI_API_KEY"):
-            logger.info(f"Setting OPENAI_API_KEY from {env_var}")
-            os.environ["OPENAI_API_KEY"] = value
-
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET")
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-db.init_app(app)
-
-# CORS configuration
-CORS(app, resources={
-    r"/api/unity/*": {
-        "origins": "*",  # In production, replace with specific Unity client origin
-        "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
+main = Blueprint('main', __name__)
+
+# Endpoints served from the catalogs when catalog mode runs without a database
+CATALOG_ENDPOINTS = frozenset({
+    'main.index', 'main.random_character', 'main.get_image_details', 'unity_api.get_characters', 'static'
 })
 
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
+    """
+    Build the application. Nothing here touches the database or the LLM SDKs; the schema
+    is created by `python migrate_db.py` and the SDKs are imported on first use.
+    """
+    flask_app = Flask(__name__)
+    flask_app.secret_key = os.environ.get("SESSION_SECRET")
+    # Catalog mode can run without Postgres for demos and tests; database-backed routes are unavailable then
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL") or ('sqlite://' if catalog_mode() else None)
+    # Pool sizing, PgBouncer mode and the idle-connection liveness check come from DB_* variables (database.py)
+    flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+    # Read replicas from DATABASE_REPLICA_URLS, used by read_replica views (database.py)
+    flask_app.config["SQLALCHEMY_BINDS"] = replica_binds()
+    if config:
+        flask_app.config.update(config)
 
-# Create database tables
-with app.app_context():
-    db.create_all()
+    try:
+        os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+        flask_app.jinja_options = {**flask_app.jinja_options,
+                                   'bytecode_cache': FileSystemBytecodeCache(JINJA_CACHE_DIR)}
+    except OSError as e:
+        logger.warning(f"Jinja bytecode cache disabled: {str(e)}")
+
+    # Without DATABASE_URL catalog mode runs on an empty in-memory SQLite database, so the
+    # routes that have no catalog equivalent answer 503 instead of failing on missing tables
+    if catalog_mode() and flask_app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite://':
+        flask_app.before_request(require_database)
+
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        for engine in db.engines.values():
+            configure_engine(engine)
+            # Logs pooled connections held across slow LLM and HTTP calls
+            connection_guard.install(engine)
+
+    # CORS configuration
+    CORS(flask_app, resources={
+        r"/api/unity/*": {
+            "origins": "*",  # In production, replace with specific Unity client origin
+            "methods": ["GET", "POST", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"]
+        }
+    })
+
+    from api.unity_routes import unity_api
+    flask_app.register_blueprint(main)
+    flask_app.register_blueprint(unity_api, url_prefix='/api/unity')
+
+    logger.info(f"Application created (OpenAI API key set: {'Yes' if os.environ.get('OPENAI_API_KEY') else 'No'}, "
+                f"deployment: {'Yes' if os.environ.get('REPLIT_DEPLOYMENT') == '1' else 'No'})")
+    return flask_app
+
+def require_database():
+    """503 for database-backed routes when catalog mode runs without a database"""
+    if request.endpoint is None or request.endpoint in CATALOG_ENDPOINTS:
+        return None
+    return jsonify({
+        'success': False,
+        'error': 'This endpoint needs a database; catalog mode without DATABASE_URL only serves '
+                 'character selection, random characters, the Unity character list and image lookups'
+    }), 503
 
 def get_random_scene_background():
     """Get a random scene image suitable for background"""
+    if catalog_mode():
+        return catalog_scene_background()
     scene = ImageAnalysis.query.filter(
         ImageAnalysis.image_type == 'scene',
         ImageAnalysis.image_width > ImageAnalysis.image_height
     ).order_by(db.func.random()).first()
     return scene.image_url if scene else None
 
-@app.route('/')
+def catalog_scene_background():
+    """Random landscape scene from the scene catalog"""
+    scenes = get_catalog('scene')
+    if not scenes:
+        return None
+    for scene in scenes.sample(10):
+        details = scene.get('image_details') or {}
+        if (details.get('width') or 0) > (details.get('height') or 0):
+            return scene['image_url']
+    return None
+
+def catalog_character_data(record):
+    """Character selection entry for a catalog record, shaped like the database version"""
+    return {
+        'id': record['id'],
+        'image_url': record['image_url'],
+        'name': record.get('character_name', ''),
+        'style': '',
+        'story': '',
+        'character_traits': record.get('character_traits', []),
+        'plot_lines': record.get('plot_lines', [])
+    }
+
+def find_relevant(kind: str, text: str, k: int, exclude_ids=()):
+    """Embedding lookup; the index (and numpy) is loaded on the first story rather than at startup"""
+    from services.embedding_index import find_relevant as find_relevant_ids
+    return find_relevant_ids(kind, text, k, exclude_ids=exclude_ids)
+
+def embed_queries(*texts: str):
+    """
+    Embed retrieval queries ahead of the lookups, which then hit the query cache; callers
+    release their session first so the embedding model is not called holding a connection
+    """
+    from services.embedding_index import embed_query, is_available
+    if not is_available():
+        return
+    for text in texts:
+        if text.strip():
+            try:
+                embed_query(text)
+            except Exception as e:
+                logger.warning(f"Could not embed retrieval query: {str(e)}")
+                return
+
+def find_relevant_scene(context: str):
+    """The landscape scene closest to a story's setting and conflict, if embeddings are available"""
+    for scene_id in find_relevant('scene', context, 5):
+        scene = db.session.get(ImageAnalysis, scene_id)
+        if scene and scene.image_width and scene.image_height and scene.image_width > scene.image_height:
+            return scene
+    return None
+
+def refresh_embedding(image):
+    """Best-effort embedding update after an image is saved; retrieval falls back without it"""
+    from services.embedding_index import embed_text, embedding_text, is_available, save_embedding
+    if not is_available():
+        return
+    try:
+        image_id, text = image.id, embedding_text(image)
+        # Call the embedding model without a connection checked out, then write in a short transaction
+        db.session.close()
+        if text:
+            save_embedding(image_id, embed_text(text))
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Could not embed image {image.id}: {str(e)}")
+
+def story_query_text(params: dict) -> str:
+    """Text describing a story request, used to retrieve relevant characters and scenes"""
+    parts = [
+        params.get('custom_conflict') or params.get('conflict'),
+        params.get('custom_setting') or params.get('setting'),
+        params.get('custom_mood') or params.get('mood'),
+        params.get('previous_choice')
+    ]
+    return '\n'.join(part for part in parts if part)
+
+@main.route('/')
 def index():
     """Main page showing character selection and story options"""
     story_options = get_story_options()
     background_image = get_random_scene_background()
 
-    # Get 2 random images for character selection
-    images = ImageAnalysis.query.filter_by(image_type='character').order_by(db.func.random()).limit(2).all()
-    image_data = []
-    for img in images:
-        analysis = img.analysis_result or {}
-        char_name = img.character_name or ''
-        if not char_name and analysis:
-            if 'character' in analysis and 'name' in analysis['character']:
-                char_name = analysis['character'].get('name', '')
-            elif 'character_name' in analysis:
-                char_name = analysis.get('character_name', '')
-            elif 'name' in analysis:
-                char_name = analysis.get('name', '')
-
-        char_traits = []
-        plot_lines = []
-        try:
-            if hasattr(img, 'character_traits') and img.character_traits:
-                char_traits = img.character_traits
-            elif analysis and 'character_traits' in analysis:
-                char_traits = analysis.get('character_traits', [])
-
-            if hasattr(img, 'plot_lines') and img.plot_lines:
-                plot_lines = img.plot_lines
-            elif analysis and 'plot_lines' in analysis:
-                plot_lines = analysis.get('plot_lines', [])
-        except:
-            pass
-
-        image_data.append({
-            'id': img.id,
-            'image_url': img.image_url,
-            'name': char_name,
-            'style': analysis.get('style', ''),
-            'story': analysis.get('story', ''),
-            'character_traits': char_traits,
-            'plot_lines': plot_lines
-        })
+    if catalog_mode():
+        characters = get_catalog('character')
+        return render_template(
+            'index.html',
+            story_options=story_options,
+            images=[catalog_character_data(record) for record in characters.sample(2)] if characters else [],
+            background_image=background_image
+        )
 
+    # 2 random characters; name, traits and plot lines are derived from the analysis by the database
     return render_template(
         'index.html',
         story_options=story_options,
-        images=image_data,
+        images=read_models.random_character_cards(2),
         background_image=background_image
     )
 
 
-@app.route('/debug')
+@main.route('/debug')
+@read_replica
 def debug():
     """Debug page with image analysis tool and database view"""
-    recent_images = ImageAnalysis.query.order_by(ImageAnalysis.created_at.desc()).limit(10).all()
+    recent_images = ImageAnalysis.query.options(db.selectinload(ImageAnalysis.raw_analysis))\
+        .order_by(ImageAnalysis.created_at.desc()).limit(10).all()
     recent_stories = StoryGeneration.query.order_by(StoryGeneration.created_at.desc()).limit(10).all()
 
     # Database statistics
-    image_count = ImageAnalysis.query.count()
-    character_count = ImageAnalysis.query.filter_by(image_type='character').count()
-    scene_count = ImageAnalysis.query.filter_by(image_type='scene').count()
-    story_count = StoryGeneration.query.count()
-    orphaned_images = ImageAnalysis.query.filter(~ImageAnalysis.stories.any()).count()
-    empty_stories = StoryGeneration.query.filter(StoryGeneration.generated_story.is_(None)).count()
+    stats = get_library_stats()
 
     return render_template(
         'debug.html',
         recent_images=recent_images,
         recent_stories=recent_stories,
-        image_count=image_count,
-        character_count=character_count,
-        scene_count=scene_count,
-        story_count=story_count,
-        orphaned_images=orphaned_images,
-        empty_stories=empty_stories
+        image_count=stats['image_count'],
+        character_count=stats['character_count'],
+        scene_count=stats['scene_count'],
+        story_count=stats['story_count'],
+        orphaned_images=stats['orphaned_images'],
+        empty_stories=stats['empty_stories']
     )
 
-@app.route('/storyboard/<int:story_id>')
+@main.route('/storyboard/<int:story_id>')
 def storyboard(story_id):
     """Display the current story progress and choices"""
     story = StoryGeneration.query.get_or_404(story_id)
     story_data = json.loads(story.generated_story)
 
-    # Get random scene for background
-    background_image = get_random_scene_background()
+    # Prefer the scene that best matches the story, falling back to a random one
+    scene = find_relevant_scene('\n'.join(
+        part for part in (story.setting, story.primary_conflict, story.mood) if part
+    ))
+    background_image = scene.image_url if scene else get_random_scene_background()
 
     # Get associated character images from the story and referenced characters
     character_images = []
     
     # Add direct story images first
     for image in story.images:
-        analysis = image.analysis_result
         character_images.append({
             'id': image.id,
             'image_url': image.image_url,
-            'name': image.character_name or analysis.get('name', ''),
+            'name': image.character_name or '',
             'traits': image.character_traits
         })
     
@@ -174,11 +269,8 @@ def storyboard(story_id):
         if any(char['name'].lower() == character_name.lower() for char in character_images):
             continue
             
-        # Look for this character in the database
-        character_img = ImageAnalysis.query.filter(
-            ImageAnalysis.image_type == 'character',
-            ImageAnalysis.character_name.ilike(f'%{character_name}%')
-        ).first()
+        # Look for this character in the database (fuzzy match on the trigram index)
+        character_img = find_character_by_name(character_name)
         
         if character_img:
             character_images.append({
@@ -195,128 +287,175 @@ def storyboard(story_id):
         background_image=background_image
     )
 
-@app.route('/generate_story', methods=['POST'])
-def generate_story_route():
-    """Generate a new story or continue an existing one"""
-    try:
-        # Get form data
-        data = request.form
-        selected_image_ids = request.form.getlist('selected_images[]')
-        
-        logger.debug(f"Form data received: {data}")
-        logger.debug(f"Selected image IDs: {selected_image_ids}")
-
-        if not selected_image_ids:
-            logger.error("No character selected - missing selected_images[] in form data")
-            return jsonify({'error': 'Please select a character for your story'}), 400
-
-        if len(selected_image_ids) < 1:
-            logger.error(f"No characters selected, got {len(selected_image_ids)}")
-            return jsonify({'error': 'Please select at least one character for your story'}), 400
-
-        # Get the story parameters
-        story_params = {
-            'conflict': data.get('conflict', 'Mysterious adventure'),
-            'setting': data.get('setting', 'Enchanted world'),
-            'narrative_style': data.get('narrative_style', 'Engaging modern style'),
-            'mood': data.get('mood', 'Exciting and adventurous'),
-            'custom_conflict': data.get('custom_conflict', ''),
-            'custom_setting': data.get('custom_setting', ''),
-            'custom_narrative': data.get('custom_narrative', ''),
-            'custom_mood': data.get('custom_mood', ''),
-            'previous_choice': data.get('previous_choice', ''),
-            'story_context': data.get('story_context', '')
+class GenerationError(Exception):
+    """A generation request rejected before the model is called, answered with `status`"""
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+# The model-bound routes are split into prepare (request and database reads), the model
+# call, and finish (database writes and the response), so asgi.py can await the model
+# call between the same prepare and finish steps instead of holding a thread on it
+
+def prepare_story_generation():
+    """Story parameters and the selected image ids for a /generate_story request"""
+    # Get form data
+    data = request.form
+    selected_image_ids = request.form.getlist('selected_images[]')
+    
+    logger.debug(f"Form data received: {data}")
+    logger.debug(f"Selected image IDs: {selected_image_ids}")
+
+    if not selected_image_ids:
+        logger.error("No character selected - missing selected_images[] in form data")
+        raise GenerationError('Please select a character for your story')
+
+    if len(selected_image_ids) < 1:
+        logger.error(f"No characters selected, got {len(selected_image_ids)}")
+        raise GenerationError('Please select at least one character for your story')
+
+    # Get the story parameters
+    story_params = {
+        'conflict': data.get('conflict', 'Mysterious adventure'),
+        'setting': data.get('setting', 'Enchanted world'),
+        'narrative_style': data.get('narrative_style', 'Engaging modern style'),
+        'mood': data.get('mood', 'Exciting and adventurous'),
+        'custom_conflict': data.get('custom_conflict', ''),
+        'custom_setting': data.get('custom_setting', ''),
+        'custom_narrative': data.get('custom_narrative', ''),
+        'custom_mood': data.get('custom_mood', ''),
+        'previous_choice': data.get('previous_choice', ''),
+        'story_context': data.get('story_context', '')
+    }
+    
+    logger.debug(f"Story parameters: {story_params}")
+
+    # Get character information from selected images
+    selected_images = ImageAnalysis.query.options(db.selectinload(ImageAnalysis.raw_analysis))\
+        .filter(ImageAnalysis.id.in_(selected_image_ids)).all()
+    if not selected_images:
+        raise GenerationError('Selected images not found', 404)
+
+    # Get information for all selected characters
+    selected_characters = []
+    for img in selected_images:
+        analysis = img.analysis_result or {}
+        char_data = {
+            'name': img.character_name or 'Unknown Character',
+            'role': img.character_role or 'protagonist',
+            'character_traits': img.character_traits or [],
+            'style': analysis.get('style', 'A mysterious character'),
+            'plot_lines': img.plot_lines or []
         }
-        
-        logger.debug(f"Story parameters: {story_params}")
-
-        # Get character information from selected images
-        selected_images = ImageAnalysis.query.filter(ImageAnalysis.id.in_(selected_image_ids)).all()
-        if not selected_images:
-            return jsonify({'error': 'Selected images not found'}), 404
-
-        # Get information for all selected characters
-        selected_characters = []
-        for img in selected_images:
-            analysis = img.analysis_result or {}
-            char_data = {
-                'name': img.character_name or analysis.get('name', 'Unknown Character'),
-                'role': img.character_role or 'protagonist',
-                'character_traits': img.character_traits or [],
-                'style': analysis.get('style', 'A mysterious character'),
-                'plot_lines': img.plot_lines or []
-            }
-            selected_characters.append(char_data)
-        
-        # Use the first character as the main character for backward compatibility
-        main_character_img = selected_images[0]
-        character_info = selected_characters[0]
-        
-        # Get additional characters from database (excluding the selected characters)
-        additional_characters = []
-        selected_ids = [img.id for img in selected_images]
+        selected_characters.append(char_data)
+    
+    # Use the first character as the main character for backward compatibility
+    character_info = selected_characters[0]
+    
+    # Get additional characters from database (excluding the selected characters),
+    # ranked by similarity to the request and the selected characters' traits
+    additional_characters = []
+    selected_ids = [img.id for img in selected_images]
+    query_text = story_query_text(story_params)
+    retrieval_text = '\n'.join([query_text] + [
+        ', '.join(char['character_traits']) for char in selected_characters if char['character_traits']
+    ])
+
+    # Return the connection while the retrieval queries are embedded; the lookups below are short reads
+    db.session.close()
+    embed_queries(retrieval_text, query_text)
+
+    relevant_ids = find_relevant('character', retrieval_text, 3, exclude_ids=selected_ids)
+    if relevant_ids:
+        by_id = {char.id: char for char in ImageAnalysis.query.filter(ImageAnalysis.id.in_(relevant_ids))}
+        additional_chars_query = [by_id[char_id] for char_id in relevant_ids if char_id in by_id]
+    else:
         additional_chars_query = ImageAnalysis.query.filter_by(image_type='character')\
             .filter(~ImageAnalysis.id.in_(selected_ids))\
             .order_by(db.func.random())\
             .limit(3)\
             .all()
-            
-        for char in additional_chars_query:
-            char_data = {
-                'name': char.character_name,
-                'character_traits': char.character_traits,
-                'role': char.character_role,
-                'plot_lines': char.plot_lines
-            }
-            additional_characters.append(char_data)
-            
-        # Add the selected characters (except the main one) to story_params
-        if len(selected_characters) > 1:
-            # Remove the main character from the list
-            secondary_characters = selected_characters[1:]
-            # Add them to additional characters
-            additional_characters = secondary_characters + additional_characters
-
-        # Generate the story
-        story_params['character_info'] = character_info
-        story_params['additional_characters'] = additional_characters
-        result = generate_story(**story_params)
 
-        # Store the generated story
-        story = StoryGeneration(
-            primary_conflict=result['conflict'],
-            setting=result['setting'],
-            narrative_style=result['narrative_style'],
-            mood=result['mood'],
-            generated_story=result['story']
-        )
-
-        # Associate selected images with the story
-        for image in selected_images:
-            story.images.append(image)
+    for char in additional_chars_query:
+        char_data = {
+            'name': char.character_name,
+            'character_traits': char.character_traits,
+            'role': char.character_role,
+            'plot_lines': char.plot_lines
+        }
+        additional_characters.append(char_data)
+        
+    # Add the selected characters (except the main one) to story_params
+    if len(selected_characters) > 1:
+        # Remove the main character from the list
+        secondary_characters = selected_characters[1:]
+        # Add them to additional characters
+        additional_characters = secondary_characters + additional_characters
+
+    story_params['character_info'] = character_info
+    story_params['additional_characters'] = additional_characters
+    scene = find_relevant_scene(query_text)
+    if scene:
+        story_params['scene_info'] = {
+            'setting': scene.setting,
+            'setting_description': scene.setting_description
+        }
+    return story_params, selected_ids
+
+def finish_story_generation(story_params: dict, image_ids: list, result: dict):
+    """Store a generated story and answer the /generate_story request"""
+    # The local story maker returns the story segment itself; the request parameters
+    # fill in whatever the maker did not echo back
+    story = StoryGeneration(
+        primary_conflict=result.get('conflict') or story_params['custom_conflict'] or story_params['conflict'],
+        setting=result.get('setting') or story_params['custom_setting'] or story_params['setting'],
+        narrative_style=result.get('narrative_style') or story_params['custom_narrative'] or story_params['narrative_style'],
+        mood=result.get('mood') or story_params['custom_mood'] or story_params['mood'],
+        generated_story=result['story'] if 'story' in result else json.dumps(result)
+    )
 
-        db.session.add(story)
-        db.session.commit()
+    # Associate selected images with the story
+    for image in ImageAnalysis.query.filter(ImageAnalysis.id.in_(image_ids)):
+        story.images.append(image)
 
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            # If AJAX request, return JSON
-            return jsonify({
-                'success': True,
-                'redirect': url_for('storyboard', story_id=story.id)
-            })
-        else:
-            # If regular form submit, redirect to storyboard
-            return redirect(url_for('storyboard', story_id=story.id))
+    db.session.add(story)
+    db.session.commit()
 
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        # If AJAX request, return JSON
+        return jsonify({
+            'success': True,
+            'redirect': url_for('main.storyboard', story_id=story.id)
+        })
+    else:
+        # If regular form submit, redirect to storyboard
+        return redirect(url_for('main.storyboard', story_id=story.id))
+
+def story_generation_failed(error: Exception):
+    if isinstance(error, GenerationError):
+        return jsonify({'error': str(error)}), error.status
+    logger.error(f"Error generating story: {str(error)}")
+    db.session.rollback()
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({'error': str(error)}), 500
+    else:
+        flash('Error generating story: ' + str(error), 'error')
+        return redirect(url_for('main.index'))
+
+@main.route('/generate_story', methods=['POST'])
+def generate_story_route():
+    """Generate a new story or continue an existing one"""
+    try:
+        story_params, image_ids = prepare_story_generation()
+        # Read, release, call the model, then write in a short transaction: the session's
+        # connection would otherwise sit idle in the pool's busy set for the whole generation
+        db.session.close()
+        result = generate_story(**story_params)
+        return finish_story_generation(story_params, image_ids, result)
     except Exception as e:
-        logger.error(f"Error generating story: {str(e)}")
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({'error': str(e)}), 500
-        else:
-            flash('Error generating story: ' + str(e), 'error')
-            return redirect(url_for('index'))
+        return story_generation_failed(e)
 
-@app.route('/api/save_analysis', methods=['POST'])
+@main.route('/api/save_analysis', methods=['POST'])
 def save_analysis():
     """Save edited analysis from debug page"""
     try:
@@ -339,12 +478,12 @@ def save_analysis():
         logger.error(f"Error saving analysis: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/validate_image_types')
+@main.route('/api/validate_image_types')
 def validate_image_types():
     """API endpoint to validate image type storage and check for inconsistencies"""
     try:
         # Get all images
-        images = ImageAnalysis.query.all()
+        images = ImageAnalysis.query.options(db.selectinload(ImageAnalysis.raw_analysis)).all()
 
         results = {
             'character_images': 0,
@@ -413,41 +552,54 @@ def validate_image_types():
         logger.error(f"Error validating image types: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/generate', methods=['POST'])
-def generate_post():
+def prepare_analysis():
+    """The image URL of a /generate request"""
     image_url = request.form.get('image_url')
 
     if not image_url:
-        return jsonify({'error': 'No image URL provided'}), 400
-
+        raise GenerationError('No image URL provided')
+
+    # Validate URL format
+    if not image_url.startswith(('http://', 'https://')):
+        raise GenerationError('Invalid image URL format')
+
+    # Check for OpenAI API key
+    if not os.environ.get("OPENAI_API_KEY"):
+        raise GenerationError('OpenAI API key not configured. Please add it to your Replit Secrets.', 500)
+    return image_url
+
+def finish_analysis(image_url: str, analysis: dict, description: str):
+    return jsonify({
+        'success': True,
+        'description': description,
+        'analysis': analysis,
+        'saved_to_db': False,
+        'image_url': image_url
+    })
+
+def analysis_failed(error: Exception, action: str = 'generating post'):
+    if isinstance(error, GenerationError):
+        return jsonify({'error': str(error)}), error.status
+    logger.error(f"Error {action}: {str(error)}")
+    db.session.rollback()
+    return jsonify({'error': str(error)}), 500
+
+@main.route('/generate', methods=['POST'])
+def generate_post():
     try:
-        # Validate URL format
-        if not image_url.startswith(('http://', 'https://')):
-            return jsonify({'error': 'Invalid image URL format'}), 400
-
-        # Check for OpenAI API key
-        if not os.environ.get("OPENAI_API_KEY"):
-            return jsonify({'error': 'OpenAI API key not configured. Please add it to your Replit Secrets.'}), 500
+        image_url = prepare_analysis()
 
-        # Analyze the artwork using OpenAI
+        # Analyze the artwork
         analysis = analyze_artwork(image_url)
 
         # Generate a description of the analyzed image
         description = generate_image_description(analysis)
 
-        return jsonify({
-            'success': True,
-            'description': description,
-            'analysis': analysis,
-            'saved_to_db': False,
-            'image_url': image_url
-        })
-
+        return finish_analysis(image_url, analysis, description)
     except Exception as e:
-        logger.error(f"Error generating post: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        return analysis_failed(e)
 
-@app.route('/save_analysis', methods=['POST'])
+@main.route('/save_analysis', methods=['POST'])
 def save_analysis_original():
     """Save the analyzed image data to the database after user confirmation"""
     data = request.json
@@ -462,95 +614,22 @@ def save_analysis_original():
         # Extract image metadata
         metadata = analysis.get('image_metadata', {})
 
-        # Determine if it's a character or scene based on character indicators
-        is_character = False
-
-        # Check for nested character object
-        if 'character' in analysis and isinstance(analysis['character'], dict):
-            is_character = True
-            logger.debug("Detected character from nested 'character' object")
-        # Or check for character-specific fields at the top level
-        elif any(key in analysis for key in ['character_name', 'character_traits', 'plot_lines']):
-            is_character = True
-            logger.debug("Detected character from top-level character fields")
-        # Or check for character-specific role field
-        elif 'role' in analysis and analysis['role'] in ['hero', 'villain', 'neutral']:
-            is_character = True
-            logger.debug("Detected character from role field")
-
-        logger.info(f"Image classified as: {'character' if is_character else 'scene'}")
-
-        # Extract character details if this is a character image
-        character_data = analysis.get('character', {})
-
-        # Get character name - check all possible locations in a consistent manner
-        character_name = None
-        if is_character:
-            # Try to find name in all possible locations
-            if 'character' in analysis and isinstance(analysis['character'], dict):
-                if 'name' in analysis['character']:
-                    character_name = analysis['character'].get('name')
-
-            # If not found in character object, check top level fields
-            if not character_name:
-                if 'character_name' in analysis:
-                    character_name = analysis.get('character_name')
-                elif 'name' in analysis:
-                    character_name = analysis.get('name')
-
-            # Log character name extraction for debugging
-            logger.debug(f"Extracted character name: {character_name} from analysis structure")
-
-            # Ensure we always have a name for characters
-            if not character_name:
-                logger.warning(f"Could not find a name in the API response. Using default name.")
-                character_name = "Unnamed Character"
-
-        # Extract traits and plot lines either from character object or top level
-        character_traits = None
-        if is_character:
-            if 'character' in analysis and 'character_traits' in character_data:
-                character_traits = character_data.get('character_traits')
-            else:
-                character_traits = analysis.get('character_traits')
-
-        character_role = None
-        if is_character:
-            if 'character' in analysis and 'role' in character_data:
-                character_role = character_data.get('role')
-            else:
-                character_role = analysis.get('role')
-
-        plot_lines = None
-        if is_character:
-            if 'character' in analysis and 'plot_lines' in character_data:
-                plot_lines = character_data.get('plot_lines')
-            else:
-                plot_lines = analysis.get('plot_lines')
-
-        # Create new ImageAnalysis record
+        # Type, name, traits, role, plot lines and scene fields are derived from
+        # analysis_result (stored in image_analysis_raw) by a database trigger
+        # (services/derived_fields.py)
         image_analysis = ImageAnalysis(
             image_url=image_url,
             image_width=metadata.get('width'),
             image_height=metadata.get('height'),
             image_format=metadata.get('format'),
             image_size_bytes=metadata.get('size_bytes'),
-            image_type='character' if is_character else 'scene',
-            analysis_result=analysis,
-            character_name=character_name,  # Get name with our new logic
-            character_traits=character_traits,
-            character_role=character_role,
-            plot_lines=plot_lines,
-            scene_type=analysis.get('scene_type') if not is_character else None,
-            setting=analysis.get('setting') if not is_character else None,
-            setting_description=analysis.get('setting_description') if not is_character else None,
-            story_fit=analysis.get('story_fit') if not is_character else None,
-            dramatic_moments=analysis.get('dramatic_moments') if not is_character else None
+            analysis_result=analysis
         )
 
         db.session.add(image_analysis)
         db.session.commit()
-        logger.info(f"Saved image analysis: {image_analysis.id}")
+        logger.info(f"Saved image analysis: {image_analysis.id} ({image_analysis.image_type})")
+        refresh_embedding(image_analysis)
 
         return jsonify({
             'success': True,
@@ -572,58 +651,92 @@ def save_analysis_original():
             'error': f"Database error: {str(e)}"
         }), 500
 
-@app.route('/api/random_character')
+@main.route('/api/random_character')
 def random_character():
     """API endpoint to get a random character from the database"""
     try:
-        random_image = ImageAnalysis.query.filter_by(image_type='character').order_by(db.func.random()).first()
+        if catalog_mode():
+            characters = get_catalog('character')
+            sample = characters.sample(1) if characters else []
+            if not sample:
+                return jsonify({'error': 'No characters found in catalog'}), 404
+            return jsonify({
+                'success': True,
+                'id': sample[0]['id'],
+                'image_url': sample[0]['image_url'],
+                'name': sample[0].get('character_name', ''),
+                'style': '',
+                'character_traits': sample[0].get('character_traits', [])
+            })
 
-        if not random_image:
+        character = read_models.random_character()
+
+        if not character:
             return jsonify({'error': 'No character images found in database'}), 404
 
-        analysis = random_image.analysis_result
-        return jsonify({
-            'success': True,
-            'id': random_image.id,
-            'image_url': random_image.image_url,
-            'name': analysis.get('name', ''),
-            'style': analysis.get('style', ''),
-            'character_traits': random_image.character_traits or []
-        })
+        return json_response({'success': True, **read_models.fields(character)})
     except Exception as e:
         logger.error(f"Error getting random character: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/image/<int:image_id>')
+def catalog_image(image_id):
+    """A record from either catalog with its image type"""
+    for kind in ('character', 'scene'):
+        catalog = get_catalog(kind)
+        record = catalog.get(image_id) if catalog else None
+        if record:
+            return kind, record, catalog
+    return None, None, None
+
+def image_version(image_id):
+    """Validator for a single image record (primary key lookup)"""
+    if catalog_mode():
+        kind, record, catalog = catalog_image(image_id)
+        if record is None:
+            return None
+        modified = datetime.utcfromtimestamp(os.path.getmtime(catalog.path))
+        return (image_id, catalog.path, modified), modified
+    row = db.session.query(ImageAnalysis.created_at, ImageAnalysis.updated_at)\
+        .filter(ImageAnalysis.id == image_id).first()
+    if row is None:
+        return None
+    last_modified = row.updated_at or row.created_at
+    return (image_id, row.created_at, row.updated_at), last_modified
+
+@main.route('/api/image/<int:image_id>')
+@conditional(image_version, max_age=60)
 def get_image_details(image_id):
     """API endpoint to get details of a specific image"""
     try:
-        image = ImageAnalysis.query.get_or_404(image_id)
+        if catalog_mode():
+            kind, record, _ = catalog_image(image_id)
+            if record is None:
+                return jsonify({'error': f'Image {image_id} not found in catalog'}), 404
+            return jsonify({
+                'success': True,
+                'id': record['id'],
+                'image_url': record['image_url'],
+                'image_type': kind,
+                'analysis': record,
+                'created_at': None
+            })
 
-        return jsonify({
-            'success': True,
-            'id': image.id,
-            'image_url': image.image_url,
-            'image_type': image.image_type,
-            'analysis': image.analysis_result,
-            'created_at': image.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        })
+        image = read_models.image_detail(image_id)
+        if image is None:
+            return jsonify({'error': f'Image {image_id} not found'}), 404
+
+        return json_response({'success': True, **read_models.fields(image)})
     except Exception as e:
         logger.error(f"Error getting image details: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/image/<int:image_id>', methods=['DELETE'])
+@main.route('/api/image/<int:image_id>', methods=['DELETE'])
 def delete_image(image_id):
     """API endpoint to delete a specific image record"""
     try:
-        image = ImageAnalysis.query.get_or_404(image_id)
-
-        # Remove associations with stories
-        for story in image.stories:
-            story.images.remove(image)
-
-        db.session.delete(image)
-        db.session.commit()
+        result = delete_images([image_id])
+        if not result['deleted']:
+            return jsonify({'error': f'Image record {image_id} not found'}), 404
 
         return jsonify({
             'success': True,
@@ -634,13 +747,13 @@ def delete_image(image_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/story/<int:story_id>', methods=['DELETE'])
+@main.route('/api/story/<int:story_id>', methods=['DELETE'])
 def delete_story(story_id):
     """API endpoint to delete a specific story record"""
     try:
-        story = StoryGeneration.query.get_or_404(story_id)
-        db.session.delete(story)
-        db.session.commit()
+        result = delete_stories([story_id])
+        if not result['deleted']:
+            return jsonify({'error': f'Story record {story_id} not found'}), 404
 
         return jsonify({
             'success': True,
@@ -651,55 +764,65 @@ def delete_story(story_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/db/delete-all-images', methods=['POST'])
+def bulk_delete_options(kind: str):
+    """Batch size and optional archive file from a bulk delete request body; raises ValueError on bad input"""
+    options = request.get_json(silent=True) or {}
+    if not isinstance(options, dict):
+        raise ValueError('Request body must be a JSON object')
+    try:
+        batch_size = int(options.get('batch_size', DEFAULT_BATCH_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError('batch_size must be an integer')
+    batch_size = max(1, min(batch_size, 10000))
+    archive_path = archive_path_for(kind) if options.get('archive') else None
+    return batch_size, archive_path
+
+@main.route('/api/db/delete-all-images', methods=['POST'])
 def delete_all_images():
     """API endpoint to delete all image records"""
     try:
-        # First remove associations with stories
-        for image in ImageAnalysis.query.all():
-            for story in image.stories:
-                story.images.remove(image)
-
-        # Then delete all images
-        num_deleted = db.session.query(ImageAnalysis).delete()
-        db.session.commit()
+        batch_size, archive_path = bulk_delete_options('images')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        result = delete_images(batch_size=batch_size, archive_path=archive_path)
 
         return jsonify({
             'success': True,
-            'message': f'Deleted {num_deleted} image records'
+            'message': f"Deleted {result['deleted']} image records",
+            **result
         })
     except Exception as e:
         logger.error(f"Error deleting all images: {str(e)}")
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/db/delete-all-stories', methods=['POST'])
+@main.route('/api/db/delete-all-stories', methods=['POST'])
 def delete_all_stories():
     """API endpoint to delete all story records"""
     try:
-        num_deleted = db.session.query(StoryGeneration).delete()
-        db.session.commit()
+        batch_size, archive_path = bulk_delete_options('stories')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        result = delete_stories(batch_size=batch_size, archive_path=archive_path)
 
         return jsonify({
             'success': True,
-            'message': f'Deleted {num_deleted} story records'
+            'message': f"Deleted {result['deleted']} story records",
+            **result
         })
     except Exception as e:
         logger.error(f"Error deleting all stories: {str(e)}")
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/db/health-check', methods=['GET'])
+@main.route('/api/db/health-check', methods=['GET'])
 def db_health_check():
     """API endpoint to perform a database health check"""
     try:
-        # Get counts
-        image_count = ImageAnalysis.query.count()
-        character_count = ImageAnalysis.query.filter_by(image_type='character').count()
-        scene_count = ImageAnalysis.query.filter_by(image_type='scene').count()
-        story_count = StoryGeneration.query.count()
-        orphaned_images = ImageAnalysis.query.filter(~ImageAnalysis.stories.any()).count()
-        empty_stories = StoryGeneration.query.filter(StoryGeneration.generated_story.is_(None)).count()
+        # Get counts (trigger-maintained counters, one query)
+        stats = get_library_stats()
 
         # Check for potential issues
         issues = []
@@ -707,14 +830,7 @@ def db_health_check():
         # Return health check results
         return jsonify({
             'success': True,
-            'stats': {
-                'image_count': image_count,
-                'character_count': character_count,
-                'scene_count': scene_count,
-                'story_count': story_count,
-                'orphaned_images': orphaned_images,
-                'empty_stories': empty_stories
-            },
+            'stats': stats,
             'issues': issues,
             'has_issues': len(issues) > 0
         })
@@ -722,76 +838,136 @@ def db_health_check():
         logger.error(f"Error performing health check: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/images/all')
+@main.route('/api/db/pool-stats', methods=['GET'])
+def db_pool_stats():
+    """Connection pool state and checkout wait metrics of the worker that answers"""
+    try:
+        return jsonify({
+            'pid': os.getpid(),
+            **pool_stats(db.engine),
+            'replicas': {key: pool_stats(engine) for key, engine in db.engines.items() if key},
+            'replica_routing': router.snapshot(),
+            'external_calls': connection_guard.get_stats()
+        })
+    except Exception as e:
+        logger.error(f"Error getting pool stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def image_library_version():
+    """Validator for image listings: library size, newest id, newest change and story links"""
+    count, max_id, last_modified = db.session.query(
+        db.func.count(ImageAnalysis.id),
+        db.func.max(ImageAnalysis.id),
+        db.func.max(db.func.coalesce(ImageAnalysis.updated_at, ImageAnalysis.created_at))
+    ).one()
+    link_count = db.session.query(db.func.count()).select_from(story_images).scalar()
+    return (count, max_id, last_modified, link_count), last_modified
+
+@main.route('/api/images/all')
+@read_replica
+@conditional(image_library_version, max_age=0)
 def get_all_images():
-    """API endpoint to get all images with pagination"""
+    """
+    API endpoint to list images. Pass `cursor` (the next_cursor of the previous page) for
+    keyset pagination; `page` is still accepted. `count` is exact, approx or none.
+    `role` and `trait` filter characters by role and by one of their traits.
+    """
     try:
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), MAX_PER_PAGE)
+        cursor = request.args.get('cursor', type=int)
+        count_mode = request.args.get('count', 'exact')
         image_type = request.args.get('type')
         search = request.args.get('search')
+        role = request.args.get('role')
+        trait = request.args.get('trait')
 
-        query = ImageAnalysis.query
+        if count_mode not in COUNT_MODES:
+            return jsonify({'error': f'count must be one of {", ".join(COUNT_MODES)}'}), 400
+
+        query = db.session.query(ImageAnalysis.id)
 
         # Apply filters
         if image_type:
-            query = query.filter_by(image_type=image_type)
+            query = query.filter(ImageAnalysis.image_type == image_type)
 
         if search:
             # Search by ID or character name
             if search.isdigit():
                 query = query.filter(ImageAnalysis.id == int(search))
             else:
-                query = query.filter(ImageAnalysis.character_name.ilike(f'%{search}%'))
-
-        # Execute count query
-        total = query.count()
+                query = query.filter(ImageAnalysis.character_name.ilike(like_pattern(search), escape='\\'))
+
+        # Both filters are served by indexes on the derived columns
+        if role:
+            query = query.filter(ImageAnalysis.image_type == 'character', ImageAnalysis.character_role == role)
+        if trait:
+            query = query.filter(ImageAnalysis.character_traits.contains([trait]))
+
+        total, total_is_estimate = count_rows(query, count_mode, 'image_analysis',
+                                              filtered=bool(image_type or search or role or trait))
+
+        # Only fetch the columns the list view shows; analysis_result stays on disk
+        stories_count = db.session.query(db.func.count())\
+            .select_from(story_images)\
+            .filter(story_images.c.image_id == ImageAnalysis.id)\
+            .correlate(ImageAnalysis)\
+            .scalar_subquery()
+        listing = query.add_columns(
+            ImageAnalysis.image_url,
+            ImageAnalysis.image_type,
+            ImageAnalysis.character_name,
+            ImageAnalysis.created_at,
+            ImageAnalysis.character_traits,
+            ImageAnalysis.character_role,
+            stories_count.label('stories_count')
+        )
 
-        # Get paginated results
-        images = query.order_by(ImageAnalysis.id.desc()).paginate(page=page, per_page=per_page)
+        if cursor is not None or 'cursor' in request.args:
+            images, next_cursor = keyset_page(listing, ImageAnalysis.id, cursor, per_page)
+        else:
+            images, next_cursor = offset_page(listing, ImageAnalysis.id, page, per_page)
 
         # Format results
         results = []
-        for img in images.items:
-            analysis = img.analysis_result or {}
-            name = img.character_name or ''
-            if not name and analysis:
-                name = analysis.get('name', '')
-
+        for img in images:
             results.append({
                 'id': img.id,
                 'image_url': img.image_url,
                 'image_type': img.image_type,
-                'name': name,
+                'name': img.character_name or '',
                 'created_at': img.created_at.strftime('%Y-%m-%d %H:%M'),
                 'traits': img.character_traits or [],
                 'role': img.character_role or '',
-                'stories_count': img.stories.count()
+                'stories_count': img.stories_count
             })
 
         return jsonify({
             'success': True,
             'images': results,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page
-            }
+            'pagination': pagination_info(page, per_page, total, total_is_estimate, next_cursor)
         })
     except Exception as e:
         logger.error(f"Error getting all images: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/stories/all')
+@main.route('/api/stories/all')
 def get_all_stories():
-    """API endpoint to get all stories with pagination"""
+    """
+    API endpoint to list stories. Supports the same `cursor` and `count` parameters
+    as /api/images/all.
+    """
     try:
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), MAX_PER_PAGE)
+        cursor = request.args.get('cursor', type=int)
+        count_mode = request.args.get('count', 'exact')
         search = request.args.get('search')
 
-        query = StoryGeneration.query
+        if count_mode not in COUNT_MODES:
+            return jsonify({'error': f'count must be one of {", ".join(COUNT_MODES)}'}), 400
+
+        query = db.session.query(StoryGeneration.id)
 
         # Apply search filter
         if search:
@@ -800,55 +976,98 @@ def get_all_stories():
             else:
                 query = query.filter(
                     db.or_(
-                        StoryGeneration.primary_conflict.ilike(f'%{search}%'),
-                        StoryGeneration.setting.ilike(f'%{search}%')
+                        StoryGeneration.primary_conflict.ilike(like_pattern(search), escape='\\'),
+                        StoryGeneration.setting.ilike(like_pattern(search), escape='\\')
                     )
                 )
 
-        # Execute count query
-        total = query.count()
+        total, total_is_estimate = count_rows(query, count_mode, 'story_generation', filtered=bool(search))
+
+        # The title is extracted in the database so the story body is never sent to the app.
+        # generated_story holds either a JSON object or a JSON-encoded string.
+        title = db.case(
+            (db.func.jsonb_typeof(StoryGeneration.generated_story) == 'object',
+             StoryGeneration.generated_story['title'].astext),
+            else_=db.func.substring(
+                StoryGeneration.generated_story.op('#>>', return_type=db.Text)(db.text("'{}'")),
+                r'"title"\s*:\s*"([^"]*)"'
+            )
+        )
+        listing = query.add_columns(
+            StoryGeneration.primary_conflict,
+            StoryGeneration.setting,
+            StoryGeneration.created_at,
+            title.label('title')
+        )
 
-        # Get paginated results
-        stories = query.order_by(StoryGeneration.id.desc()).paginate(page=page, per_page=per_page)
+        if cursor is not None or 'cursor' in request.args:
+            stories, next_cursor = keyset_page(listing, StoryGeneration.id, cursor, per_page)
+        else:
+            stories, next_cursor = offset_page(listing, StoryGeneration.id, page, per_page)
+
+        # Character names for the whole page in one query
+        story_ids = [story.id for story in stories]
+        images_by_story = {story_id: [] for story_id in story_ids}
+        if story_ids:
+            links = db.session.query(story_images.c.story_id, ImageAnalysis.character_name)\
+                .join(ImageAnalysis, ImageAnalysis.id == story_images.c.image_id)\
+                .filter(story_images.c.story_id.in_(story_ids))
+            for story_id, character_name in links:
+                images_by_story[story_id].append(character_name)
 
         # Format results
         results = []
-        for story in stories.items:
-            # Extract title from JSON if available
-            title = "Untitled Story"
-            if story.generated_story:
-                try:
-                    story_data = json.loads(story.generated_story)
-                    if isinstance(story_data, dict) and 'title' in story_data:
-                        title = story_data['title']
-                except:
-                    pass
-
+        for story in stories:
+            names = images_by_story[story.id]
             results.append({
                 'id': story.id,
-                'title': title,
+                'title': story.title or "Untitled Story",
                 'conflict': story.primary_conflict,
                 'setting': story.setting,
-                'images_count': len(story.images),
-                'character_names': [img.character_name for img in story.images if img.character_name],
+                'images_count': len(names),
+                'character_names': [name for name in names if name],
                 'created_at': story.created_at.strftime('%Y-%m-%d %H:%M')
             })
 
         return jsonify({
             'success': True,
             'stories': results,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page
-            }
+            'pagination': pagination_info(page, per_page, total, total_is_estimate, next_cursor)
         })
     except Exception as e:
         logger.error(f"Error getting all stories: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/story_nodes/all')
+@main.route('/api/search')
+def search():
+    """
+    API endpoint for ranked full-text search over characters, scenes and stories.
+    `type` is a comma-separated subset of character, scene and story.
+    """
+    try:
+        term = (request.args.get('q') or '').strip()
+        limit = min(request.args.get('limit', 20, type=int), MAX_PER_PAGE)
+        kinds = [kind for kind in request.args.get('type', '').split(',') if kind]
+
+        if not term:
+            return jsonify({'error': 'Missing search term'}), 400
+        unknown = [kind for kind in kinds if kind not in SEARCH_KINDS]
+        if unknown:
+            return jsonify({'error': f'Unknown search type: {", ".join(unknown)}'}), 400
+
+        results = search_library(term, kinds or None, limit)
+
+        return jsonify({
+            'success': True,
+            'query': term,
+            'results': results,
+            'count': len(results)
+        })
+    except Exception as e:
+        logger.error(f"Error searching library: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/story_nodes/all')
 def get_all_story_nodes():
     """API endpoint to get all story nodes"""
     try:
@@ -875,24 +1094,59 @@ def get_all_story_nodes():
         logger.error(f"Error getting all story nodes: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/reanalyze/<int:image_id>', methods=['POST'])
-def reanalyze_image(image_id):
-    """API endpoint to reanalyze an existing image"""
-    try:
-        # Get the image
-        image = ImageAnalysis.query.get_or_404(image_id)
-        image_url = image.image_url
+def prepare_reanalysis(image_id: int):
+    """The URL of the image a /api/reanalyze request re-runs the analysis for"""
+    # Get the image
+    image = ImageAnalysis.query.get_or_404(image_id)
+    image_url = image.image_url
+
+    if not image_url:
+        raise GenerationError('Image URL is missing')
+
+    # Verify URL format
+    if not image_url.startswith(('http://', 'https://')):
+        raise GenerationError('Invalid image URL format')
 
-        if not image_url:
-            return jsonify({'error': 'Image URL is missing'}), 400
+    # Check API key
+    if not os.environ.get("OPENAI_API_KEY"):
+        raise GenerationError('OpenAI API key not configured', 500)
+    return image_url
 
-        # Verify URL format
-        if not image_url.startswith(('http://', 'https://')):
-            return jsonify({'error': 'Invalid image URL format'}), 400
+def finish_reanalysis(image_id: int, analysis: dict, description: str):
+    """Store a new analysis and answer the /api/reanalyze request"""
+    image = ImageAnalysis.query.get_or_404(image_id)
+    image_url = image.image_url
 
-        # Check API key
-        if not os.environ.get("OPENAI_API_KEY"):
-            return jsonify({'error': 'OpenAI API key not configured'}), 500
+    # Get preservation option
+    preserve_relations = request.json.get('preserve_relations', True)
+
+    # Prepare for saving to the database
+    old_stories = list(image.stories) if preserve_relations else []
+
+    # Updating analysis_result re-derives the type and the character or scene fields
+    image.analysis_result = analysis
+
+    # Restore story relationships if needed
+    if preserve_relations:
+        image.stories = old_stories
+
+    db.session.commit()
+    refresh_embedding(image)
+
+    return jsonify({
+        'success': True,
+        'message': 'Image reanalyzed successfully',
+        'description': description,
+        'analysis': analysis,
+        'image_url': image_url
+    })
+
+@main.route('/api/reanalyze/<int:image_id>', methods=['POST'])
+def reanalyze_image(image_id):
+    """API endpoint to reanalyze an existing image"""
+    try:
+        image_url = prepare_reanalysis(image_id)
+        db.session.close()
 
         # Reanalyze the image
         analysis = analyze_artwork(image_url)
@@ -900,76 +1154,11 @@ def reanalyze_image(image_id):
         # Generate description
         description = generate_image_description(analysis)
 
-        # Get preservation option
-        preserve_relations = request.json.get('preserve_relations', True)
-
-        # Prepare for saving to the database
-        old_stories = list(image.stories) if preserve_relations else []
-
-        # Update the image analysis record
-        is_character = False
-        if 'character' in analysis and isinstance(analysis['character'], dict):
-            is_character = True
-        elif any(key in analysis for key in ['character_name', 'character_traits', 'plot_lines']):
-            is_character = True
-        elif 'role' in analysis and analysis['role'] in ['hero', 'villain', 'neutral']:
-            is_character = True
-
-        # Extract character details
-        character_name = None
-        if is_character:
-            if 'character' in analysis and isinstance(analysis['character'], dict):
-                if 'name' in analysis['character']:
-                    character_name = analysis['character'].get('name')
-            if not character_name:
-                if 'character_name' in analysis:
-                    character_name = analysis.get('character_name')
-                elif 'name' in analysis:
-                    character_name = analysis.get('name')
-            if not character_name:
-                character_name = "Unnamed Character"
-
-        # Extract traits and other fields
-        character_data = analysis.get('character', {})
-        character_traits = character_data.get('character_traits') if 'character' in analysis else analysis.get('character_traits')
-        character_role = character_data.get('role') if 'character' in analysis else analysis.get('role')
-        plot_lines = character_data.get('plot_lines') if 'character' in analysis else analysis.get('plot_lines')
-
-        # Update image record
-        image.image_type = 'character' if is_character else 'scene'
-        image.analysis_result = analysis
-        image.character_name = character_name
-        image.character_traits = character_traits
-        image.character_role = character_role
-        image.plot_lines = plot_lines
-
-        if not is_character:
-            image.scene_type = analysis.get('scene_type')
-            image.setting = analysis.get('setting')
-            image.setting_description = analysis.get('setting_description')
-            image.story_fit = analysis.get('story_fit')
-            image.dramatic_moments = analysis.get('dramatic_moments')
-
-        # Restore story relationships if needed
-        if preserve_relations:
-            image.stories = old_stories
-
-        db.session.commit()
-
-        return jsonify({
-            'success': True,
-            'message': 'Image reanalyzed successfully',
-            'description': description,
-            'analysis': analysis,
-            'image_url': image_url
-        })
-
+        return finish_reanalysis(image_id, analysis, description)
     except Exception as e:
-        logger.error(f"Error reanalyzing image: {str(e)}")
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+        return analysis_failed(e, 'reanalyzing image')
 
-app.register_blueprint(unity_api, url_prefix='/api/unity') # Blueprint registration
+app = create_app()
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
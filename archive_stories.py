@@ -0,0 +1,43 @@
+import argparse
+import logging
+from app import app
+from services.story_archive import FORMATS, RETENTION_MONTHS, STORY_ARCHIVE_DIR, apply_retention, restore_archive
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Archive story months past the retention period to files, or restore an archived month"""
+    parser = argparse.ArgumentParser(description="Archive or restore monthly story partitions")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    archive = commands.add_parser('archive', help="Archive and drop the months older than the retention period")
+    archive.add_argument('--retention-months', type=int, default=RETENTION_MONTHS,
+                         help="Months kept besides the current one (default: STORY_RETENTION_MONTHS or 12)")
+    archive.add_argument('--format', choices=FORMATS, default='ndjson',
+                         help="gzip-compressed NDJSON, or zstd-compressed Parquet (requires pyarrow)")
+    archive.add_argument('--dir', default=STORY_ARCHIVE_DIR, help="Where the archive files are written")
+    archive.add_argument('--keep-tables', action='store_true',
+                         help="Only detach the archived partitions instead of dropping them")
+    archive.add_argument('--dry-run', action='store_true', help="List the months that would be archived")
+
+    restore = commands.add_parser('restore', help="Load archive files back into story_generation")
+    restore.add_argument('paths', nargs='+', metavar='PATH')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'archive':
+            results = apply_retention(args.retention_months, args.format, args.dir,
+                                      drop=not args.keep_tables, dry_run=args.dry_run)
+            if not results:
+                logger.info(f"No story partitions older than {args.retention_months} months")
+            for result in results:
+                if not result.get('dry_run'):
+                    logger.info(f"{result['partition']}: {result['stories']} stories -> {result['archive']}")
+        else:
+            for path in args.paths:
+                logger.info(f"{path}: restored {restore_archive(path)} stories")
+
+if __name__ == "__main__":
+    main()
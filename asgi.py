@@ -0,0 +1,154 @@
+"""
+ASGI entry point. The model-bound endpoints (/generate, /generate_story and
+/api/reanalyze/<id>) are served as coroutines that await the model through
+services/async_llm.py, so one worker carries hundreds of generations at once instead
+of one per thread. Every other request goes to the Flask app unchanged.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+The request parsing, database reads and writes and responses are the Flask code in
+app.py (prepare_* and finish_*), run in a request context on a worker thread; only the
+model and image download calls are awaited on the event loop.
+"""
+import io
+import re
+import sys
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (app, prepare_analysis, finish_analysis, analysis_failed, prepare_story_generation,
+                 finish_story_generation, story_generation_failed, prepare_reanalysis, finish_reanalysis)
+from services import async_llm
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+flask_application = WsgiToAsgi(app)
+
+class PendingRequest:
+    """A buffered ASGI request whose synchronous parts run in a Flask request context"""
+
+    def __init__(self, scope: Dict[str, Any], body: bytes):
+        self.scope = scope
+        self.body = body
+
+    def environ(self) -> Dict[str, Any]:
+        scope = self.scope
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': scope['query_string'].decode('ascii'),
+            'SERVER_NAME': scope['server'][0] if scope.get('server') else 'localhost',
+            'SERVER_PORT': str(scope['server'][1]) if scope.get('server') else '80',
+            'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+            'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(self.body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin1').upper().replace('-', '_')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = f'HTTP_{name}'
+            value = value.decode('latin1')
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+        return environ
+
+    def _run(self, function: Callable, args: Tuple, respond: bool):
+        # Leaving the context removes the session, so no connection is held while the model is awaited
+        with app.request_context(self.environ()):
+            result = function(*args)
+            if not respond:
+                return result
+            response = app.process_response(app.make_response(result))
+            return response.status_code, response.headers.to_wsgi_list(), response.get_data()
+
+    async def call(self, function: Callable, *args):
+        """Run a prepare step on a worker thread and return its result"""
+        return await asyncio.to_thread(self._run, function, args, False)
+
+    async def respond(self, function: Callable, *args) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """Run a step that produces the response on a worker thread"""
+        return await asyncio.to_thread(self._run, function, args, True)
+
+async def generate_post(request: PendingRequest):
+    try:
+        image_url = await request.call(prepare_analysis)
+        analysis = await async_llm.analyze_artwork(image_url)
+        description = await async_llm.generate_image_description(analysis)
+        return await request.respond(finish_analysis, image_url, analysis, description)
+    except Exception as e:
+        return await request.respond(analysis_failed, e)
+
+async def generate_story_route(request: PendingRequest):
+    try:
+        story_params, image_ids = await request.call(prepare_story_generation)
+        result = await async_llm.generate_story(**story_params)
+        return await request.respond(finish_story_generation, story_params, image_ids, result)
+    except Exception as e:
+        return await request.respond(story_generation_failed, e)
+
+async def reanalyze_image(request: PendingRequest, image_id: str):
+    try:
+        image_url = await request.call(prepare_reanalysis, int(image_id))
+        analysis = await async_llm.analyze_artwork(image_url)
+        description = await async_llm.generate_image_description(analysis)
+        return await request.respond(finish_reanalysis, int(image_id), analysis, description)
+    except Exception as e:
+        return await request.respond(analysis_failed, e, 'reanalyzing image')
+
+# POST routes served on the event loop; the patterns match the Flask routes of the same views
+ASYNC_ROUTES = [
+    (re.compile(r'/generate'), generate_post),
+    (re.compile(r'/generate_story'), generate_story_route),
+    (re.compile(r'/api/reanalyze/(\d+)'), reanalyze_image),
+]
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_llm.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope['method'] == 'POST':
+        for pattern, view in ASYNC_ROUTES:
+            match = pattern.fullmatch(scope['path'])
+            if match:
+                request = PendingRequest(scope, await read_body(receive))
+                status, headers, body = await view(request, *match.groups())
+                await send({
+                    'type': 'http.response.start',
+                    'status': status,
+                    'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+                })
+                await send({'type': 'http.response.body', 'body': body})
+                return
+
+    await flask_application(scope, receive, send)
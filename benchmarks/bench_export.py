@@ -0,0 +1,137 @@
+"""
+Compare the character export pipelines across library sizes.
+
+Feeds synthetic character rows, cycled from character_data.json, to:
+  legacy      - build every format in memory, XML through minidom (the old scripts)
+  sequential  - streaming writers, one after another in a single thread
+  threads     - streaming writers, one thread per format
+  processes   - streaming writers, one process per format
+  *+gz        - the same with gzip compression on the fly
+
+and reports wall time, peak traced memory and total output size.
+
+    python benchmarks/bench_export.py --sizes 1000 10000 50000
+"""
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import xml.dom.minidom
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.export_engine import CHARACTER_EXPORT, PARALLEL_MODES, WRITERS, write_rows
+
+# The formats the legacy scripts wrote, so every pipeline does the same work
+FORMATS = ('csv', 'json', 'xml', 'py')
+
+FIELDS = [column.key for column in CHARACTER_EXPORT.columns] + ['changed_at']
+Row = namedtuple('Row', FIELDS)
+
+def build_rows(count):
+    source = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'character_data.json')
+    with open(source) as f:
+        characters = json.load(f)
+
+    now = datetime.utcnow()
+    for i in range(count):
+        char = characters[i % len(characters)]
+        details = char['image_details']
+        yield Row(
+            id=i + 1,
+            image_url=char['image_url'],
+            character_name=char['character_name'],
+            character_traits=char['character_traits'],
+            character_role=char['character_role'],
+            plot_lines=char['plot_lines'],
+            image_width=details['width'],
+            image_height=details['height'],
+            image_format=details['format'],
+            image_size_bytes=details['size_bytes'],
+            changed_at=now
+        )
+
+def legacy_export(rows, output_dir):
+    """The previous approach: materialize everything, then write each format in turn"""
+    spec = CHARACTER_EXPORT
+    rows = list(rows)
+    records = [spec.record(row) for row in rows]
+
+    with open(os.path.join(output_dir, 'legacy.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(spec.csv_fields)
+        for row in rows:
+            writer.writerow(spec.csv_row(row))
+
+    with open(os.path.join(output_dir, 'legacy.json'), 'w') as f:
+        json.dump(records, f, indent=2)
+
+    root = ET.Element(spec.root_tag)
+    for record in records:
+        item = ET.SubElement(root, spec.item_tag)
+        for tag, content in spec.xml(record):
+            element = ET.SubElement(item, tag)
+            if isinstance(content, list):
+                for child_tag, text in content:
+                    ET.SubElement(element, child_tag).text = text
+            else:
+                element.text = content
+    pretty_xml = xml.dom.minidom.parseString(ET.tostring(root, encoding='utf-8')).toprettyxml(indent="  ")
+    with open(os.path.join(output_dir, 'legacy.xml'), 'w') as f:
+        f.write(pretty_xml)
+
+    with open(os.path.join(output_dir, 'legacy.py'), 'w') as f:
+        f.write(f"{spec.name} = {records!r}\n")
+
+def streaming_export(rows, output_dir, mode, compress):
+    writers = [WRITERS[name](CHARACTER_EXPORT, os.path.join(output_dir, f"{CHARACTER_EXPORT.name}.{name}"), compress)
+               for name in FORMATS]
+    write_rows(CHARACTER_EXPORT, rows, writers, mode=mode)
+
+PIPELINES = {'legacy': legacy_export}
+for mode in PARALLEL_MODES[::-1]:
+    PIPELINES[mode] = lambda rows, out, mode=mode: streaming_export(rows, out, mode, compress=False)
+    PIPELINES[f"{mode}+gz"] = lambda rows, out, mode=mode: streaming_export(rows, out, mode, compress=True)
+
+def output_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+def run(pipeline, size, trace_memory):
+    output_dir = tempfile.mkdtemp(prefix='bench_export_')
+    try:
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        PIPELINES[pipeline](build_rows(size), output_dir)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+        return elapsed, peak, output_size(output_dir)
+    finally:
+        shutil.rmtree(output_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--pipelines', nargs='+', choices=list(PIPELINES), default=list(PIPELINES))
+    parser.add_argument('--no-memory', action='store_true', help="Skip tracemalloc, which slows every pipeline down")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'pipeline':<15}{'seconds':>9}{'peak MB':>10}{'output MB':>11}")
+    for size in args.sizes:
+        for pipeline in args.pipelines:
+            elapsed, peak, written = run(pipeline, size, not args.no_memory)
+            peak_text = f"{peak / 1e6:>10.1f}" if peak is not None else f"{'-':>10}"
+            print(f"{size:>8}  {pipeline:<15}{elapsed:>9.2f}{peak_text}{written / 1e6:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Compare how many model-bound requests the sync and async serving paths keep in flight.
+
+Starts a fake Ollama server that answers every chat after --delay seconds and counts
+concurrent chats, then drives POST /generate (image download plus two chats) against:
+  sync   - gunicorn with the gunicorn.conf.py sync workers (one request per worker)
+  async  - uvicorn serving asgi:application with one worker
+and reports the peak number of concurrent model calls, throughput, latency and the
+servers' total PSS, i.e. concurrency at the memory each setup costs.
+
+Runs without a database: CATALOG_MODE=1 is set unless DATABASE_URL is. Linux only.
+
+    python benchmarks/bench_llm_concurrency.py --clients 200 --requests 400 --delay 1.0
+"""
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import threading
+import statistics
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from bench_worker_memory import ROOT, children, memory, wait_until_up
+
+ANALYSIS = {'character_name': 'Bench Squirrel', 'role': 'villain', 'character_traits': ['fast'],
+            'plot_lines': ['Steals an egg']}
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """The parts of the Ollama API the app calls, plus an image to download"""
+    protocol_version = 'HTTP/1.1'
+    delay = 1.0
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def reply(self, body: bytes, content_type='application/json'):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.reply(json.dumps({'models': [{'name': 'phi3:mini', 'model': 'phi3:mini'}]}).encode())
+        else:
+            self.reply(b'\x89PNG\r\n\x1a\n' + b'\0' * 2048, 'image/png')
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+        try:
+            time.sleep(cls.delay)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+        content = json.dumps(ANALYSIS) if request.get('format') == 'json' else 'A squirrel plotting mischief.'
+        self.reply(json.dumps({'model': request.get('model'), 'created_at': '2024-01-01T00:00:00Z',
+                               'message': {'role': 'assistant', 'content': content}, 'done': True}).encode())
+
+    def log_message(self, *args):
+        pass
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+def start_fake_ollama(delay):
+    FakeOllama.delay = delay
+    server = FakeOllamaServer(('127.0.0.1', 0), FakeOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def server_command(mode, port, workers):
+    if mode == 'sync':
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--log-level', 'warning', '--backlog', '2048']
+
+async def drive(url, image_url, clients, requests):
+    latencies = []
+    failures = 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def client(http):
+        nonlocal failures
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await http.post(url, data={'image_url': image_url})
+                if response.status_code != 200:
+                    failures += 1
+            except httpx.HTTPError:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(timeout=600, limits=limits) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(clients)))
+        return time.perf_counter() - start, latencies, failures
+
+def measure(mode, args, fake):
+    port = args.port
+    env = dict(os.environ, OLLAMA_HOST=f'http://127.0.0.1:{fake.server_port}', OPENAI_API_KEY='sk-bench',
+               GUNICORN_BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(args.sync_workers), LOG_LEVEL='ERROR')
+    if not env.get('DATABASE_URL'):
+        env['CATALOG_MODE'] = '1'
+    server = subprocess.Popen(server_command(mode, port, args.async_workers), cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(f'http://127.0.0.1:{port}/')
+        FakeOllama.peak = 0
+        elapsed, latencies, failures = asyncio.run(drive(
+            f'http://127.0.0.1:{port}/generate', f'http://127.0.0.1:{fake.server_port}/image.png',
+            args.clients, args.requests
+        ))
+        processes = [server.pid] + children(server.pid)
+        pss = sum(memory(pid)[1] for pid in processes) / 1024
+        return {
+            'processes': len(processes),
+            'pss': pss,
+            'peak': FakeOllama.peak,
+            'throughput': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p95': statistics.quantiles(latencies, n=20)[-1],
+            'failures': failures
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=200, help="Concurrent clients")
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--delay', type=float, default=1.0, help="Seconds the fake model takes per chat")
+    parser.add_argument('--sync-workers', type=int, default=4)
+    parser.add_argument('--async-workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=5078)
+    args = parser.parse_args()
+
+    fake = start_fake_ollama(args.delay)
+    print(f"{'mode':<7}{'procs':>6}{'PSS MB':>9}{'peak calls':>12}{'per 100MB':>11}{'req/s':>8}"
+          f"{'p50 s':>8}{'p95 s':>8}{'failed':>8}")
+    for mode in ('sync', 'async'):
+        result = measure(mode, args, fake)
+        print(f"{mode:<7}{result['processes']:>6}{result['pss']:>9.1f}{result['peak']:>12}"
+              f"{result['peak'] / result['pss'] * 100:>11.1f}{result['throughput']:>8.1f}"
+              f"{result['p50']:>8.2f}{result['p95']:>8.2f}{result['failures']:>8}")
+    fake.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Check that concurrent story generation does not exhaust the connection pool.
+
+Runs --clients threads posting /generate_story against a fake Ollama server whose
+chats take --delay seconds, with a pool of --pool-size connections and no overflow,
+while another thread polls /api/db/health-check. Reports the peak number of checked-out
+connections, the health-check latency during the run, and how many external calls were
+made while holding a connection (services/connection_guard.py).
+
+This is the regression check for releasing connections around model calls. It prints
+PASS or FAIL and exits non-zero unless:
+  - every generation succeeded (none timed out waiting for the pool),
+  - no external call was made while holding a connection,
+  - the health check never took longer than HEALTH_CHECK_MAX_SECONDS, which only holds
+    when a connection is free while the generations wait on the model.
+
+Needs DATABASE_URL (PostgreSQL) with at least one character image. The stories it
+creates are deleted afterwards.
+
+    python benchmarks/bench_pool_usage.py --clients 20 --pool-size 3 --delay 2
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+
+from bench_llm_concurrency import start_fake_ollama
+from bench_worker_memory import ROOT
+
+sys.path.insert(0, ROOT)
+
+# A starved pool makes the health check wait for a connection (up to pool_timeout)
+HEALTH_CHECK_MAX_SECONDS = 1.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--pool-size', type=int, default=3)
+    parser.add_argument('--delay', type=float, default=2.0, help="Seconds the fake model takes per chat")
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit("DATABASE_URL must point at a PostgreSQL database")
+    fake = start_fake_ollama(args.delay)
+    os.environ['OLLAMA_HOST'] = f'http://127.0.0.1:{fake.server_port}'
+    os.environ.setdefault('EMBEDDING_PROVIDER', 'hashing')
+
+    from sqlalchemy import event
+    from app import create_app
+    from database import db
+    from models import ImageAnalysis
+    from services import connection_guard
+    from services.bulk_ops import delete_stories
+
+    app = create_app({'SQLALCHEMY_ENGINE_OPTIONS': {
+        'pool_size': args.pool_size, 'max_overflow': 0, 'pool_timeout': 30
+    }})
+    with app.app_context():
+        engine = db.engine
+        character_ids = [row.id for row in ImageAnalysis.query.filter_by(image_type='character').limit(2)]
+    if not character_ids:
+        sys.exit("No character images to generate stories with")
+
+    peak = 0
+    lock = threading.Lock()
+
+    @event.listens_for(engine, 'checkout')
+    def count_checkout(*_):
+        nonlocal peak
+        with lock:
+            peak = max(peak, engine.pool.checkedout())
+
+    story_ids = []
+    failures = []
+    done = threading.Event()
+
+    def generate():
+        client = app.test_client()
+        response = client.post('/generate_story', data={'selected_images[]': character_ids, 'conflict': 'bench'},
+                               headers={'X-Requested-With': 'XMLHttpRequest'})
+        if response.status_code == 200:
+            story_ids.append(int(response.json['redirect'].rsplit('/', 1)[1]))
+        else:
+            failures.append(response.status_code)
+
+    health_latencies = []
+
+    def probe():
+        client = app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/api/db/health-check')
+            health_latencies.append(time.perf_counter() - start)
+            time.sleep(0.1)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=generate) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+    fake.shutdown()
+
+    with app.app_context():
+        if story_ids:
+            delete_stories(story_ids)
+
+    calls = connection_guard.get_stats()
+    held_calls = calls['held_calls']
+    slowest_check = max(health_latencies, default=0.0)
+    print(f"{args.clients} concurrent generations in {elapsed:.1f}s, {len(failures)} failed")
+    print(f"peak checked-out connections {peak} of {args.pool_size}")
+    if health_latencies:
+        print(f"health-check latency  p50 {statistics.median(health_latencies) * 1000:.1f} ms  "
+              f"max {slowest_check * 1000:.1f} ms")
+    print(f"external calls {calls['external_calls']}, "
+          f"made holding a connection {held_calls}")
+
+    problems = []
+    if failures:
+        problems.append(f"{len(failures)} generations failed (status {', '.join(map(str, sorted(set(failures))))})")
+    if held_calls:
+        problems.append(f"{held_calls} external calls were made holding a connection")
+    if not health_latencies:
+        problems.append("the health check never completed")
+    elif slowest_check > HEALTH_CHECK_MAX_SECONDS:
+        problems.append(f"the health check took {slowest_check:.2f}s (limit {HEALTH_CHECK_MAX_SECONDS:.1f}s)")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if problems:
+        sys.exit(1)
+    print("PASS")
+
+if __name__ == "__main__":
+    main()
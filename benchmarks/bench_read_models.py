@@ -0,0 +1,163 @@
+"""
+Compare the ORM path of the hot image endpoints with the read models in services/read_models.py.
+
+For each endpoint's query and serialization (the character list behind /api/unity/characters,
+the story page's random characters, /api/random_character and /api/image/<id>), times the
+previous ORM code (full ImageAnalysis objects copied into dicts, then JSON) against the
+column-projected lambda statements returning slotted DTOs, and reports rows per second.
+
+Uses DATABASE_URL when set (read-only; needs characters in the library). Otherwise it
+builds a scratch SQLite file with --rows characters whose analyses are about --analysis-kb
+each, like the ones the model produces.
+
+    python benchmarks/bench_read_models.py --rows 2000 --seconds 2
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+from bench_worker_memory import ROOT
+
+sys.path.insert(0, ROOT)
+
+SQLITE_SCHEMA = """
+CREATE TABLE image_analysis (
+    id INTEGER PRIMARY KEY, image_url VARCHAR(1024) NOT NULL, image_width INTEGER, image_height INTEGER,
+    image_format VARCHAR(16), image_size_bytes INTEGER, image_type VARCHAR(32),
+    character_name VARCHAR(255), character_traits JSON, character_role VARCHAR(32), plot_lines JSON,
+    scene_type VARCHAR(64), setting VARCHAR(255), setting_description TEXT, story_fit VARCHAR(255),
+    dramatic_moments JSON, created_at DATETIME, updated_at DATETIME, search_vector TEXT
+);
+CREATE TABLE image_analysis_raw (image_id INTEGER PRIMARY KEY REFERENCES image_analysis (id), analysis_result JSON)
+"""
+
+def build_sqlite(path, rows, analysis_kb):
+    connection = sqlite3.connect(path)
+    connection.executescript(SQLITE_SCHEMA)
+    filler = 'x' * 1024
+    for i in range(1, rows + 1):
+        traits = [f'trait {n}' for n in range(5)]
+        plot_lines = [f'Plot line {n} for character {i}' for n in range(3)]
+        analysis = {'character': {'name': f'Character {i}', 'character_traits': traits, 'role': 'hero',
+                                  'plot_lines': plot_lines},
+                    'style': 'watercolour', 'story': f'Backstory of character {i}',
+                    'notes': [filler] * analysis_kb}
+        connection.execute(
+            "INSERT INTO image_analysis (id, image_url, image_type, character_name, "
+            "character_traits, character_role, plot_lines, created_at, updated_at) "
+            "VALUES (?, ?, 'character', ?, ?, 'hero', ?, '2024-01-01 00:00:00', '2024-01-01 00:00:00')",
+            (i, f'https://example.com/{i}.png', f'Character {i}', json.dumps(traits), json.dumps(plot_lines))
+        )
+        connection.execute("INSERT INTO image_analysis_raw (image_id, analysis_result) VALUES (?, ?)",
+                           (i, json.dumps(analysis)))
+    connection.commit()
+    connection.close()
+
+def rate(function, seconds):
+    """Rows per second of `function`, which returns how many rows it produced"""
+    rows = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        rows += function()
+    return rows / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000, help="Characters in the scratch SQLite library")
+    parser.add_argument('--analysis-kb', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=2.0, help="Time spent on each measurement")
+    args = parser.parse_args()
+
+    os.environ.pop('CATALOG_MODE', None)
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(prefix='read-models-'), 'library.db')
+        build_sqlite(path, args.rows, args.analysis_kb)
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    from app import create_app
+    from database import db
+    from models import ImageAnalysis
+    from api.response_encoding import dumps_json
+    from services import read_models
+
+    app = create_app()
+    with app.app_context():
+        ids = [image_id for (image_id,) in db.session.query(ImageAnalysis.id).filter_by(image_type='character')]
+    if not ids:
+        sys.exit("No characters to read")
+
+    def orm_characters():
+        character_list = []
+        for char in ImageAnalysis.query.filter_by(image_type='character').all():
+            character_list.append({'id': char.id, 'name': char.character_name, 'image_url': char.image_url,
+                                   'traits': char.character_traits, 'role': char.character_role,
+                                   'plot_lines': char.plot_lines})
+        dumps_json({'characters': character_list})
+        return len(character_list)
+
+    def dto_characters():
+        character_list = read_models.character_summaries()
+        dumps_json({'characters': character_list})
+        return len(character_list)
+
+    def orm_cards():
+        cards = []
+        for img in ImageAnalysis.query.filter_by(image_type='character').order_by(db.func.random()).limit(2).all():
+            analysis = img.analysis_result or {}
+            cards.append({'id': img.id, 'image_url': img.image_url, 'name': img.character_name or '',
+                          'style': analysis.get('style', ''), 'story': analysis.get('story', ''),
+                          'character_traits': img.character_traits or [], 'plot_lines': img.plot_lines or []})
+        return len(cards)
+
+    def dto_cards():
+        return len(read_models.random_character_cards(2))
+
+    def orm_random():
+        image = ImageAnalysis.query.filter_by(image_type='character').order_by(db.func.random()).first()
+        analysis = image.analysis_result or {}
+        dumps_json({'success': True, 'id': image.id, 'image_url': image.image_url,
+                    'name': image.character_name or '', 'style': analysis.get('style', ''),
+                    'character_traits': image.character_traits or []})
+        return 1
+
+    def dto_random():
+        dumps_json({'success': True, **read_models.fields(read_models.random_character())})
+        return 1
+
+    def orm_detail():
+        image = db.session.get(ImageAnalysis, random.choice(ids))
+        dumps_json({'success': True, 'id': image.id, 'image_url': image.image_url, 'image_type': image.image_type,
+                    'analysis': image.analysis_result,
+                    'created_at': image.created_at.strftime('%Y-%m-%d %H:%M:%S')})
+        return 1
+
+    def dto_detail():
+        dumps_json({'success': True, **read_models.fields(read_models.image_detail(random.choice(ids)))})
+        return 1
+
+    def fresh(function):
+        # A new session per call, as per request, so the ORM identity map does not serve repeats
+        def call():
+            try:
+                return function()
+            finally:
+                db.session.remove()
+        return call
+
+    with app.app_context():
+        print(f"{len(ids)} characters on {db.engine.dialect.name}")
+        print(f"{'endpoint':<24}{'ORM rows/s':>12}{'DTO rows/s':>12}{'speedup':>9}")
+        for name, orm, dto in (('/api/unity/characters', orm_characters, dto_characters),
+                               ('index cards', orm_cards, dto_cards),
+                               ('/api/random_character', orm_random, dto_random),
+                               ('/api/image/<id>', orm_detail, dto_detail)):
+            orm_rate, dto_rate = rate(fresh(orm), args.seconds), rate(fresh(dto), args.seconds)
+            print(f"{name:<24}{orm_rate:>12.0f}{dto_rate:>12.0f}{dto_rate / orm_rate:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
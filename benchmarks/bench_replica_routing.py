@@ -0,0 +1,156 @@
+"""
+Check read-replica routing against two SQLite files standing in for a primary and a replica.
+
+The "replica" is refreshed from the primary with SQLite's backup API, so it is exactly as
+stale as the last refresh, and that is the lag it reports. Drives the Unity endpoints through the test client and counts
+the statements each engine ran to check that:
+  - /story-branch reads go to the replica,
+  - they fall back to the primary while the replica reports too much lag,
+  - a user reads their own save from the primary until the replica has caught up, in
+    this process and, through the last-write cookie, in another worker.
+Exits non-zero when a check fails.
+
+    python benchmarks/bench_replica_routing.py --nodes 50 --requests 200
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+from bench_worker_memory import ROOT
+
+sys.path.insert(0, ROOT)
+
+CHECK_SECONDS = 0.2
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=50, help="Length of the story branch")
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='replica-routing-')
+    primary_path = os.path.join(workdir, 'primary.db')
+    replica_path = os.path.join(workdir, 'replica.db')
+    os.environ.pop('CATALOG_MODE', None)
+    os.environ['DATABASE_URL'] = f'sqlite:///{primary_path}'
+    os.environ['DATABASE_REPLICA_URLS'] = f'sqlite:///{replica_path}'
+    os.environ['REPLICA_CHECK_SECONDS'] = str(CHECK_SECONDS)
+
+    from sqlalchemy import event
+    from sqlalchemy.dialects.postgresql import JSONB
+    from sqlalchemy.ext.compiler import compiles
+
+    # The tables used here only need JSONB to be stored, which SQLite does as JSON
+    @compiles(JSONB, 'sqlite')
+    def jsonb_as_json(type_, compiler, **kw):
+        return 'JSON'
+
+    from app import create_app
+    from database import db, router
+    from models import StoryNode, StoryChoice, UserProgress, GameStateDelta
+
+    app = create_app()
+    statements = {}
+    with app.app_context():
+        primary, replica = db.engines[None], db.engines['replica0']
+        db.metadata.create_all(primary, tables=[table.__table__ for table in
+                                                (StoryNode, StoryChoice, UserProgress, GameStateDelta)])
+        parent_id = None
+        for i in range(args.nodes):
+            node = StoryNode(narrative_text=f'Chapter {i} ' * 20, parent_node_id=parent_id,
+                             branch_metadata={'depth': i})
+            db.session.add(node)
+            db.session.flush()
+            parent_id = node.id
+        db.session.commit()
+        leaf_id = parent_id
+
+    for name, engine in (('primary', primary), ('replica', replica)):
+        statements[name] = 0
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def count(*_, name=name):
+            statements[name] += 1
+
+    replicated_at = 0.0
+
+    def replicate():
+        nonlocal replicated_at
+        source, target = sqlite3.connect(primary_path), sqlite3.connect(replica_path)
+        source.backup(target)
+        source.close()
+        target.close()
+        replicated_at = time.time()
+
+    # The replica holds the primary's data as of the last refresh
+    def copy_lag(engine):
+        return time.time() - replicated_at
+
+    def counted(function):
+        before = dict(statements)
+        result = function()
+        return result, {name: statements[name] - before[name] for name in statements}
+
+    failures = []
+
+    def check(label, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            failures.append(label)
+
+    router.measure_lag = copy_lag
+    replicate()
+    client = app.test_client()
+
+    def read_branch():
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            assert client.get(f'/api/unity/story-branch/{leaf_id}').status_code == 200
+        return args.requests / (time.perf_counter() - start)
+
+    rate, ran = counted(read_branch)
+    print(f"story-branch from the replica: {rate:.0f} req/s, statements {ran}")
+    check("read-only endpoint reads from the replica", ran['replica'] > 0 and ran['primary'] == 0)
+
+    router.measure_lag = lambda engine: 60.0
+    time.sleep(CHECK_SECONDS)
+    rate, ran = counted(read_branch)
+    print(f"story-branch with a lagging replica: {rate:.0f} req/s, statements {ran}")
+    check("lagging replica falls back to the primary", ran['replica'] == 0 and ran['primary'] > 0)
+
+    router.measure_lag = copy_lag
+    replicate()
+    time.sleep(CHECK_SECONDS)
+    user = 'bench-user'
+    response = client.post('/api/unity/save-game-state', json={'user_id': user, 'current_node_id': leaf_id})
+    check("save-game-state succeeds", response.status_code == 200)
+
+    response, ran = counted(lambda: client.get(f'/api/unity/user-progress/{user}'))
+    check("own save is read back right after writing", response.json['data']['has_progress'] and ran['replica'] == 0)
+
+    # Another worker has no record of the write; the cookie carries it
+    writes = dict(router._writes)
+    router._writes.clear()
+    response, ran = counted(lambda: client.get(f'/api/unity/user-progress/{user}'))
+    check("another worker keeps the user on the primary via the cookie",
+          response.json['data']['has_progress'] and ran['replica'] == 0)
+    router._writes.update(writes)
+
+    response, ran = counted(lambda: app.test_client().get('/api/unity/user-progress/another-user'))
+    check("users without recent writes read from the replica", ran['replica'] > 0 and ran['primary'] == 0)
+
+    replicate()
+    time.sleep(CHECK_SECONDS)
+    response, ran = counted(lambda: client.get(f'/api/unity/user-progress/{user}'))
+    check("once the replica has caught up the user reads from it",
+          response.json['data']['has_progress'] and ran['replica'] > 0 and ran['primary'] == 0)
+
+    print(f"routing {router.snapshot()}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
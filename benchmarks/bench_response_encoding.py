@@ -0,0 +1,84 @@
+"""
+Compare payload size and serialization time of the Unity API encodings.
+
+Builds a /characters-style payload from character_data.json, scaled up to the
+requested number of characters, and reports bytes and microseconds per encode
+for every encoder and compressor that is installed.
+
+    python benchmarks/bench_response_encoding.py --characters 500
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.response_encoding import orjson, msgpack, cbor2, brotli
+
+def build_payload(count):
+    """A characters response shaped like APIResponse.to_dict()"""
+    source = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'character_data.json')
+    with open(source) as f:
+        characters = json.load(f)
+
+    character_list = []
+    for i in range(count):
+        char = characters[i % len(characters)]
+        character_list.append({
+            'id': i + 1,
+            'name': char['character_name'],
+            'image_url': char['image_url'],
+            'traits': char['character_traits'],
+            'role': char['character_role'],
+            'plot_lines': char['plot_lines']
+        })
+
+    return {
+        'success': True,
+        'timestamp': datetime.utcnow().isoformat(),
+        'version': '1.0',
+        'data': {'characters': character_list},
+        'metadata': {'count': len(character_list)}
+    }
+
+def timed(fn, payload, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = fn(payload)
+    elapsed = (time.perf_counter() - start) / repeat
+    return body, elapsed * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--characters', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    payload = build_payload(args.characters)
+
+    encoders = {'json (stdlib)': lambda p: json.dumps(p).encode('utf-8')}
+    if orjson is not None:
+        encoders['json (orjson)'] = orjson.dumps
+    if msgpack is not None:
+        encoders['msgpack'] = lambda p: msgpack.packb(p, use_bin_type=True)
+    if cbor2 is not None:
+        encoders['cbor'] = cbor2.dumps
+
+    compressors = {'identity': lambda b: b, 'gzip': lambda b: gzip.compress(b, compresslevel=6)}
+    if brotli is not None:
+        compressors['br'] = lambda b: brotli.compress(b, quality=5)
+
+    print(f"{args.characters} characters, {args.repeat} runs each")
+    print(f"{'encoding':<16}{'compression':<13}{'bytes':>10}{'encode us':>12}{'total us':>12}")
+    for name, encoder in encoders.items():
+        body, encode_us = timed(encoder, payload, args.repeat)
+        for compression, compressor in compressors.items():
+            compressed, compress_us = timed(compressor, body, args.repeat)
+            print(f"{name:<16}{compression:<13}{len(compressed):>10}{encode_us:>12.0f}{encode_us + compress_us:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure application cold start in fresh interpreters.
+
+Reports:
+  import      - wall time of `import app` (module imports plus create_app)
+  templates   - time to load every template with an empty and with a warm Jinja bytecode cache
+  slowest     - the heaviest imports under app, from `python -X importtime`
+
+Runs without a database: CATALOG_MODE=1 is set unless DATABASE_URL is.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEMPLATE_SCRIPT = """
+import os, time
+from app import app
+start = time.perf_counter()
+for name in os.listdir(os.path.join(app.root_path, app.template_folder)):
+    app.jinja_env.get_template(name)
+print(time.perf_counter() - start)
+"""
+
+def environment(cache_dir):
+    env = dict(os.environ, JINJA_CACHE_DIR=cache_dir, LOG_LEVEL='WARNING')
+    if not env.get('DATABASE_URL'):
+        env['CATALOG_MODE'] = '1'
+    return env
+
+def run_python(args, env):
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+def time_import(runs, env):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_python(['-c', 'import app'], env)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def time_templates(cache_dir, env):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    cold = float(run_python(['-c', TEMPLATE_SCRIPT], env).stdout.strip())
+    warm = float(run_python(['-c', TEMPLATE_SCRIPT], env).stdout.strip())
+    return cold, warm
+
+def slowest_imports(env, count):
+    """Top-level packages imported by app, by cumulative import time"""
+    output = run_python(['-X', 'importtime', '-c', 'import app'], env).stderr
+    costs = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        top = name.strip().split('.')[0]
+        # Nested imports are listed before their parent, so the last entry per package is its total
+        costs[top] = max(costs.get(top, 0), int(cumulative))
+    costs.pop('app', None)
+    return sorted(costs.items(), key=lambda item: item[1], reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help="How many of the slowest imports to list")
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='bench_startup_jinja_')
+    env = environment(cache_dir)
+    try:
+        timings = time_import(args.runs, env)
+        print(f"import app       median {statistics.median(timings) * 1000:8.1f} ms   "
+              f"min {min(timings) * 1000:8.1f} ms   ({args.runs} runs)")
+
+        cold, warm = time_templates(cache_dir, env)
+        print(f"templates        cold cache {cold * 1000:8.1f} ms   warm cache {warm * 1000:8.1f} ms")
+
+        print("slowest imports (cumulative):")
+        for name, microseconds in slowest_imports(env, args.top):
+            print(f"  {name:<28}{microseconds / 1000:8.1f} ms")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare gunicorn worker memory with and without the preload mode (gunicorn.conf.py).
+
+Starts gunicorn twice, GUNICORN_PRELOAD=1 and 0, sends some requests so every worker
+has served traffic, then reads /proc/<pid>/smaps_rollup for each worker:
+  RSS  - resident pages, shared ones counted in full for every worker
+  PSS  - shared pages divided between the processes sharing them
+  USS  - pages private to the worker (what forking actually costs)
+
+Linux only. Runs without a database: CATALOG_MODE=1 is set unless DATABASE_URL is.
+
+    python benchmarks/bench_worker_memory.py --workers 4 --requests 200
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = ['/', '/api/random_character', '/api/image/15']
+
+def children(pid):
+    found = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, the fields after it do not
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            found.append(int(entry))
+    return found
+
+def memory(pid):
+    """RSS, PSS and USS in kB"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values['Rss'], values['Pss'], values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not answer on {url}")
+
+def measure(preload, workers, requests, port):
+    env = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0', WEB_CONCURRENCY=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}', LOG_LEVEL='WARNING')
+    if not env.get('DATABASE_URL'):
+        env['CATALOG_MODE'] = '1'
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f'http://127.0.0.1:{port}'
+        wait_until_up(base + '/')
+        for i in range(requests):
+            try:
+                urllib.request.urlopen(base + PATHS[i % len(PATHS)], timeout=10).read()
+            except OSError:
+                pass
+        time.sleep(0.5)
+        return [memory(pid) for pid in children(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=150)
+    parser.add_argument('--port', type=int, default=5077)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'workers':>8}{'RSS MB':>10}{'PSS MB':>10}{'USS MB':>10}  (average per worker)")
+    for preload in (False, True):
+        samples = measure(preload, args.workers, args.requests, args.port)
+        if not samples:
+            raise RuntimeError("No gunicorn workers found")
+        rss, pss, uss = (sum(sample[i] for sample in samples) / len(samples) / 1024 for i in range(3))
+        print(f"{'preload' if preload else 'per-worker':<10}{len(samples):>8}{rss:>10.1f}{pss:>10.1f}{uss:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import argparse
+import logging
+from services.catalog import CATALOG_FILES, build_catalog_from_json
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# JSON exports the catalogs are built from when no database is available
+JSON_SOURCES = {
+    'character': 'character_data.json',
+    'scene': 'scene_data.json',
+}
+
+def main():
+    """Build the catalog files from the JSON exports, without a database"""
+    parser = argparse.ArgumentParser(description="Build character and scene catalogs from JSON exports")
+    parser.add_argument('kinds', nargs='*', help=f"Any of {', '.join(sorted(CATALOG_FILES))} (default: all)")
+    args = parser.parse_args()
+
+    unknown = [kind for kind in args.kinds if kind not in CATALOG_FILES]
+    if unknown:
+        parser.error(f"unknown kinds: {', '.join(unknown)}")
+
+    for kind in args.kinds or sorted(CATALOG_FILES):
+        count = build_catalog_from_json(JSON_SOURCES[kind], CATALOG_FILES[kind], kind)
+        logger.info(f"Wrote {count} {kind} records to {CATALOG_FILES[kind]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import argparse
+import logging
+from app import app
+from services.bulk_ops import DEFAULT_BATCH_SIZE, delete_images, delete_stories
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Delete images or stories in batches, optionally archiving them first"""
+    parser = argparse.ArgumentParser(description="Bulk delete images or stories")
+    parser.add_argument('kind', choices=['images', 'stories'])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--ids', type=int, nargs='+', help="Delete only these ids")
+    target.add_argument('--all', action='store_true', help="Delete every record")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--archive', metavar='PATH',
+                        help="Write deleted rows as NDJSON (gzip-compressed if PATH ends in .gz)")
+    args = parser.parse_args()
+
+    delete = delete_images if args.kind == 'images' else delete_stories
+    with app.app_context():
+        result = delete(args.ids, batch_size=args.batch_size, archive_path=args.archive)
+
+    logger.info(f"Deleted {result['deleted']} {args.kind} in {result['batches']} batches")
+    if result['archive']:
+        logger.info(f"Archived to {result['archive']}")
+
+if __name__ == "__main__":
+    main()
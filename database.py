@@ -1,7 +1,343 @@
+import os
+import time
+import random
+import logging
+import functools
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import after_this_request, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.sql.expression import UpdateBase
+
+# Configure logging
+logger = logging.getLogger(__name__)
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+# Connection pool settings, per worker process. With PgBouncer in transaction pooling mode
+# (DB_PGBOUNCER=1) the bouncer does the pooling, so the app opens a connection per checkout
+# (DB_POOL_MODE=null) unless told to keep a small pool of its own.
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "300"))
+PGBOUNCER = os.environ.get("DB_PGBOUNCER", "0") == "1"
+POOL_MODE = os.environ.get("DB_POOL_MODE", "null" if PGBOUNCER else "queue")
+
+# Pooled connections idle for longer than this are tested with SELECT 1 when checked out;
+# busy connections are not, unlike pool_pre_ping which costs a round trip on every checkout
+PING_AFTER_IDLE = float(os.environ.get("DB_PING_AFTER_IDLE", "30"))
+
+# Checkouts waiting at least this long are counted as slow
+SLOW_CHECKOUT_SECONDS = 0.01
+
+class PoolMetrics:
+    """Checkout counts and wait times for one pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.saturated_checkouts = 0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.peak_checked_out = 0
+
+    def record(self, wait: float, saturated: bool, checked_out: int, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            if saturated:
+                self.saturated_checkouts += 1
+            if wait >= SLOW_CHECKOUT_SECONDS:
+                self.slow_checkouts += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'saturated_checkouts': self.saturated_checkouts,
+                'slow_checkouts': self.slow_checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'peak_checked_out': self.peak_checked_out
+            }
+
+class MeteredQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited and whether every connection
+    was in use when it was requested. Re-created pools (engine.dispose(), forked
+    workers) start with fresh metrics.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        limit = self.size() + self._max_overflow if self._max_overflow >= 0 else None
+        saturated = limit is not None and self.checkedout() >= limit
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, saturated, self.checkedout(), timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start, saturated, self.checkedout())
+        return connection
+
+def engine_options(url: Optional[str]) -> Dict[str, Any]:
+    """SQLALCHEMY_ENGINE_OPTIONS for `url`, from the DB_* environment variables"""
+    if not url or not make_url(url).drivername.startswith('postgresql'):
+        # SQLite (catalog mode, scratch databases) keeps Flask-SQLAlchemy's defaults
+        return {}
+
+    driver = make_url(url).drivername
+    connect_args: Dict[str, Any] = {
+        # Dead peers are detected by the kernel instead of by a ping per checkout
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 3
+    }
+    if PGBOUNCER and driver == 'postgresql+psycopg':
+        # psycopg 3 prepares repeated statements server-side; under transaction pooling the
+        # next transaction may run on a server connection that never saw the PREPARE.
+        # psycopg2, the default driver, never uses server-side prepared statements.
+        connect_args['prepare_threshold'] = None
+
+    if POOL_MODE == 'null':
+        return {'poolclass': NullPool, 'connect_args': connect_args}
+    return {
+        'poolclass': MeteredQueuePool,
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_timeout': POOL_TIMEOUT,
+        'pool_recycle': POOL_RECYCLE,
+        # Reuse the most recently returned connection, so surplus ones go idle and age out
+        'pool_use_lifo': True,
+        'connect_args': connect_args
+    }
+
+def _record_checkin(dbapi_connection, connection_record):
+    connection_record.info['checked_in_at'] = time.monotonic()
+
+def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+    checked_in_at = connection_record.info.get('checked_in_at')
+    if checked_in_at is None or time.monotonic() - checked_in_at < PING_AFTER_IDLE:
+        return
+    try:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+    except Exception as e:
+        # The pool discards this connection and retries the checkout with a new one
+        logger.info(f"Discarding a stale pooled connection: {str(e)}")
+        raise exc.DisconnectionError() from e
+
+def configure_engine(engine) -> None:
+    """Install the idle-connection liveness check on a pooled engine; safe to call more than once"""
+    if isinstance(engine.pool, QueuePool) and not event.contains(engine, 'checkout', _ping_if_idle):
+        event.listen(engine, 'checkin', _record_checkin)
+        event.listen(engine, 'checkout', _ping_if_idle)
+
+def pool_stats(engine) -> Dict[str, Any]:
+    """Current state of the engine's pool in this process, with checkout metrics when metered"""
+    pool = engine.pool
+    stats: Dict[str, Any] = {'pool': type(pool).__name__, 'pgbouncer': PGBOUNCER}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0)
+        })
+    if isinstance(pool, MeteredQueuePool):
+        stats.update(pool.metrics.snapshot())
+    return stats
+
+# Read replicas, as comma-separated URLs. Views marked with read_replica and queries marked
+# with execution_options(replica=True) read from one whose replication lag is at most
+# REPLICA_MAX_LAG_SECONDS; otherwise, and for every write, the primary is used.
+REPLICA_URLS = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "5"))
+# How long a replica's measured lag (or failure to answer) is trusted before measuring again
+REPLICA_CHECK_INTERVAL = float(os.environ.get("REPLICA_CHECK_SECONDS", "5"))
+
+# Replicas are Flask-SQLAlchemy binds named replica0, replica1, ...; no model is mapped to them
+REPLICA_BIND_PREFIX = 'replica'
+
+# Carries the time of a client's last write to the other workers, which do not share note_write's map
+LAST_WRITE_COOKIE = 'db_last_write'
+
+def replica_binds(urls: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """SQLALCHEMY_BINDS entries for the replica URLs, with the same pool settings as the primary"""
+    return {f'{REPLICA_BIND_PREFIX}{i}': {'url': url, **engine_options(url)}
+            for i, url in enumerate(REPLICA_URLS if urls is None else urls)}
+
+def replica_lag(engine) -> float:
+    """
+    Seconds the replica is behind its primary. A standby that has replayed everything it
+    received is current even if the primary has been idle; other databases only have to
+    answer, and count as current.
+    """
+    with engine.connect() as connection:
+        if engine.dialect.name != 'postgresql':
+            connection.execute(text("SELECT 1"))
+            return 0.0
+        lag = connection.execute(text(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+            "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+        )).scalar()
+    return float('inf') if lag is None else float(lag)
+
+class ReplicaRouter:
+    """Chooses a replica that is current enough for a read, or None for the primary"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # bind key -> (time of the measurement, lag then)
+        self._lag: Dict[str, Tuple[float, float]] = {}
+        # user id -> time of that user's last write through this process
+        self._writes: Dict[str, float] = {}
+        self.measure_lag = replica_lag
+        self.stats = {'replica_reads': 0, 'primary_fallbacks': 0}
+
+    def lag(self, key: str, engine) -> Tuple[float, float]:
+        now = time.time()
+        with self._lock:
+            measured = self._lag.get(key)
+        if measured is None or now - measured[0] >= REPLICA_CHECK_INTERVAL:
+            try:
+                lag = self.measure_lag(engine)
+            except Exception as e:
+                logger.warning(f"Read replica {key} is unavailable, reading from the primary: {str(e)}")
+                lag = float('inf')
+            measured = (now, lag)
+            with self._lock:
+                self._lag[key] = measured
+        return measured
+
+    def choose(self, engines, written_at: Optional[float] = None):
+        """
+        A replica within REPLICA_MAX_LAG; with `written_at`, only one that had replayed up
+        to that time when last measured, so a user reads their own write.
+        """
+        keys = [key for key in engines if key and key.startswith(REPLICA_BIND_PREFIX)]
+        if not keys:
+            return None
+        current = []
+        for key in keys:
+            measured_at, lag = self.lag(key, engines[key])
+            if lag <= REPLICA_MAX_LAG and (written_at is None or measured_at - lag >= written_at):
+                current.append(key)
+        with self._lock:
+            self.stats['replica_reads' if current else 'primary_fallbacks'] += 1
+        return engines[random.choice(current)] if current else None
+
+    def note_write(self, user_id: str) -> float:
+        now = time.time()
+        with self._lock:
+            # After this long every replica that is still chosen has replayed the write
+            horizon = now - REPLICA_MAX_LAG - REPLICA_CHECK_INTERVAL
+            for stale in [user for user, at in self._writes.items() if at < horizon]:
+                del self._writes[stale]
+            self._writes[user_id] = now
+        return now
+
+    def last_write(self, user_id: Optional[str]) -> Optional[float]:
+        with self._lock:
+            written_at = self._writes.get(user_id) if user_id else None
+        try:
+            cookie = float(request.cookies.get(LAST_WRITE_COOKIE, '')) if has_request_context() else None
+        except ValueError:
+            cookie = None
+        present = [at for at in (written_at, cookie) if at is not None]
+        return max(present) if present else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                'max_lag_seconds': REPLICA_MAX_LAG,
+                'lag_seconds': {key: (None if lag == float('inf') else round(lag, 3))
+                                for key, (_, lag) in sorted(self._lag.items())}
+            }
+
+router = ReplicaRouter()
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to a read replica when the view or the statement asks for it
+    (see read_replica). Writes, and every read after the session's first flush, go to the
+    primary, so a request always sees what it wrote.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause, kwargs):
+            engine = router.choose(self._db.engines, self.info.get('written_at'))
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause, bind_arguments) -> bool:
+        if self._flushing or self.info.get('wrote') or isinstance(clause, UpdateBase):
+            return False
+        if 'replica' in bind_arguments:
+            return bool(bind_arguments['replica'])
+        options = clause.get_execution_options() if hasattr(clause, 'get_execution_options') else {}
+        return bool(options.get('replica', self.info.get('replica', False)))
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _pin_to_primary(session, flush_context):
+    session.info['wrote'] = True
+
+def read_replica(view=None, *, user_arg: Optional[str] = None):
+    """
+    Serve a read-only view from a read replica. With `user_arg`, the name of the view
+    argument holding a user id, that user's reads stay on the primary until a replica has
+    caught up with their last write (note_write).
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapped(*args, **kwargs):
+            info = db.session.info
+            info['replica'] = True
+            if user_arg:
+                info['written_at'] = router.last_write(kwargs.get(user_arg))
+            try:
+                return f(*args, **kwargs)
+            finally:
+                info.pop('replica', None)
+                info.pop('written_at', None)
+        return wrapped
+    return decorator(view) if view is not None else decorator
+
+def note_write(user_id: str) -> None:
+    """Record a committed write by `user_id`, for read-your-writes in read_replica views"""
+    if not any(key and key.startswith(REPLICA_BIND_PREFIX) for key in db.engines):
+        return
+    written_at = router.note_write(user_id)
+    if has_request_context():
+        @after_this_request
+        def remember_write(response):
+            response.set_cookie(LAST_WRITE_COOKIE, f'{written_at:.3f}',
+                                max_age=int(REPLICA_MAX_LAG + REPLICA_CHECK_INTERVAL) + 1, httponly=True)
+            return response
+
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
@@ -0,0 +1,23 @@
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "3"))
+
+# Load the app once in the master and fork workers from it, so read-mostly state
+# (code, templates, catalogs, achievement definitions) is shared copy-on-write.
+# Set GUNICORN_PRELOAD=0 to have each worker import the app itself.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before the first worker is forked"""
+    if preload_app:
+        from app import app
+        from services.preload import preload_shared_state
+        preload_shared_state(app)
+
+def post_fork(server, worker):
+    """Runs in each worker right after the fork"""
+    if preload_app:
+        from app import app
+        from services.preload import reset_after_fork
+        reset_after_fork(app)
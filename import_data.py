@@ -0,0 +1,37 @@
+import argparse
+import logging
+from app import app
+from services.importer import IMPORT_BATCH_SIZE, import_file
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Exports loaded when no files are given
+DEFAULT_FILES = ['character_data.json', 'scene_data.json']
+
+def main():
+    """Seed the database from character and scene exports"""
+    parser = argparse.ArgumentParser(description="Import character and scene exports into the database")
+    parser.add_argument('paths', nargs='*', default=DEFAULT_FILES,
+                        help="Export files (json, ndjson, csv, xml or catalog, optionally .gz)")
+    parser.add_argument('--kind', choices=['character', 'scene'],
+                        help="Record kind (default: inferred from each file name)")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument('--copy', action='store_true',
+                        help="Load each batch with COPY through a staging table instead of multi-row INSERTs")
+    parser.add_argument('--embed', action='store_true',
+                        help="Compute embeddings for images that do not have one after importing")
+    args = parser.parse_args()
+
+    with app.app_context():
+        for path in args.paths:
+            count = import_file(path, kind=args.kind, batch_size=args.batch_size, use_copy=args.copy)
+            logger.info(f"Imported {count} records from {path}")
+
+        if args.embed:
+            from services.embedding_index import backfill_embeddings
+            logger.info(f"Embedded {backfill_embeddings()} images")
+
+if __name__ == "__main__":
+    main()
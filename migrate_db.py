@@ -2,6 +2,12 @@
 from app import app, db
 from models import ImageAnalysis
 
+def create_schema():
+    """Create missing tables, with their triggers and partitions; the app no longer does this at startup"""
+    with app.app_context():
+        db.create_all()
+        print("Database tables are in place")
+
 def migrate_database():
     """Add missing columns to image_analysis table"""
     with app.app_context():
@@ -25,7 +31,8 @@ def migrate_database():
             'setting': 'VARCHAR(255)',
             'setting_description': 'TEXT',
             'story_fit': 'VARCHAR(255)',
-            'dramatic_moments': 'JSONB'
+            'dramatic_moments': 'JSONB',
+            'updated_at': 'TIMESTAMP'
         }
         
         # Check if we need to fix any inconsistent column names
@@ -54,4 +61,5 @@ def migrate_database():
         print("Database migration completed successfully")
 
 if __name__ == "__main__":
+    create_schema()
     migrate_database()
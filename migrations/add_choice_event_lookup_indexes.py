@@ -0,0 +1,34 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Indexes used by the achievement checks to look up specific nodes and choices of one user
+INDEXES = {
+    'ix_choice_event_user_node': "CREATE INDEX IF NOT EXISTS ix_choice_event_user_node ON choice_event (user_id, node_id)",
+    'ix_choice_event_user_next_node': "CREATE INDEX IF NOT EXISTS ix_choice_event_user_next_node ON choice_event (user_id, next_node_id)",
+    'ix_choice_event_user_choice': "CREATE INDEX IF NOT EXISTS ix_choice_event_user_choice ON choice_event (user_id, choice_id)",
+}
+
+def upgrade():
+    """Create the choice_event lookup indexes on every partition"""
+    with app.app_context():
+        try:
+            # CREATE INDEX CONCURRENTLY is not supported on a partitioned parent, so each
+            # index is built in its own transaction to keep the write lock short
+            for name, statement in INDEXES.items():
+                with db.engine.begin() as connection:
+                    connection.execute(db.text(statement))
+                logger.info(f"Index {name} is in place")
+        except Exception as e:
+            logger.error(f"Error in migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    upgrade()
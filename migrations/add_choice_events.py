@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from models import ChoiceEvent, UserProgress
+from services.partitions import create_default_partition, ensure_monthly_partitions
+from services.choice_log import append_history_entries
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def upgrade():
+    """Create the partitioned choice_event table and backfill it from choice_history"""
+    with app.app_context():
+        try:
+            inspector = db.inspect(db.engine)
+            if 'choice_event' not in inspector.get_table_names():
+                ChoiceEvent.__table__.create(db.engine)
+                logger.info("Created partitioned choice_event table")
+            else:
+                logger.info("choice_event table already exists")
+
+            # Make sure the upcoming monthly partitions exist
+            with db.engine.begin() as connection:
+                create_default_partition(connection, 'choice_event')
+                partitions = ensure_monthly_partitions(connection, 'choice_event')
+            logger.info(f"Partitions available: {', '.join(partitions)}")
+
+            # Backfill users that only have the legacy JSONB history
+            migrated = 0
+            logged_users = {row[0] for row in db.session.query(ChoiceEvent.user_id).distinct()}
+            for progress in UserProgress.query.filter(UserProgress.choice_history.isnot(None)).yield_per(500):
+                if progress.user_id in logged_users or not isinstance(progress.choice_history, list):
+                    continue
+                migrated += len(append_history_entries(progress.user_id, progress.choice_history))
+            db.session.commit()
+            logger.info(f"Backfilled {migrated} choice events from choice_history")
+
+        except Exception as e:
+            logger.error(f"Error in migration: {str(e)}")
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,39 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from services import derived_fields
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    'ix_image_analysis_character_role': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_image_analysis_character_role ON image_analysis (character_role, id) WHERE image_type = 'character'",
+    'ix_image_analysis_traits': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_image_analysis_traits ON image_analysis USING gin (character_traits jsonb_path_ops)",
+}
+
+def upgrade():
+    """Install the derived-fields trigger, re-derive existing rows and index the derived columns"""
+    with app.app_context():
+        try:
+            with db.engine.begin() as connection:
+                derived_fields.install(connection)
+
+            updated = derived_fields.backfill()
+            logger.info(f"Re-derived fields for {updated} images")
+
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+            with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                for name, statement in INDEXES.items():
+                    connection.execute(db.text(statement))
+                    logger.info(f"Index {name} is in place")
+
+        except Exception as e:
+            logger.error(f"Error in migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,38 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from models import GameStateDelta
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def upgrade():
+    """Add version columns to user_progress and create the game_state_delta table"""
+    with app.app_context():
+        try:
+            inspector = db.inspect(db.engine)
+            column_names = [col['name'] for col in inspector.get_columns('user_progress')]
+
+            with db.engine.begin() as connection:
+                for column in ('state_version', 'snapshot_version'):
+                    if column not in column_names:
+                        connection.execute(db.text(
+                            f"ALTER TABLE user_progress ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+                        ))
+                        logger.info(f"Added {column} column to user_progress table")
+                    else:
+                        logger.info(f"{column} column already exists")
+
+            GameStateDelta.__table__.create(db.engine, checkfirst=True)
+            logger.info("game_state_delta table is in place")
+
+        except Exception as e:
+            logger.error(f"Error in migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    upgrade()
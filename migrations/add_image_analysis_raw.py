@@ -0,0 +1,63 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from models import ImageAnalysisRaw
+from services import derived_fields
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+def upgrade():
+    """Move analysis_result out of image_analysis into the image_analysis_raw side table"""
+    with app.app_context():
+        try:
+            # Creating the table installs the derived-fields trigger on it (models.py)
+            ImageAnalysisRaw.__table__.create(db.engine, checkfirst=True)
+            logger.info("image_analysis_raw table is in place")
+            with db.engine.begin() as connection:
+                derived_fields.install(connection)
+
+            inspector = db.inspect(db.engine)
+            column_names = [col['name'] for col in inspector.get_columns('image_analysis')]
+            if 'analysis_result' not in column_names:
+                logger.info("analysis_result has already been moved")
+                return
+
+            # Copy in id-ordered batches, committing after each so locks stay short and an
+            # interrupted run can simply be repeated. Derived columns are unchanged, so the
+            # trigger leaves the image rows (and their updated_at) alone.
+            copied = 0
+            last_id = 0
+            while True:
+                with db.engine.begin() as connection:
+                    ids = connection.execute(db.text(
+                        "SELECT id FROM image_analysis WHERE id > :last_id ORDER BY id LIMIT :limit"
+                    ), {'last_id': last_id, 'limit': BATCH_SIZE}).scalars().all()
+                    if not ids:
+                        break
+                    copied += connection.execute(db.text(
+                        "INSERT INTO image_analysis_raw (image_id, analysis_result) "
+                        "SELECT id, analysis_result FROM image_analysis "
+                        "WHERE id BETWEEN :first AND :last AND analysis_result IS NOT NULL "
+                        "ON CONFLICT (image_id) DO UPDATE SET analysis_result = EXCLUDED.analysis_result"
+                    ), {'first': ids[0], 'last': ids[-1]}).rowcount
+                last_id = ids[-1]
+                logger.info(f"Copied {copied} analyses (through id {last_id})")
+
+            with db.engine.begin() as connection:
+                connection.execute(db.text("ALTER TABLE image_analysis DROP COLUMN analysis_result"))
+            logger.info("Dropped analysis_result from image_analysis; run VACUUM FULL image_analysis "
+                        "(or pg_repack) in a quiet period to reclaim its space")
+
+        except Exception as e:
+            logger.error(f"Error in migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,30 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from models import ImageEmbedding
+from services.embedding_index import backfill_embeddings, model_key
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def upgrade():
+    """Create the image_embedding table and embed every image that has no vector yet"""
+    with app.app_context():
+        try:
+            ImageEmbedding.__table__.create(db.engine, checkfirst=True)
+            logger.info("image_embedding table is in place")
+
+            embedded = backfill_embeddings()
+            logger.info(f"Embedded {embedded} images with {model_key()}")
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error in migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    upgrade()
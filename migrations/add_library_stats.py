@@ -0,0 +1,32 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from models import LibraryStat
+from services import library_stats
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def upgrade():
+    """Create the library_stat table, its triggers and the orphaned-images materialized view"""
+    with app.app_context():
+        try:
+            LibraryStat.__table__.create(db.engine, checkfirst=True)
+            logger.info("library_stat table is in place")
+
+            with db.engine.begin() as connection:
+                library_stats.install(connection)
+
+            for name, value in library_stats.get_library_stats().items():
+                logger.info(f"{name}: {value}")
+
+        except Exception as e:
+            logger.error(f"Error in migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    upgrade()
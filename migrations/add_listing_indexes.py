@@ -0,0 +1,32 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Indexes used by the keyset-paginated listing endpoints
+INDEXES = {
+    'ix_story_images_image_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_story_images_image_id ON story_images (image_id)",
+    'ix_image_analysis_type_id': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_image_analysis_type_id ON image_analysis (image_type, id)",
+}
+
+def upgrade():
+    """Create indexes for the listing endpoints without blocking writes"""
+    with app.app_context():
+        try:
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+            with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                for name, statement in INDEXES.items():
+                    connection.execute(db.text(statement))
+                    logger.info(f"Index {name} is in place")
+        except Exception as e:
+            logger.error(f"Error in migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    upgrade()
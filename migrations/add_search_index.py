@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from models import IMAGE_SEARCH_DOCUMENT, STORY_SEARCH_DOCUMENT
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = {
+    'image_analysis': IMAGE_SEARCH_DOCUMENT,
+    'story_generation': STORY_SEARCH_DOCUMENT,
+}
+
+INDEXES = {
+    'ix_image_analysis_search': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_image_analysis_search ON image_analysis USING gin (search_vector)",
+    'ix_image_analysis_name_trgm': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_image_analysis_name_trgm ON image_analysis USING gin (character_name gin_trgm_ops)",
+    'ix_story_generation_search': "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_story_generation_search ON story_generation USING gin (search_vector)",
+}
+
+def upgrade():
+    """Add generated tsvector columns, the pg_trgm extension and the search indexes"""
+    with app.app_context():
+        try:
+            inspector = db.inspect(db.engine)
+
+            with db.engine.begin() as connection:
+                connection.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for table, document in SEARCH_COLUMNS.items():
+                    column_names = [col['name'] for col in inspector.get_columns(table)]
+                    if 'search_vector' in column_names:
+                        logger.info(f"search_vector column already exists on {table}")
+                        continue
+                    # Stored generated columns are kept up to date by Postgres on every write
+                    connection.execute(db.text(
+                        f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+                        f"GENERATED ALWAYS AS ({document}) STORED"
+                    ))
+                    logger.info(f"Added search_vector column to {table}")
+
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+            with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                for name, statement in INDEXES.items():
+                    connection.execute(db.text(statement))
+                    logger.info(f"Index {name} is in place")
+
+        except Exception as e:
+            logger.error(f"Error in migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    upgrade()
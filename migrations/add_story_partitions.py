@@ -0,0 +1,87 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from models import StoryGeneration
+from services import library_stats
+from services.partitions import ensure_monthly_partitions, month_bounds, months_between
+from datetime import datetime
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LEGACY_TABLE = 'story_generation_legacy'
+
+# Relations of the unpartitioned table whose names the new table reuses
+LEGACY_RENAMES = {
+    'INDEX': ('story_generation_pkey', 'ix_story_generation_search', 'ix_story_generation_created_at'),
+    'SEQUENCE': ('story_generation_id_seq',),
+}
+
+def upgrade():
+    """Rebuild story_generation as a table range-partitioned by month on created_at"""
+    with app.app_context():
+        try:
+            with db.engine.begin() as connection:
+                partitioned = connection.execute(db.text(
+                    "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('story_generation')"
+                )).scalar()
+                if partitioned:
+                    logger.info("story_generation is already partitioned")
+                    return
+
+                # Postgres cannot partition a table in place: the old table is renamed and
+                # copied into the new one. Stories are locked until the copy commits.
+                connection.execute(db.text("LOCK TABLE story_generation IN ACCESS EXCLUSIVE MODE"))
+                foreign_keys = connection.execute(db.text(
+                    "SELECT conname FROM pg_constraint "
+                    "WHERE conrelid = 'story_images'::regclass AND confrelid = 'story_generation'::regclass"
+                )).scalars().all()
+                for name in foreign_keys:
+                    connection.execute(db.text(f"ALTER TABLE story_images DROP CONSTRAINT {name}"))
+                    logger.info(f"Dropped foreign key {name}; partitioned story ids cannot be referenced")
+
+                connection.execute(db.text(f"ALTER TABLE story_generation RENAME TO {LEGACY_TABLE}"))
+                for kind, names in LEGACY_RENAMES.items():
+                    for name in names:
+                        legacy_name = name.replace('story_generation', LEGACY_TABLE, 1)
+                        connection.execute(db.text(f"ALTER {kind} IF EXISTS {name} RENAME TO {legacy_name}"))
+
+                # Creating the table also creates the default and upcoming partitions (models.py);
+                # the months with existing stories are added before copying
+                StoryGeneration.__table__.create(connection)
+                oldest = connection.execute(db.text(f"SELECT min(created_at) FROM {LEGACY_TABLE}")).scalar()
+                if oldest:
+                    month_start, _ = month_bounds(oldest.date())
+                    partitions = ensure_monthly_partitions(
+                        connection, 'story_generation',
+                        months_ahead=months_between(month_start, datetime.utcnow().date()), start=month_start
+                    )
+                    logger.info(f"Created partitions {partitions[0]} through {partitions[-1]}")
+
+                columns = ', '.join(column.name for column in StoryGeneration.__table__.columns
+                                    if column.name not in ('search_vector', 'created_at'))
+                copied = connection.execute(db.text(
+                    f"INSERT INTO story_generation ({columns}, created_at) "
+                    f"SELECT {columns}, coalesce(created_at, now() AT TIME ZONE 'utc') FROM {LEGACY_TABLE}"
+                )).rowcount
+                connection.execute(db.text(
+                    "SELECT setval(pg_get_serial_sequence('story_generation', 'id'), "
+                    "coalesce(max(id), 1), max(id) IS NOT NULL) FROM story_generation"
+                ))
+                connection.execute(db.text(f"DROP TABLE {LEGACY_TABLE}"))
+                logger.info(f"Copied {copied} stories into the partitioned story_generation table")
+
+                # The counter triggers went with the old table
+                if connection.execute(db.text("SELECT to_regclass('library_stat')")).scalar():
+                    library_stats.install(connection)
+
+        except Exception as e:
+            logger.error(f"Error in migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    upgrade()
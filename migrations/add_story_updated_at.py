@@ -0,0 +1,35 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TABLES = ('story_node', 'story_choice')
+
+def upgrade():
+    """Add updated_at row versions to story_node and story_choice for the HTTP validators"""
+    with app.app_context():
+        try:
+            inspector = db.inspect(db.engine)
+
+            with db.engine.begin() as connection:
+                for table in TABLES:
+                    column_names = [col['name'] for col in inspector.get_columns(table)]
+                    if 'updated_at' in column_names:
+                        logger.info(f"updated_at column already exists on {table}")
+                        continue
+                    connection.execute(db.text(f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP"))
+                    connection.execute(db.text(f"UPDATE {table} SET updated_at = created_at"))
+                    logger.info(f"Added updated_at column to {table}")
+
+        except Exception as e:
+            logger.error(f"Error in migration: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    upgrade()
@@ -1,47 +1,136 @@
 from datetime import datetime
-from app import db
+from database import db
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import FetchedValue, event
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm import deferred
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from services.partitions import create_default_partition, ensure_monthly_partitions
+from services import derived_fields, library_stats
 
-# Association table for many-to-many relationship between stories and images
+# Full-text documents for the search index, maintained by Postgres as stored generated columns
+IMAGE_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(character_name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(character_traits, '[]'::jsonb)), 'B') || "
+    "setweight(to_tsvector('english', coalesce(setting, '') || ' ' || coalesce(setting_description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(plot_lines, '[]'::jsonb)), 'C') || "
+    "setweight(to_tsvector('english', coalesce(dramatic_moments, '[]'::jsonb)), 'C')"
+)
+STORY_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(primary_conflict, '') || ' ' || coalesce(setting, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(generated_story, '{}'::jsonb)), 'B')"
+)
+
+@event.listens_for(db.metadata, 'before_create')
+def _create_search_extensions(target, connection, **kw):
+    """Trigram matching for fuzzy name search needs pg_trgm"""
+    if connection.dialect.name == 'postgresql':
+        connection.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+# Association table for many-to-many relationship between stories and images. story_id has
+# no foreign key: story_generation is partitioned, so its id alone cannot be referenced.
 story_images = db.Table('story_images',
-    db.Column('story_id', db.Integer, db.ForeignKey('story_generation.id'), primary_key=True),
-    db.Column('image_id', db.Integer, db.ForeignKey('image_analysis.id'), primary_key=True)
+    db.Column('story_id', db.Integer, primary_key=True),
+    db.Column('image_id', db.Integer, db.ForeignKey('image_analysis.id'), primary_key=True),
+    # The primary key leads with story_id, lookups by image need their own index
+    db.Index('ix_story_images_image_id', 'image_id')
 )
 
 class StoryGeneration(db.Model):
-    """Model for storing generated story segments and their choices"""
-    id = db.Column(db.Integer, primary_key=True)
+    """
+    Model for storing generated story segments and their choices, range-partitioned by
+    month on created_at; old months are archived by services/story_archive.py
+    """
+    # The partition key has to be part of the primary key on a partitioned table;
+    # the ORM still identifies stories by id alone
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     primary_conflict = db.Column(db.String(255))
     setting = db.Column(db.String(255))
     narrative_style = db.Column(db.String(255))
     mood = db.Column(db.String(255))
     generated_story = db.Column(JSONB)  # Stores the story text and choices
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, primary_key=True, default=datetime.utcnow)
+    search_vector = deferred(db.Column(TSVECTOR, db.Computed(STORY_SEARCH_DOCUMENT, persisted=True)))
+
+    __table_args__ = (
+        db.Index('ix_story_generation_search', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_story_generation_created_at', 'created_at'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+    __mapper_args__ = {'primary_key': [id]}
 
     # Many-to-many relationship with ImageAnalysis
     images = db.relationship('ImageAnalysis', secondary=story_images,
+                           primaryjoin='StoryGeneration.id == foreign(story_images.c.story_id)',
+                           secondaryjoin='ImageAnalysis.id == foreign(story_images.c.image_id)',
                            backref=db.backref('stories', lazy='dynamic'))
 
+@event.listens_for(StoryGeneration.__table__, 'after_create')
+def _create_story_partitions(target, connection, **kw):
+    """Create the default and upcoming monthly partitions right after the parent table"""
+    create_default_partition(connection, target.name)
+    ensure_monthly_partitions(connection, target.name)
+
+# Columns filled from image_analysis_raw.analysis_result by a trigger, see
+# services/derived_fields.py; the ORM reloads them after every insert or update
+DERIVED = dict(server_default=FetchedValue(), server_onupdate=FetchedValue())
+
 class ImageAnalysis(db.Model):
     """Model for storing analyzed character or scene images"""
+    __table_args__ = (
+        db.Index('ix_image_analysis_type_id', 'image_type', 'id'),  # Keyset pagination per type
+        db.Index('ix_image_analysis_search', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_image_analysis_name_trgm', 'character_name', postgresql_using='gin',
+                 postgresql_ops={'character_name': 'gin_trgm_ops'}),
+        db.Index('ix_image_analysis_character_role', 'character_role', 'id',
+                 postgresql_where=db.text("image_type = 'character'")),
+        db.Index('ix_image_analysis_traits', 'character_traits', postgresql_using='gin',
+                 postgresql_ops={'character_traits': 'jsonb_path_ops'}),  # Trait containment (@>)
+    )
     id = db.Column(db.Integer, primary_key=True)
     image_url = db.Column(db.String(1024), nullable=False)
     image_width = db.Column(db.Integer)
     image_height = db.Column(db.Integer)
     image_format = db.Column(db.String(16))
     image_size_bytes = db.Column(db.Integer)
-    image_type = db.Column(db.String(32))  # 'character' or 'scene'
-    analysis_result = db.Column(JSONB)  # Full analysis from OpenAI
-    character_name = db.Column(db.String(255))  # Name of the character
-    character_traits = db.Column(JSONB)  # Array of character traits if a character
-    character_role = db.Column(db.String(32))  # 'hero', 'villain', or 'neutral'
-    plot_lines = db.Column(JSONB)  # Array of plot line suggestions for the character
-    scene_type = db.Column(db.String(64))  # E.g., 'narrative', 'choice', 'action'
-    setting = db.Column(db.String(255))  # Setting of the scene
-    setting_description = db.Column(db.Text)  # Detailed description of the setting
-    story_fit = db.Column(db.String(255))  # How well the scene fits in the story
-    dramatic_moments = db.Column(JSONB)  # Array of dramatic moments in the scene
+    image_type = db.Column(db.String(32), **DERIVED)  # 'character' or 'scene'
+    character_name = db.Column(db.String(255), **DERIVED)  # Name of the character
+    character_traits = db.Column(JSONB, **DERIVED)  # Array of character traits if a character
+    character_role = db.Column(db.String(32), **DERIVED)  # 'hero', 'villain', or 'neutral'
+    plot_lines = db.Column(JSONB, **DERIVED)  # Array of plot line suggestions for the character
+    scene_type = db.Column(db.String(64), **DERIVED)  # E.g., 'narrative', 'choice', 'action'
+    setting = db.Column(db.String(255), **DERIVED)  # Setting of the scene
+    setting_description = db.Column(db.Text, **DERIVED)  # Detailed description of the setting
+    story_fit = db.Column(db.String(255), **DERIVED)  # How well the scene fits in the story
+    dramatic_moments = db.Column(JSONB, **DERIVED)  # Array of dramatic moments in the scene
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Row version for HTTP validators
+    search_vector = deferred(db.Column(TSVECTOR, db.Computed(IMAGE_SEARCH_DOCUMENT, persisted=True)))  # Full-text index document
+
+    # The full analysis lives in image_analysis_raw and is only loaded when accessed
+    raw_analysis = db.relationship('ImageAnalysisRaw', uselist=False, lazy='select',
+                                   cascade='all, delete-orphan', passive_deletes=True)
+    analysis_result = association_proxy('raw_analysis', 'analysis_result',
+                                        creator=lambda analysis: ImageAnalysisRaw(analysis_result=analysis))
+
+class ImageAnalysisRaw(db.Model):
+    """Full analysis from the model for an ImageAnalysis row, kept out of the hot image table"""
+    __tablename__ = 'image_analysis_raw'
+    image_id = db.Column(db.Integer, db.ForeignKey('image_analysis.id', ondelete='CASCADE'), primary_key=True)
+    analysis_result = db.Column(JSONB)
+
+@event.listens_for(ImageAnalysisRaw.__table__, 'after_create')
+def _install_derived_fields(target, connection, **kw):
+    """Derive the flat image_analysis columns from analysis_result in the database"""
+    derived_fields.install(connection)
+
+class ImageEmbedding(db.Model):
+    """Embedding vector for an ImageAnalysis row, stored as packed float32 bytes"""
+    __tablename__ = 'image_embedding'
+    image_id = db.Column(db.Integer, db.ForeignKey('image_analysis.id', ondelete='CASCADE'), primary_key=True)
+    model = db.Column(db.String(128), nullable=False)  # Provider and model that produced the vector
+    dimensions = db.Column(db.Integer, nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class StoryNode(db.Model):
@@ -52,6 +141,7 @@ class StoryNode(db.Model):
     is_endpoint = db.Column(db.Boolean, default=False)
     generated_by_ai = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Row version for HTTP validators
     achievement_id = db.Column(db.Integer, db.ForeignKey('achievement.id'))  # New: Link to achievement
     branch_metadata = db.Column(JSONB)  # New: Store branch-specific metadata
     parent_node_id = db.Column(db.Integer, db.ForeignKey('story_node.id'))  # New: Track story hierarchy
@@ -79,6 +169,7 @@ class StoryChoice(db.Model):
     choice_text = db.Column(db.String(500), nullable=False)
     next_node_id = db.Column(db.Integer, db.ForeignKey('story_node.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Row version for HTTP validators
     choice_metadata = db.Column(JSONB)  # New: Store choice-specific metadata
 
     # Simple relationship with the next node
@@ -92,13 +183,50 @@ class UserProgress(db.Model):
     user_id = db.Column(db.String(255), nullable=False)  # Can be session ID for anonymous users
     current_node_id = db.Column(db.Integer, db.ForeignKey('story_node.id'))
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    choice_history = db.Column(JSONB)  # New: Track user's choice history
+    choice_history = db.Column(JSONB)  # Legacy: superseded by ChoiceEvent rows
     achievements_earned = db.Column(JSONB)  # New: Track earned achievements
-    game_state = db.Column(JSONB)  # New: Store additional game state data
+    game_state = db.Column(JSONB)  # Latest full snapshot of the game state
+    state_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Compare-and-swap counter
+    snapshot_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Version stored in game_state
 
     # Relationship with current node
     current_node = db.relationship('StoryNode')
 
+class ChoiceEvent(db.Model):
+    """Append-only log of choices made by users, range-partitioned by month on created_at"""
+    __tablename__ = 'choice_event'
+    __table_args__ = (
+        db.Index('ix_choice_event_user_created', 'user_id', 'created_at'),
+        # Achievement checks look up specific nodes and choices of one user
+        db.Index('ix_choice_event_user_node', 'user_id', 'node_id'),
+        db.Index('ix_choice_event_user_next_node', 'user_id', 'next_node_id'),
+        db.Index('ix_choice_event_user_choice', 'user_id', 'choice_id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+    # The partition key has to be part of the primary key on a partitioned table
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    created_at = db.Column(db.DateTime, primary_key=True, default=datetime.utcnow)
+    user_id = db.Column(db.String(255), nullable=False)
+    node_id = db.Column(db.Integer)  # Node the choice was made on
+    choice_id = db.Column(db.Integer)  # StoryChoice that was selected
+    next_node_id = db.Column(db.Integer)  # Node the choice led to
+
+@event.listens_for(ChoiceEvent.__table__, 'after_create')
+def _create_choice_event_partitions(target, connection, **kw):
+    """Create the default and upcoming monthly partitions right after the parent table"""
+    create_default_partition(connection, target.name)
+    ensure_monthly_partitions(connection, target.name)
+
+class GameStateDelta(db.Model):
+    """Game state patches saved since the last full snapshot in UserProgress.game_state"""
+    __tablename__ = 'game_state_delta'
+    progress_id = db.Column(db.Integer, db.ForeignKey('user_progress.id', ondelete='CASCADE'), primary_key=True)
+    version = db.Column(db.Integer, primary_key=True)  # State version this patch produces
+    patch_format = db.Column(db.String(16), nullable=False)  # 'merge' (RFC 7386) or 'json-patch' (RFC 6902)
+    patch = db.Column(JSONB, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Achievement(db.Model):
     """New: Model for story achievements"""
     id = db.Column(db.Integer, primary_key=True)
@@ -108,6 +236,25 @@ class Achievement(db.Model):
     points = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class UserAchievement(db.Model):
+    """Achievements a user has unlocked, stored as an indexed (user, achievement) set"""
+    __tablename__ = 'user_achievement'
+    user_id = db.Column(db.String(255), primary_key=True)
+    achievement_id = db.Column(db.Integer, db.ForeignKey('achievement.id', ondelete='CASCADE'), primary_key=True)
+    earned_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class LibraryStat(db.Model):
+    """Library-wide counters kept current by triggers, see services/library_stats.py"""
+    __tablename__ = 'library_stat'
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_library_stats(target, connection, **kw):
+    """Install the counter triggers once all counted tables exist"""
+    if connection.dialect.name == 'postgresql' and not library_stats.is_installed(connection):
+        library_stats.install(connection)
+
 class AIInstruction(db.Model):
     """Model for storing AI generation parameters and instructions"""
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,15 @@
+import logging
+from app import app
+from services.maintenance import refresh_library_stats
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Refresh the orphaned-images statistics read by the health check; run every few minutes from cron"""
+    with app.app_context():
+        refresh_library_stats()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import argparse
+import logging
+from app import app
+from database import db
+from services.partitions import MONTHLY_TABLES, MONTHS_AHEAD, roll_partitions
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Create upcoming monthly partitions and move rows stranded in the DEFAULT partitions; run daily from cron"""
+    parser = argparse.ArgumentParser(description="Roll the monthly partitions forward")
+    parser.add_argument('--tables', nargs='+', choices=MONTHLY_TABLES, default=list(MONTHLY_TABLES))
+    parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD,
+                        help="Months prepared after the current one (default: PARTITION_MONTHS_AHEAD or 3)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            rolled = roll_partitions(connection, args.tables, args.months_ahead)
+
+    for table, partitions in rolled.items():
+        logger.info(f"{table}: {len(partitions)} partitions from {partitions[0]} to {partitions[-1]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert
+
+from database import db
+from models import Achievement, ChoiceEvent, StoryNode, UserAchievement
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How long compiled achievement definitions are trusted before reloading
+DEFINITIONS_TTL = 300  # 5 minutes
+
+class PlayerFacts:
+    """
+    Facts about a player's run, looked up in the choice log only for the node and choice
+    ids the predicates ask about. Answers are remembered for the rest of the evaluation.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self._visited: Set[int] = set()
+        self._chosen: Set[int] = set()
+        self._checked_nodes: Set[int] = set()
+        self._checked_choices: Set[int] = set()
+        self._choices_made: Optional[int] = None
+
+    def _lookup(self, ids: FrozenSet[int], checked: Set[int], found: Set[int], columns) -> None:
+        """Query which of the unchecked ids appear in the user's log (index lookups per column)"""
+        missing = ids - checked
+        if not missing:
+            return
+        queries = [
+            db.session.query(column.label('id')).filter(ChoiceEvent.user_id == self.user_id, column.in_(missing))
+            for column in columns
+        ]
+        query = queries[0].union(*queries[1:]) if len(queries) > 1 else queries[0].distinct()
+        found.update(row_id for (row_id,) in query)
+        checked.update(missing)
+
+    def visited_all(self, nodes: FrozenSet[int]) -> bool:
+        self._lookup(nodes, self._checked_nodes, self._visited, (ChoiceEvent.node_id, ChoiceEvent.next_node_id))
+        return nodes <= self._visited
+
+    def chose_all(self, choices: FrozenSet[int]) -> bool:
+        self._lookup(choices, self._checked_choices, self._chosen, (ChoiceEvent.choice_id,))
+        return choices <= self._chosen
+
+    @property
+    def choices_made(self) -> int:
+        # Counting alone does not need the full history, only the index
+        if self._choices_made is None:
+            self._choices_made = db.session.query(db.func.count(ChoiceEvent.id))\
+                .filter(ChoiceEvent.user_id == self.user_id).scalar() or 0
+        return self._choices_made
+
+Predicate = Callable[[PlayerFacts], bool]
+
+@dataclass
+class CompiledAchievement:
+    """An achievement whose criteria have been turned into a predicate"""
+    id: int
+    name: str
+    description: Optional[str]
+    points: int
+    criteria: Any
+    predicate: Optional[Predicate] = None
+    trigger_nodes: FrozenSet[int] = frozenset()
+    trigger_choices: FrozenSet[int] = frozenset()
+    counts_choices: bool = False
+
+@dataclass
+class _Triggers:
+    nodes: Set[int] = field(default_factory=set)
+    choices: Set[int] = field(default_factory=set)
+    counts_choices: bool = False
+
+def _as_id_set(value: Any) -> FrozenSet[int]:
+    values = value if isinstance(value, list) else [value]
+    return frozenset(int(v) for v in values)
+
+def compile_criteria(criteria: Any, triggers: _Triggers) -> Optional[Predicate]:
+    """
+    Compile achievement criteria into a predicate over PlayerFacts.
+
+    Supported criteria:
+      {"visit_node": 12} / {"visit_nodes": [1, 2]}  - every listed node visited
+      {"choose": 7} / {"choices": [7, 8]}             - every listed choice taken
+      {"choices_made": 10}                            - at least N choices made
+      {"all": [...]} / {"any": [...]}                 - combinations of the above
+    Several keys in one object must all hold. Unknown keys never match.
+    """
+    if not criteria:
+        return None
+    if not isinstance(criteria, dict):
+        raise ValueError(f"Unsupported achievement criteria: {criteria!r}")
+
+    predicates: List[Predicate] = []
+    for key, value in criteria.items():
+        if key in ('visit_node', 'visit_nodes'):
+            nodes = _as_id_set(value)
+            triggers.nodes.update(nodes)
+            predicates.append(lambda facts, nodes=nodes: facts.visited_all(nodes))
+        elif key in ('choose', 'choices'):
+            choices = _as_id_set(value)
+            triggers.choices.update(choices)
+            predicates.append(lambda facts, choices=choices: facts.chose_all(choices))
+        elif key == 'choices_made':
+            threshold = int(value)
+            triggers.counts_choices = True
+            predicates.append(lambda facts, threshold=threshold: facts.choices_made >= threshold)
+        elif key in ('all', 'any'):
+            children = [compile_criteria(child, triggers) for child in value]
+            children = [child for child in children if child is not None]
+            combine = all if key == 'all' else any
+            predicates.append(lambda facts, children=children, combine=combine:
+                              combine(child(facts) for child in children))
+        else:
+            logger.warning(f"Unknown achievement criteria key '{key}'")
+            predicates.append(lambda facts: False)
+
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda facts: all(predicate(facts) for predicate in predicates)
+
+class AchievementEngine:
+    """In-memory cache of compiled achievements, indexed by the events that can unlock them"""
+
+    def __init__(self, ttl: int = DEFINITIONS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._achievements: Dict[int, CompiledAchievement] = {}
+        self._by_node: Dict[int, List[CompiledAchievement]] = {}
+        self._by_choice: Dict[int, List[CompiledAchievement]] = {}
+        self._counting: List[CompiledAchievement] = []
+
+    def invalidate(self):
+        """Force the definitions to be reloaded on next use"""
+        self._loaded_at = 0.0
+
+    def _ensure_loaded(self):
+        if time.monotonic() - self._loaded_at < self.ttl:
+            return
+        with self._lock:
+            if time.monotonic() - self._loaded_at < self.ttl:
+                return
+            achievements, by_node, by_choice, counting = {}, {}, {}, []
+            for row in Achievement.query.order_by(Achievement.id).all():
+                triggers = _Triggers()
+                try:
+                    predicate = compile_criteria(row.criteria, triggers)
+                except (TypeError, ValueError) as e:
+                    logger.error(f"Could not compile criteria for achievement {row.id}: {str(e)}")
+                    predicate = None
+                compiled = CompiledAchievement(
+                    id=row.id,
+                    name=row.name,
+                    description=row.description,
+                    points=row.points or 0,
+                    criteria=row.criteria,
+                    predicate=predicate,
+                    trigger_nodes=frozenset(triggers.nodes),
+                    trigger_choices=frozenset(triggers.choices),
+                    counts_choices=triggers.counts_choices
+                )
+                achievements[row.id] = compiled
+                if predicate is None:
+                    continue
+                for node_id in compiled.trigger_nodes:
+                    by_node.setdefault(node_id, []).append(compiled)
+                for choice_id in compiled.trigger_choices:
+                    by_choice.setdefault(choice_id, []).append(compiled)
+                if compiled.counts_choices:
+                    counting.append(compiled)
+            self._achievements, self._by_node, self._by_choice, self._counting = \
+                achievements, by_node, by_choice, counting
+            self._loaded_at = time.monotonic()
+            logger.debug(f"Compiled {len(achievements)} achievement definitions")
+
+    def all(self) -> List[CompiledAchievement]:
+        self._ensure_loaded()
+        return list(self._achievements.values())
+
+    def get(self, achievement_id: int) -> Optional[CompiledAchievement]:
+        self._ensure_loaded()
+        return self._achievements.get(achievement_id)
+
+    def candidates(self, node_ids, choice_id: Optional[int]) -> List[CompiledAchievement]:
+        """Achievements whose criteria could change because of this event"""
+        self._ensure_loaded()
+        found = {a.id: a for a in self._counting}
+        for node_id in node_ids:
+            for achievement in self._by_node.get(node_id, ()):
+                found[achievement.id] = achievement
+        if choice_id is not None:
+            for achievement in self._by_choice.get(choice_id, ()):
+                found[achievement.id] = achievement
+        return list(found.values())
+
+engine = AchievementEngine()
+
+@event.listens_for(Achievement, 'after_insert')
+@event.listens_for(Achievement, 'after_update')
+@event.listens_for(Achievement, 'after_delete')
+def _invalidate_definitions(mapper, connection, target):
+    engine.invalidate()
+
+def get_earned_achievement_ids(user_id: str) -> Set[int]:
+    """Achievement ids unlocked by a user (primary key lookup)"""
+    rows = db.session.query(UserAchievement.achievement_id)\
+        .filter(UserAchievement.user_id == user_id)
+    return {achievement_id for (achievement_id,) in rows}
+
+def _award(user_id: str, achievement_ids) -> None:
+    """Insert earned achievements, ignoring ones that are already recorded"""
+    if not achievement_ids:
+        return
+    statement = insert(UserAchievement).values(
+        [{'user_id': user_id, 'achievement_id': achievement_id} for achievement_id in achievement_ids]
+    ).on_conflict_do_nothing()
+    db.session.execute(statement)
+
+def evaluate_choices(user_id: str, choices: List[Tuple[Optional[int], Optional[int], Optional[int]]]
+                     ) -> List[CompiledAchievement]:
+    """
+    Evaluate the achievements affected by newly logged choices, given as (node_id, choice_id,
+    next_node_id) tuples, and record unlocks. Must run after the ChoiceEvents have been
+    added to the session. The caller commits.
+    """
+    if not choices:
+        return []
+    unlocked: Dict[int, CompiledAchievement] = {}
+    earned = get_earned_achievement_ids(user_id)
+
+    # Nodes can award an achievement directly when they are reached
+    next_node_ids = {next_node_id for _, _, next_node_id in choices if next_node_id is not None}
+    if next_node_ids:
+        rows = db.session.query(StoryNode.achievement_id)\
+            .filter(StoryNode.id.in_(next_node_ids), StoryNode.achievement_id.isnot(None))
+        for (node_achievement_id,) in rows:
+            achievement = engine.get(node_achievement_id) if node_achievement_id not in earned else None
+            if achievement:
+                unlocked[achievement.id] = achievement
+
+    candidates: Dict[int, CompiledAchievement] = {}
+    for node_id, choice_id, next_node_id in choices:
+        node_ids = [n for n in (node_id, next_node_id) if n is not None]
+        for achievement in engine.candidates(node_ids, choice_id):
+            if achievement.id not in earned and achievement.id not in unlocked:
+                candidates[achievement.id] = achievement
+    if candidates:
+        db.session.flush()
+        facts = PlayerFacts(user_id)
+        for achievement in candidates.values():
+            if achievement.predicate(facts):
+                unlocked[achievement.id] = achievement
+
+    _award(user_id, list(unlocked))
+    if unlocked:
+        logger.info(f"User {user_id} unlocked achievements: {', '.join(a.name for a in unlocked.values())}")
+    return list(unlocked.values())
+
+def evaluate_choice(user_id: str, node_id: Optional[int], choice_id: Optional[int],
+                    next_node_id: Optional[int]) -> List[CompiledAchievement]:
+    """Evaluate a single newly logged choice (see evaluate_choices)"""
+    return evaluate_choices(user_id, [(node_id, choice_id, next_node_id)])
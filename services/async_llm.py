@@ -0,0 +1,120 @@
+import os
+import json
+import logging
+from typing import Dict, List, Optional, Any
+
+from services.local_llm_service import (DEFAULT_MODEL, installed_models, read_image_metadata, analysis_messages,
+                                        story_messages, description_messages)
+from services.local_story_maker import story_prompt, complete_story, fallback_story
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Every in-flight generation holds one connection to Ollama (and briefly one to the image host),
+# so the pools are sized for the number of concurrent generations a worker should carry
+MAX_CONNECTIONS = int(os.environ.get("ASYNC_LLM_MAX_CONNECTIONS", "512"))
+IMAGE_TIMEOUT = 30
+
+_ollama_client = None
+_http_client = None
+_model_checked = False
+
+def _limits():
+    import httpx
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+
+async def get_ollama_client():
+    """The shared ollama.AsyncClient, checking on first use that the model is available like LocalLLMService"""
+    global _ollama_client, _model_checked
+    if _ollama_client is None:
+        # Imported here so the sync app never pays for them
+        import ollama
+        _ollama_client = ollama.AsyncClient(limits=_limits())
+    if not _model_checked:
+        if DEFAULT_MODEL not in installed_models(await _ollama_client.list()):
+            logger.info(f"Downloading {DEFAULT_MODEL} model...")
+            await _ollama_client.pull(DEFAULT_MODEL)
+        _model_checked = True
+    return _ollama_client
+
+def get_http_client():
+    """The shared httpx.AsyncClient used to download images"""
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.AsyncClient(timeout=IMAGE_TIMEOUT, follow_redirects=True, limits=_limits())
+    return _http_client
+
+async def close():
+    """Close the pooled connections; called when the ASGI server shuts down"""
+    global _ollama_client, _http_client, _model_checked
+    if _ollama_client is not None:
+        await _ollama_client.close()
+    if _http_client is not None:
+        await _http_client.aclose()
+    _ollama_client = None
+    _http_client = None
+    _model_checked = False
+
+async def chat(messages: List[Dict[str, str]], format: Optional[str] = None) -> str:
+    client = await get_ollama_client()
+    response = await client.chat(model=DEFAULT_MODEL, messages=messages, format=format)
+    return response['message']['content']
+
+async def analyze_artwork(image_url: str) -> Dict[str, Any]:
+    """Async counterpart of LocalLLMService.analyze_artwork"""
+    import httpx
+
+    try:
+        response = await get_http_client().get(image_url)
+        response.raise_for_status()
+    except httpx.HTTPError as req_err:
+        logger.error(f"Error downloading image: {str(req_err)}")
+        raise Exception(f"Failed to download image from {image_url}: {str(req_err)}")
+
+    try:
+        image_metadata = read_image_metadata(response.content)
+        result = json.loads(await chat(analysis_messages(image_url, image_metadata), format='json'))
+
+        # Add image metadata to the result
+        result["image_metadata"] = image_metadata
+
+        logger.debug("Successfully analyzed artwork with local LLM")
+        return result
+    except json.JSONDecodeError as json_err:
+        logger.error(f"Error parsing LLM response: {str(json_err)}")
+        raise Exception(f"Failed to parse LLM response: {str(json_err)}")
+    except Exception as e:
+        logger.error(f"Error analyzing artwork: {str(e)}")
+        raise Exception(f"Failed to analyze artwork: {str(e)}")
+
+async def generate_image_description(analysis: Dict[str, Any]) -> str:
+    """Async counterpart of LocalLLMService.generate_image_description"""
+    try:
+        return (await chat(description_messages(analysis))).strip()
+    except Exception as e:
+        logger.error(f"Error generating image description: {str(e)}")
+        return "A scene from the adventure story."
+
+async def generate_story(
+    conflict: str,
+    setting: str,
+    narrative_style: str,
+    mood: str,
+    custom_setting: Optional[str] = None,
+    **params
+) -> Dict[str, Any]:
+    """Async counterpart of services.local_story_maker.generate_story, with the same parameters"""
+    try:
+        prompt = story_prompt(conflict, setting, narrative_style, mood, custom_setting=custom_setting, **params)
+        result = complete_story(json.loads(await chat(story_messages(prompt), format='json')))
+
+        logger.info(f"Successfully generated story with conflict: {params.get('custom_conflict') or conflict}, "
+                    f"setting: {custom_setting or setting}")
+        return result
+
+    except Exception as e:
+        logger.error(f"Error generating story: {str(e)}")
+
+        # Return a fallback story structure
+        return fallback_story(custom_setting if custom_setting else setting)
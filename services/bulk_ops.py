@@ -0,0 +1,138 @@
+import os
+import gzip
+import json
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from database import db
+from models import ImageAnalysis, ImageAnalysisRaw, StoryGeneration, StoryNode, story_images
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Where archives requested through the API are written
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archives")
+
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+def archive_path_for(kind: str) -> str:
+    """Timestamped archive file for an API-triggered delete"""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    return os.path.join(ARCHIVE_DIR, f"{kind}-{datetime.utcnow():%Y%m%d-%H%M%S}.ndjson.gz")
+
+def _open_archive(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'at', encoding='utf-8')
+    return open(path, 'a', encoding='utf-8')
+
+def _log_progress(kind: str) -> ProgressCallback:
+    def report(done: int, total: Optional[int]):
+        if total:
+            logger.info(f"Deleted {done}/{total} {kind} ({done * 100 // total}%)")
+        else:
+            logger.info(f"Deleted {done} {kind}")
+    return report
+
+def _archive_rows(archive, model, ids: List[int], link_column, link_key: str, other_column, detail=None):
+    """
+    Write the full rows for `ids` plus their story_images links as NDJSON. `detail` is an
+    optional (column, foreign key column) pair from a one-to-one table, written as part of the row.
+    """
+    table = model.__table__
+    columns = [column for column in table.columns if column.name != 'search_vector']
+    source = table
+    if detail is not None:
+        detail_column, detail_key = detail
+        columns.append(detail_column)
+        source = table.outerjoin(detail_column.table, detail_key == table.c.id)
+    links: Dict[int, List[int]] = {}
+    for owner_id, other_id in db.session.execute(
+            db.select(link_column, other_column).where(link_column.in_(ids))):
+        links.setdefault(owner_id, []).append(other_id)
+
+    for row in db.session.execute(db.select(*columns).select_from(source).where(table.c.id.in_(ids)).order_by(table.c.id)).mappings():
+        record = dict(row)
+        record[link_key] = links.get(row['id'], [])
+        archive.write(json.dumps(record, default=str) + '\n')
+
+def _delete_in_batches(kind: str, model, ids: Optional[Iterable[int]], batch_size: int,
+                       archive_path: Optional[str], progress: Optional[ProgressCallback],
+                       delete_dependents: Callable[[List[int]], None],
+                       archive_batch: Callable[[Any, List[int]], None]) -> Dict[str, Any]:
+    """
+    Delete rows of `model` in id-ordered batches, each in its own short transaction.
+    `ids` limits the delete to those rows; None deletes everything.
+    """
+    progress = progress or _log_progress(kind)
+    base = db.session.query(model.id)
+    if ids is not None:
+        base = base.filter(model.id.in_(list(ids)))
+    total = base.order_by(None).count()
+
+    deleted = 0
+    batches = 0
+    last_id = 0
+    archive = _open_archive(archive_path) if archive_path else None
+    try:
+        while True:
+            batch = [row.id for row in base.filter(model.id > last_id).order_by(model.id).limit(batch_size)]
+            if not batch:
+                break
+            last_id = batch[-1]
+
+            if archive:
+                archive_batch(archive, batch)
+                archive.flush()
+            delete_dependents(batch)
+            deleted += db.session.query(model).filter(model.id.in_(batch)).delete(synchronize_session=False)
+            db.session.commit()
+
+            batches += 1
+            progress(deleted, total)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if archive:
+            archive.close()
+
+    return {
+        'deleted': deleted,
+        'batches': batches,
+        'archive': archive_path
+    }
+
+def delete_images(image_ids: Optional[Iterable[int]] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                  archive_path: Optional[str] = None,
+                  progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Delete images with set-based statements; story links and node references go first,
+    and their image_analysis_raw rows go with them (ON DELETE CASCADE)
+    """
+    def delete_dependents(batch: List[int]):
+        db.session.execute(story_images.delete().where(story_images.c.image_id.in_(batch)))
+        db.session.query(StoryNode).filter(StoryNode.image_id.in_(batch))\
+            .update({StoryNode.image_id: None}, synchronize_session=False)
+
+    def archive_batch(archive, batch: List[int]):
+        _archive_rows(archive, ImageAnalysis, batch, story_images.c.image_id, 'story_ids', story_images.c.story_id,
+                      detail=(ImageAnalysisRaw.__table__.c.analysis_result, ImageAnalysisRaw.__table__.c.image_id))
+
+    return _delete_in_batches('images', ImageAnalysis, image_ids, batch_size, archive_path, progress,
+                              delete_dependents, archive_batch)
+
+def delete_stories(story_ids: Optional[Iterable[int]] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                   archive_path: Optional[str] = None,
+                   progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """Delete stories with set-based statements; their story_images links go first"""
+    def delete_dependents(batch: List[int]):
+        db.session.execute(story_images.delete().where(story_images.c.story_id.in_(batch)))
+
+    def archive_batch(archive, batch: List[int]):
+        _archive_rows(archive, StoryGeneration, batch, story_images.c.story_id, 'image_ids', story_images.c.image_id)
+
+    return _delete_in_batches('stories', StoryGeneration, story_ids, batch_size, archive_path, progress,
+                              delete_dependents, archive_batch)
@@ -0,0 +1,234 @@
+import os
+import json
+import mmap
+import random
+import struct
+import hashlib
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Catalog mode serves read-only character and scene lookups from catalog files instead
+# of the database: '1' maps the files lazily, 'seed' loads every record into memory
+CATALOG_MODE = os.environ.get("CATALOG_MODE", "").lower()
+CATALOG_DIR = os.environ.get("CATALOG_DIR", ".")
+CATALOG_FILES = {
+    'character': 'character_data.catalog',
+    'scene': 'scene_data.catalog',
+}
+
+# Field indexed for name lookups in each kind of catalog
+NAME_FIELDS = {
+    'character': 'character_name',
+    'scene': 'setting',
+}
+
+MAGIC = b'YCAT'
+VERSION = 1
+
+# magic, version, kind, record count, id table offset/capacity, name table offset/capacity
+HEADER = struct.Struct('<4sH16sIQIQI')
+# record id (0 = empty slot), offset, length
+ID_SLOT = struct.Struct('<qQI')
+# name hash (0 = empty slot), record id
+NAME_SLOT = struct.Struct('<Qq')
+
+def catalog_mode() -> bool:
+    return CATALOG_MODE in ('1', 'true', 'yes', 'seed')
+
+def _dumps(record: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(record)
+    return json.dumps(record, separators=(',', ':')).encode('utf-8')
+
+def _loads(data: bytes) -> Dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _capacity(count: int) -> int:
+    """Power-of-two table size at most half full, so probe sequences stay short"""
+    capacity = 8
+    while capacity < count * 2:
+        capacity *= 2
+    return capacity
+
+def _id_slot(record_id: int, mask: int) -> int:
+    # Fibonacci hashing spreads sequential ids across the table
+    return ((record_id * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> 32 & mask
+
+def _name_hash(name: str) -> int:
+    digest = int.from_bytes(hashlib.blake2b(name.strip().lower().encode('utf-8'), digest_size=8).digest(), 'little')
+    return digest or 1
+
+class CatalogWriter:
+    """
+    Writes records one at a time, then appends an open-addressing hash table keyed
+    by id and one keyed by name, so readers find any record in O(1) without parsing the rest.
+    """
+
+    def __init__(self, path: str, kind: str):
+        self.path = path
+        self.kind = kind
+        self.name_field = NAME_FIELDS.get(kind)
+        self.entries: List[tuple] = []  # (id, offset, length, name)
+        self.file = open(path, 'wb')
+        self.file.write(b'\0' * HEADER.size)
+
+    def add(self, record: Dict[str, Any]):
+        record_id = record['id']
+        if record_id <= 0:
+            raise ValueError(f"Catalog ids must be positive, got {record_id}")
+        data = _dumps(record)
+        self.entries.append((record_id, self.file.tell(), len(data),
+                             record.get(self.name_field) if self.name_field else None))
+        self.file.write(data)
+
+    def close(self):
+        id_capacity = _capacity(len(self.entries))
+        id_table = [(0, 0, 0)] * id_capacity
+        for record_id, offset, length, _ in self.entries:
+            slot = _id_slot(record_id, id_capacity - 1)
+            while id_table[slot][0] not in (0, record_id):
+                slot = (slot + 1) & (id_capacity - 1)
+            id_table[slot] = (record_id, offset, length)
+
+        named = [(name, record_id) for record_id, _, _, name in self.entries if name]
+        name_capacity = _capacity(len(named))
+        name_table = [(0, 0)] * name_capacity
+        for name, record_id in named:
+            name_hash = _name_hash(name)
+            slot = name_hash & (name_capacity - 1)
+            while name_table[slot][0]:
+                slot = (slot + 1) & (name_capacity - 1)
+            name_table[slot] = (name_hash, record_id)
+
+        id_offset = self.file.tell()
+        self.file.write(b''.join(ID_SLOT.pack(*entry) for entry in id_table))
+        name_offset = self.file.tell()
+        self.file.write(b''.join(NAME_SLOT.pack(*entry) for entry in name_table))
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.kind.encode('utf-8'), len(self.entries),
+                                    id_offset, id_capacity, name_offset, name_capacity))
+        self.file.close()
+
+class Catalog:
+    """
+    Read-only view of a catalog file. Records are decoded on access from a memory map;
+    with `seed=True` every record is decoded once up front and served from memory.
+    """
+
+    def __init__(self, path: str, seed: bool = False):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, kind, count, self._id_offset, self._id_capacity, self._name_offset, self._name_capacity = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} catalog")
+        self.kind = kind.rstrip(b'\0').decode('utf-8')
+        self.count = count
+        self._ids: Optional[List[int]] = None
+        self._records: Optional[Dict[int, Dict[str, Any]]] = None
+        if seed:
+            self._records = {record['id']: record for record in self}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _id_entry(self, slot: int):
+        return ID_SLOT.unpack_from(self._map, self._id_offset + slot * ID_SLOT.size)
+
+    def _decode(self, offset: int, length: int) -> Dict[str, Any]:
+        return _loads(self._map[offset:offset + length])
+
+    def get(self, record_id: int) -> Optional[Dict[str, Any]]:
+        if self._records is not None:
+            return self._records.get(record_id)
+        mask = self._id_capacity - 1
+        slot = _id_slot(record_id, mask)
+        while True:
+            entry_id, offset, length = self._id_entry(slot)
+            if entry_id == 0:
+                return None
+            if entry_id == record_id:
+                return self._decode(offset, length)
+            slot = (slot + 1) & mask
+
+    def find_all_by_name(self, name: str) -> List[Dict[str, Any]]:
+        """Records whose name (see NAME_FIELDS) equals `name`, ignoring case and surrounding spaces"""
+        name_field = NAME_FIELDS.get(self.kind)
+        if not name_field:
+            return []
+        wanted = name.strip().lower()
+        name_hash = _name_hash(name)
+        mask = self._name_capacity - 1
+        slot = name_hash & mask
+        matches = []
+        while True:
+            entry_hash, record_id = NAME_SLOT.unpack_from(self._map, self._name_offset + slot * NAME_SLOT.size)
+            if entry_hash == 0:
+                return matches
+            if entry_hash == name_hash:
+                record = self.get(record_id)
+                if record and (record.get(name_field) or '').strip().lower() == wanted:
+                    matches.append(record)
+            slot = (slot + 1) & mask
+
+    def find_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        matches = self.find_all_by_name(name)
+        return matches[0] if matches else None
+
+    def ids(self) -> List[int]:
+        if self._ids is None:
+            entries = (self._id_entry(slot)[0] for slot in range(self._id_capacity))
+            self._ids = sorted(record_id for record_id in entries if record_id)
+        return self._ids
+
+    def sample(self, k: int) -> List[Dict[str, Any]]:
+        """Up to k distinct random records"""
+        ids = self.ids()
+        return [self.get(record_id) for record_id in random.sample(ids, min(k, len(ids)))]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self._records is not None:
+            yield from self._records.values()
+            return
+        for record_id in self.ids():
+            yield self.get(record_id)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+_catalogs: Dict[str, Optional[Catalog]] = {}
+
+def get_catalog(kind: str) -> Optional[Catalog]:
+    """The catalog for 'character' or 'scene' in CATALOG_DIR, opened on first use"""
+    if kind not in _catalogs:
+        path = os.path.join(CATALOG_DIR, CATALOG_FILES[kind])
+        try:
+            _catalogs[kind] = Catalog(path, seed=(CATALOG_MODE == 'seed'))
+            logger.info(f"Opened {kind} catalog {path} with {len(_catalogs[kind])} records")
+        except FileNotFoundError:
+            logger.warning(f"No {kind} catalog at {path}")
+            _catalogs[kind] = None
+    return _catalogs[kind]
+
+def build_catalog_from_json(json_path: str, catalog_path: str, kind: str) -> int:
+    """Convert a JSON export (a list of records) into a catalog file"""
+    with open(json_path) as f:
+        records = json.load(f)
+    writer = CatalogWriter(catalog_path, kind)
+    for record in records:
+        writer.add(record)
+    writer.close()
+    return len(records)
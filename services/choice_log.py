@@ -0,0 +1,99 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from database import db
+from models import ChoiceEvent
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def record_choice(user_id: str, node_id: Optional[int], choice_id: Optional[int],
+                  next_node_id: Optional[int], created_at: Optional[datetime] = None) -> ChoiceEvent:
+    """Append a single choice event to the session. The caller commits."""
+    event = ChoiceEvent(
+        user_id=user_id,
+        node_id=node_id,
+        choice_id=choice_id,
+        next_node_id=next_node_id,
+        created_at=created_at or datetime.utcnow()
+    )
+    db.session.add(event)
+    return event
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    """Parse an ISO timestamp sent by the client, ignoring anything unparseable"""
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+def append_history_entries(user_id: str, entries: Iterable[Dict[str, Any]]) -> List[ChoiceEvent]:
+    """
+    Append client-supplied history entries as choice events.
+    Entries are dicts with optional node_id, choice_id, next_node_id and timestamp keys.
+    Returns the events added to the session.
+    """
+    added = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        added.append(record_choice(
+            user_id,
+            entry.get('node_id'),
+            entry.get('choice_id'),
+            entry.get('next_node_id'),
+            _parse_timestamp(entry.get('timestamp'))
+        ))
+    return added
+
+def count_choices(user_id: str) -> int:
+    """Number of choice events logged for a user (index-only scan)"""
+    return db.session.query(db.func.count(ChoiceEvent.id))\
+        .filter(ChoiceEvent.user_id == user_id)\
+        .scalar() or 0
+
+def sync_legacy_history(user_id: str, choice_history: Optional[List[Any]]) -> List[ChoiceEvent]:
+    """
+    Accept a full choice_history array from older clients and append only the entries
+    that are not logged yet, so a save never rewrites what is already stored.
+    Returns the events added to the session.
+    """
+    if not choice_history:
+        return []
+    logged = count_choices(user_id)
+    if len(choice_history) <= logged:
+        return []
+    return append_history_entries(user_id, choice_history[logged:])
+
+def get_choice_history(user_id: str, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Reconstruct a user's choice history with one range scan over (user_id, created_at)"""
+    query = db.session.query(
+        ChoiceEvent.node_id,
+        ChoiceEvent.choice_id,
+        ChoiceEvent.next_node_id,
+        ChoiceEvent.created_at
+    ).filter(ChoiceEvent.user_id == user_id)
+
+    if since is not None:
+        query = query.filter(ChoiceEvent.created_at >= since)
+    if until is not None:
+        query = query.filter(ChoiceEvent.created_at < until)
+
+    return [{
+        'node_id': row.node_id,
+        'choice_id': row.choice_id,
+        'next_node_id': row.next_node_id,
+        'timestamp': row.created_at.isoformat()
+    } for row in query.order_by(ChoiceEvent.created_at, ChoiceEvent.id)]
+
+def get_choice_counts(node_id: int) -> Dict[int, int]:
+    """How often each choice on a node has been taken, for analytics"""
+    rows = db.session.query(ChoiceEvent.choice_id, db.func.count(ChoiceEvent.id))\
+        .filter(ChoiceEvent.node_id == node_id)\
+        .group_by(ChoiceEvent.choice_id)\
+        .all()
+    return {choice_id: count for choice_id, count in rows}
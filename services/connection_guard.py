@@ -0,0 +1,78 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+from sqlalchemy import event
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# External calls at least this slow are logged when the calling thread holds a database connection
+SLOW_CALL_SECONDS = float(os.environ.get("SLOW_EXTERNAL_CALL_SECONDS", "1.0"))
+
+# Pooled connections currently checked out, per thread
+_checked_out: Dict[int, int] = {}
+_lock = threading.Lock()
+
+# Calls made while holding a connection, for the pool benchmark and the debug page;
+# updated under _lock, read through get_stats()
+stats = {'external_calls': 0, 'held_calls': 0, 'slow_held_calls': 0}
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    owner = threading.get_ident()
+    connection_record.info['checked_out_by'] = owner
+    with _lock:
+        _checked_out[owner] = _checked_out.get(owner, 0) + 1
+
+def _on_checkin(dbapi_connection, connection_record):
+    owner = connection_record.info.pop('checked_out_by', None)
+    if owner is None:
+        return
+    with _lock:
+        remaining = _checked_out.get(owner, 0) - 1
+        if remaining > 0:
+            _checked_out[owner] = remaining
+        else:
+            _checked_out.pop(owner, None)
+
+def install(engine) -> None:
+    """Track checkouts on `engine`'s pool; safe to call more than once"""
+    if not event.contains(engine, 'checkout', _on_checkout):
+        event.listen(engine, 'checkout', _on_checkout)
+        event.listen(engine, 'checkin', _on_checkin)
+
+def get_stats() -> Dict[str, int]:
+    """A consistent copy of the call counters"""
+    with _lock:
+        return dict(stats)
+
+def held_connections() -> int:
+    """Pooled connections checked out by the current thread"""
+    return _checked_out.get(threading.get_ident(), 0)
+
+@contextmanager
+def external_call(name: str):
+    """
+    Wrap a call to an LLM or remote HTTP service. Callers release their session first
+    (`db.session.close()`), so a connection checked out here means the pool slot is
+    idle for the whole call; slow ones are logged with the connection count.
+    """
+    held = held_connections()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        slow = held and elapsed >= SLOW_CALL_SECONDS
+        with _lock:
+            stats['external_calls'] += 1
+            if held:
+                stats['held_calls'] += 1
+            if slow:
+                stats['slow_held_calls'] += 1
+        if slow:
+            logger.warning(f"{name} took {elapsed:.1f}s while holding {held} database connection(s); "
+                           f"release the session before calling out")
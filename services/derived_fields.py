@@ -0,0 +1,122 @@
+import logging
+
+from sqlalchemy import text
+
+from database import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+TRIGGER_NAME = 'image_analysis_derive_fields'
+
+# Fills the flat image_analysis columns from image_analysis_raw.analysis_result whenever
+# it is written, using the same rules the save and reanalyze routes applied in Python.
+# A trigger rather than generated columns: the columns are also written by imports and
+# feed the generated search_vector, which Postgres does not allow to depend on another
+# generated column. The image row is only rewritten (and its updated_at bumped) when a
+# derived value changed or the analysis itself did, so re-deriving unchanged rows is free.
+TRIGGER_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION {TRIGGER_NAME}() RETURNS trigger AS $$
+DECLARE
+    analysis jsonb := NEW.analysis_result;
+    nested jsonb;
+    derived image_analysis%ROWTYPE;
+BEGIN
+    IF analysis IS NULL OR jsonb_typeof(analysis) <> 'object' THEN
+        RETURN NULL;
+    END IF;
+
+    IF jsonb_typeof(analysis -> 'character') = 'object' THEN
+        nested := analysis -> 'character';
+    ELSE
+        nested := '{{}}'::jsonb;
+    END IF;
+
+    IF jsonb_typeof(analysis -> 'character') = 'object'
+            OR analysis ?| ARRAY['character_name', 'character_traits', 'plot_lines']
+            OR analysis ->> 'role' IN ('hero', 'villain', 'neutral') THEN
+        derived.image_type := 'character';
+        derived.character_name := coalesce(nullif(nested ->> 'name', ''), nullif(analysis ->> 'character_name', ''),
+                                           nullif(analysis ->> 'name', ''), 'Unnamed Character');
+        derived.character_traits := CASE WHEN nested ? 'character_traits' THEN nested -> 'character_traits'
+                                         ELSE analysis -> 'character_traits' END;
+        derived.character_role := CASE WHEN nested ? 'role' THEN nested ->> 'role' ELSE analysis ->> 'role' END;
+        derived.plot_lines := CASE WHEN nested ? 'plot_lines' THEN nested -> 'plot_lines'
+                                   ELSE analysis -> 'plot_lines' END;
+    ELSE
+        derived.image_type := 'scene';
+        derived.scene_type := analysis ->> 'scene_type';
+        derived.setting := analysis ->> 'setting';
+        derived.setting_description := analysis ->> 'setting_description';
+        derived.story_fit := analysis ->> 'story_fit';
+        derived.dramatic_moments := analysis -> 'dramatic_moments';
+    END IF;
+
+    UPDATE image_analysis SET
+        image_type = derived.image_type,
+        character_name = derived.character_name,
+        character_traits = derived.character_traits,
+        character_role = derived.character_role,
+        plot_lines = derived.plot_lines,
+        scene_type = derived.scene_type,
+        setting = derived.setting,
+        setting_description = derived.setting_description,
+        story_fit = derived.story_fit,
+        dramatic_moments = derived.dramatic_moments,
+        updated_at = timezone('utc', now())
+    WHERE id = NEW.image_id
+      AND ((TG_OP = 'UPDATE' AND NEW.analysis_result IS DISTINCT FROM OLD.analysis_result)
+           OR (image_type, character_name, character_traits, character_role, plot_lines,
+               scene_type, setting, setting_description, story_fit, dramatic_moments)
+              IS DISTINCT FROM
+              (derived.image_type, derived.character_name, derived.character_traits, derived.character_role,
+               derived.plot_lines, derived.scene_type, derived.setting, derived.setting_description,
+               derived.story_fit, derived.dramatic_moments));
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+def is_installed(connection) -> bool:
+    return bool(connection.execute(text(
+        f"SELECT 1 FROM pg_trigger WHERE tgname = '{TRIGGER_NAME}'"
+    )).scalar())
+
+def install(connection) -> None:
+    """Create (or replace) the trigger that keeps the derived columns in step with analysis_result"""
+    if connection.dialect.name != 'postgresql':
+        return
+    connection.execute(text(TRIGGER_FUNCTION))
+    # Before image_analysis_raw the trigger ran on image_analysis itself
+    connection.execute(text(f"DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON image_analysis"))
+    connection.execute(text(f"DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON image_analysis_raw"))
+    connection.execute(text(
+        f"CREATE TRIGGER {TRIGGER_NAME} AFTER INSERT OR UPDATE OF analysis_result ON image_analysis_raw "
+        f"FOR EACH ROW EXECUTE FUNCTION {TRIGGER_NAME}()"
+    ))
+    logger.info("Installed the derived-fields trigger on image_analysis_raw")
+
+def backfill(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Re-derive the columns of existing rows by touching analysis_result in id-ordered
+    batches, committing after each so row locks stay short. Returns how many analyses
+    were touched; only images whose derived values changed are rewritten.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        ids = db.session.execute(text(
+            "SELECT image_id FROM image_analysis_raw WHERE image_id > :last_id ORDER BY image_id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': batch_size}).scalars().all()
+        if not ids:
+            break
+        updated += db.session.execute(text(
+            "UPDATE image_analysis_raw SET analysis_result = analysis_result "
+            "WHERE image_id BETWEEN :first AND :last AND analysis_result IS NOT NULL"
+        ), {'first': ids[0], 'last': ids[-1]}).rowcount
+        db.session.commit()
+        last_id = ids[-1]
+        logger.info(f"Re-derived fields for {updated} images (through id {last_id})")
+    return updated
@@ -0,0 +1,214 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from database import db
+from services.connection_guard import external_call
+from models import ImageAnalysis, ImageEmbedding
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# 'ollama' uses a local embedding model, 'hashing' a dependency-free bag-of-words projection
+EMBEDDING_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "ollama")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "nomic-embed-text")
+HASHING_DIMENSIONS = 512
+
+# How long the in-memory matrices are trusted before checking the table again
+INDEX_TTL = 60
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+def model_key() -> str:
+    """Identifies the vector space; vectors from other models are never compared"""
+    if EMBEDDING_PROVIDER == 'hashing':
+        return f"hashing-{HASHING_DIMENSIONS}"
+    return f"{EMBEDDING_PROVIDER}:{EMBEDDING_MODEL}"
+
+def is_available() -> bool:
+    return np is not None
+
+def _as_text(value: Any) -> str:
+    if isinstance(value, list):
+        return '. '.join(str(item) for item in value)
+    return str(value) if value else ''
+
+def embedding_text(image: ImageAnalysis) -> str:
+    """The text that represents a character or scene in the vector space"""
+    if image.image_type == 'character':
+        parts = [image.character_name, image.character_role,
+                 _as_text(image.character_traits), _as_text(image.plot_lines)]
+    else:
+        parts = [image.setting, image.setting_description, image.story_fit,
+                 _as_text(image.dramatic_moments)]
+    return '\n'.join(part for part in parts if part)
+
+def _hashing_vector(text: str):
+    vector = np.zeros(HASHING_DIMENSIONS, dtype=np.float32)
+    for token in _TOKEN_RE.findall(text.lower()):
+        digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], 'little') % HASHING_DIMENSIONS
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    return vector
+
+_ollama_client = None
+
+def _ollama_vector(text: str):
+    global _ollama_client
+    if _ollama_client is None:
+        import ollama
+        _ollama_client = ollama.Client()
+    with external_call('Embedding'):
+        response = _ollama_client.embeddings(model=EMBEDDING_MODEL, prompt=text)
+    return np.asarray(response['embedding'], dtype=np.float32)
+
+def embed_text(text: str):
+    """Embed a single text with the configured provider"""
+    if EMBEDDING_PROVIDER == 'hashing':
+        return _hashing_vector(text)
+    return _ollama_vector(text)
+
+@lru_cache(maxsize=256)
+def _embed_query(text: str) -> bytes:
+    return embed_text(text).tobytes()
+
+def embed_query(text: str):
+    """Embed request text, caching repeated queries such as identical story parameters"""
+    return np.frombuffer(_embed_query(text), dtype=np.float32)
+
+def store_embedding(image: ImageAnalysis) -> Optional[ImageEmbedding]:
+    """Compute and stage the embedding for one image. The caller commits."""
+    if not is_available():
+        return None
+    text = embedding_text(image)
+    if not text:
+        return None
+    return save_embedding(image.id, embed_text(text))
+
+def save_embedding(image_id: int, vector) -> ImageEmbedding:
+    """Stage a computed embedding for one image. The caller commits."""
+    embedding = db.session.get(ImageEmbedding, image_id) or ImageEmbedding(image_id=image_id)
+    embedding.model = model_key()
+    embedding.dimensions = int(vector.shape[0])
+    embedding.vector = vector.astype(np.float32).tobytes()
+    db.session.add(embedding)
+    index.invalidate()
+    return embedding
+
+def backfill_embeddings(batch_size: int = 100, limit: Optional[int] = None) -> int:
+    """Compute embeddings for rows that have none for the current model"""
+    if not is_available():
+        raise RuntimeError("numpy is required to build embeddings")
+
+    done = 0
+    current = model_key()
+    while limit is None or done < limit:
+        missing = ImageAnalysis.query\
+            .outerjoin(ImageEmbedding, db.and_(ImageEmbedding.image_id == ImageAnalysis.id,
+                                               ImageEmbedding.model == current))\
+            .filter(ImageEmbedding.image_id.is_(None))\
+            .order_by(ImageAnalysis.id)\
+            .limit(batch_size)\
+            .all()
+        if not missing:
+            break
+        stored = 0
+        for image in missing:
+            if store_embedding(image) is not None:
+                stored += 1
+        db.session.commit()
+        done += len(missing)
+        logger.info(f"Embedded {done} images so far")
+        if stored == 0:
+            break
+    return done
+
+class EmbeddingIndex:
+    """Per-kind matrices of normalized vectors for vectorized cosine similarity"""
+
+    def __init__(self, ttl: int = INDEX_TTL):
+        self.ttl = ttl
+        self._matrices: Dict[str, Tuple[float, Any, Any, Any]] = {}
+
+    def invalidate(self):
+        self._matrices = {}
+
+    def _version(self, kind: str):
+        return db.session.query(db.func.count(ImageEmbedding.image_id), db.func.max(ImageEmbedding.created_at))\
+            .join(ImageAnalysis, ImageAnalysis.id == ImageEmbedding.image_id)\
+            .filter(ImageAnalysis.image_type == kind, ImageEmbedding.model == model_key())\
+            .one()
+
+    def _load(self, kind: str):
+        cached = self._matrices.get(kind)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[2], cached[3]
+
+        # Queried without a lock: callers may hold a pooled connection, and a lock held across
+        # this query would deadlock them against the pool. Concurrent reloads are harmless.
+        version = tuple(self._version(kind))
+        cached = self._matrices.get(kind)
+        if cached and cached[1] == version:
+            self._matrices[kind] = (time.monotonic(),) + cached[1:]
+            return cached[2], cached[3]
+
+        rows = db.session.query(ImageEmbedding.image_id, ImageEmbedding.vector)\
+            .join(ImageAnalysis, ImageAnalysis.id == ImageEmbedding.image_id)\
+            .filter(ImageAnalysis.image_type == kind, ImageEmbedding.model == model_key())\
+            .order_by(ImageEmbedding.image_id)\
+            .all()
+        ids = np.fromiter((row.image_id for row in rows), dtype=np.int64, count=len(rows))
+        if rows:
+            matrix = np.vstack([np.frombuffer(row.vector, dtype=np.float32) for row in rows])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self._matrices[kind] = (time.monotonic(), version, ids, matrix)
+        logger.debug(f"Loaded {len(rows)} {kind} embeddings")
+        return ids, matrix
+
+    def warm(self, kind: str):
+        """Load the matrix for a kind ahead of the first query"""
+        self._load(kind)
+
+    def top_k(self, kind: str, query_vector, k: int, exclude_ids: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """The k most similar images of a kind as (image_id, cosine similarity) pairs"""
+        ids, matrix = self._load(kind)
+        if ids.size == 0 or matrix.shape[1] != query_vector.shape[0]:
+            return []
+
+        norm = np.linalg.norm(query_vector)
+        scores = matrix @ (query_vector / norm if norm else query_vector)
+        excluded = list(exclude_ids)
+        if excluded:
+            scores = np.where(np.isin(ids, np.asarray(excluded, dtype=np.int64)), -np.inf, scores)
+
+        k = min(k, ids.size)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(ids[i]), float(scores[i])) for i in best if np.isfinite(scores[i])]
+
+index = EmbeddingIndex()
+
+def find_relevant(kind: str, text: str, k: int, exclude_ids: Sequence[int] = ()) -> List[int]:
+    """
+    Ids of the images of `kind` most relevant to `text`, best first.
+    Returns an empty list when embeddings are unavailable so callers can fall back.
+    """
+    if not is_available() or not text.strip():
+        return []
+    try:
+        return [image_id for image_id, _ in index.top_k(kind, embed_query(text), k, exclude_ids)]
+    except Exception as e:
+        logger.warning(f"Embedding retrieval failed, falling back: {str(e)}")
+        return []
@@ -0,0 +1,698 @@
+import os
+import re
+import csv
+import io
+import gzip
+import json
+import queue
+import logging
+import threading
+import multiprocessing
+from collections import namedtuple
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import XMLGenerator
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from database import db
+from models import ImageAnalysis
+from services.catalog import CatalogWriter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip while streaming
+EXPORT_BATCH_SIZE = 500
+
+DEFAULT_FORMATS = ('csv', 'json', 'xml', 'catalog')
+
+# Batches buffered per writer thread before the reader waits for it to catch up
+WRITER_QUEUE_SIZE = 8
+
+# How often a blocked reader checks that a writer process is still alive
+WRITER_POLL_SECONDS = 1.0
+
+# gzip level for compressed outputs; 6 is the usual size/speed balance
+EXPORT_GZIP_LEVEL = 6
+
+# Large write buffers hand zlib and the OS big chunks; both release the GIL while working
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# An XML node is (tag, text) for a leaf or (tag, [nodes]) for an element with children
+XmlNode = Tuple[str, Any]
+
+@dataclass
+class ExportSpec:
+    """What to export for one image type and how each format lays out a record"""
+    name: str  # Base file name, e.g. 'character_data'
+    image_type: str
+    label: str  # Used in logs and the .py header, e.g. 'Character'
+    root_tag: str
+    item_tag: str
+    columns: Sequence[Any]  # ImageAnalysis columns to select
+    record: Callable[[Any], Dict[str, Any]]  # Row -> record used by JSON, NDJSON and .py
+    csv_fields: Sequence[str]
+    csv_row: Callable[[Any], List[Any]]
+    xml: Callable[[Dict[str, Any]], List[XmlNode]]
+    py_keys: Sequence[str]  # Key order in the .py file
+    parquet_types: Dict[str, str] = field(default_factory=dict)  # Flattened column -> 'int' | 'str' | 'list'
+
+def _json_text(value) -> str:
+    return json.dumps(value) if value else ''
+
+def _image_details(row) -> Dict[str, Any]:
+    return {
+        'width': row.image_width,
+        'height': row.image_height,
+        'format': row.image_format,
+        'size_bytes': row.image_size_bytes
+    }
+
+def _image_details_xml(record) -> XmlNode:
+    details = record['image_details']
+    return ('image_details', [
+        ('width', str(details['width'])),
+        ('height', str(details['height'])),
+        ('format', str(details['format'])),
+        ('size_bytes', str(details['size_bytes']))
+    ])
+
+_IMAGE_DETAIL_COLUMNS = (
+    ImageAnalysis.image_width,
+    ImageAnalysis.image_height,
+    ImageAnalysis.image_format,
+    ImageAnalysis.image_size_bytes
+)
+
+_IMAGE_DETAIL_TYPES = {
+    'image_width': 'int',
+    'image_height': 'int',
+    'image_format': 'str',
+    'image_size_bytes': 'int'
+}
+
+CHARACTER_EXPORT = ExportSpec(
+    name='character_data',
+    image_type='character',
+    label='Character',
+    root_tag='characters',
+    item_tag='character',
+    columns=(ImageAnalysis.id, ImageAnalysis.image_url, ImageAnalysis.character_name,
+             ImageAnalysis.character_traits, ImageAnalysis.character_role,
+             ImageAnalysis.plot_lines) + _IMAGE_DETAIL_COLUMNS,
+    record=lambda row: {
+        'id': row.id,
+        'image_url': row.image_url,
+        'character_name': row.character_name or '',
+        'character_traits': row.character_traits or [],
+        'character_role': row.character_role or '',
+        'plot_lines': row.plot_lines or [],
+        'image_details': _image_details(row)
+    },
+    csv_fields=('id', 'image_url', 'character_name', 'character_traits', 'character_role', 'plot_lines'),
+    csv_row=lambda row: [
+        row.id,
+        row.image_url,
+        row.character_name or '',
+        _json_text(row.character_traits),
+        row.character_role or '',
+        _json_text(row.plot_lines)
+    ],
+    xml=lambda record: [
+        ('id', str(record['id'])),
+        ('image_url', record['image_url']),
+        ('character_name', record['character_name']),
+        ('character_role', record['character_role']),
+        _image_details_xml(record),
+        ('character_traits', [('trait', str(trait)) for trait in record['character_traits']]),
+        ('plot_lines', [('plot', str(plot)) for plot in record['plot_lines']])
+    ],
+    py_keys=('id', 'image_url', 'character_name', 'character_traits', 'character_role',
+             'plot_lines', 'image_details'),
+    parquet_types={
+        'id': 'int',
+        'image_url': 'str',
+        'character_name': 'str',
+        'character_traits': 'list',
+        'character_role': 'str',
+        'plot_lines': 'list',
+        **_IMAGE_DETAIL_TYPES
+    }
+)
+
+SCENE_EXPORT = ExportSpec(
+    name='scene_data',
+    image_type='scene',
+    label='Scene',
+    root_tag='scenes',
+    item_tag='scene',
+    columns=(ImageAnalysis.id, ImageAnalysis.image_url, ImageAnalysis.scene_type,
+             ImageAnalysis.setting, ImageAnalysis.setting_description, ImageAnalysis.story_fit,
+             ImageAnalysis.dramatic_moments) + _IMAGE_DETAIL_COLUMNS,
+    record=lambda row: {
+        'id': row.id,
+        'image_url': row.image_url,
+        'image_details': _image_details(row),
+        'scene_type': row.scene_type or '',
+        'setting': row.setting or '',
+        'setting_description': row.setting_description or '',
+        'story_fit': row.story_fit or '',
+        'dramatic_moments': row.dramatic_moments or []
+    },
+    csv_fields=('image_url', 'image_width', 'image_height', 'image_format', 'image_size_bytes',
+                'scene_type', 'setting', 'setting_description', 'story_fit', 'dramatic_moments'),
+    csv_row=lambda row: [
+        row.image_url,
+        row.image_width,
+        row.image_height,
+        row.image_format,
+        row.image_size_bytes,
+        row.scene_type or '',
+        row.setting or '',
+        row.setting_description or '',
+        row.story_fit or '',
+        _json_text(row.dramatic_moments)
+    ],
+    xml=lambda record: [
+        ('id', str(record['id'])),
+        ('image_url', record['image_url']),
+        ('scene_type', record['scene_type']),
+        ('setting', record['setting']),
+        ('setting_description', record['setting_description']),
+        ('story_fit', record['story_fit']),
+        _image_details_xml(record),
+        ('dramatic_moments', [('moment', str(moment)) for moment in record['dramatic_moments']])
+    ],
+    py_keys=('id', 'image_url', 'scene_type', 'setting', 'setting_description', 'story_fit',
+             'dramatic_moments', 'image_details'),
+    parquet_types={
+        'id': 'int',
+        'image_url': 'str',
+        'scene_type': 'str',
+        'setting': 'str',
+        'setting_description': 'str',
+        'story_fit': 'str',
+        'dramatic_moments': 'list',
+        **_IMAGE_DETAIL_TYPES
+    }
+)
+
+EXPORTS = {spec.image_type: spec for spec in (CHARACTER_EXPORT, SCENE_EXPORT)}
+
+class ExportWriter:
+    """
+    Writes one output format incrementally: open, one write() per row, then close.
+    With `compress`, text formats are gzip-compressed as they are written.
+    """
+    extension = ''
+    compressible = True
+
+    def __init__(self, spec: ExportSpec, path: str, compress: bool = False):
+        self.spec = spec
+        self.compress = compress and self.compressible
+        self.base_path = path
+        self.path = path + '.gz' if self.compress else path
+        self.count = 0
+
+    def _open_text(self, newline: Optional[str] = None):
+        if self.compress:
+            raw = gzip.GzipFile(self.path, 'wb', compresslevel=EXPORT_GZIP_LEVEL)
+            return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size=WRITE_BUFFER_SIZE),
+                                    encoding='utf-8', newline=newline)
+        return open(self.path, 'w', encoding='utf-8', newline=newline, buffering=WRITE_BUFFER_SIZE)
+
+    def open(self):
+        self.file = self._open_text()
+
+    def write(self, row, record: Dict[str, Any]):
+        raise NotImplementedError
+
+    def write_batch(self, batch: List[Tuple[Any, Dict[str, Any]]]):
+        for row, record in batch:
+            self.write(row, record)
+
+    def close(self):
+        self.file.close()
+
+class CsvWriter(ExportWriter):
+    extension = 'csv'
+
+    def open(self):
+        self.file = self._open_text(newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.spec.csv_fields)
+
+    def write(self, row, record):
+        self.writer.writerow(self.spec.csv_row(row))
+
+class JsonWriter(ExportWriter):
+    """A JSON array laid out exactly like json.dump(records, indent=2)"""
+    extension = 'json'
+
+    def open(self):
+        super().open()
+        self.file.write('[')
+
+    def write(self, row, record):
+        item = json.dumps(record, indent=2).replace('\n', '\n  ')
+        self.file.write(('\n  ' if self.count == 0 else ',\n  ') + item)
+        self.count += 1
+
+    def close(self):
+        self.file.write('\n]' if self.count else ']')
+        super().close()
+
+class NdjsonWriter(ExportWriter):
+    extension = 'ndjson'
+
+    def write(self, row, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+# Code points XML 1.0 does not allow (control characters, lone surrogates, U+FFFE/U+FFFF);
+# LLM-generated text sometimes contains them and a parser rejects the whole file
+_XML_INVALID = re.compile('[^\u0009\u000A\u000D\u0020-\uD7FF\uE000-\uFFFD\U00010000-\U0010FFFF]')
+
+def _xml_text(text: str) -> str:
+    return _XML_INVALID.sub('', text)
+
+class XmlWriter(ExportWriter):
+    """
+    Pretty-printed XML in the toprettyxml(indent='  ') layout, serialized element by
+    element through xml.sax.saxutils.XMLGenerator
+    """
+    extension = 'xml'
+
+    def open(self):
+        super().open()
+        self.file.write('<?xml version="1.0" ?>\n')
+        self.xml = XMLGenerator(self.file, encoding='utf-8', short_empty_elements=True)
+
+    def _write_node(self, node: XmlNode, depth: int):
+        tag, content = node
+        self.xml.ignorableWhitespace('  ' * depth)
+        self.xml.startElement(tag, {})
+        if isinstance(content, list) and content:
+            self.xml.ignorableWhitespace('\n')
+            for child in content:
+                self._write_node(child, depth + 1)
+            self.xml.ignorableWhitespace('  ' * depth)
+        elif content and not isinstance(content, list):
+            self.xml.characters(_xml_text(content))
+        self.xml.endElement(tag)
+        self.xml.ignorableWhitespace('\n')
+
+    def write(self, row, record):
+        if self.count == 0:
+            self.xml.startElement(self.spec.root_tag, {})
+            self.xml.ignorableWhitespace('\n')
+        self._write_node((self.spec.item_tag, self.spec.xml(record)), 1)
+        self.count += 1
+
+    def close(self):
+        if self.count == 0:
+            self.xml.startElement(self.spec.root_tag, {})
+        self.xml.endElement(self.spec.root_tag)
+        self.xml.ignorableWhitespace('\n')
+        super().close()
+
+class PythonWriter(ExportWriter):
+    """A Python module defining the records as a list literal, using repr() for every value"""
+    extension = 'py'
+
+    def open(self):
+        super().open()
+        variable = self.spec.name
+        self.file.write(f"# {self.spec.label} data exported from database\n\n")
+        self.file.write(f"{variable} = [\n")
+
+    def _write_dict(self, values: Dict[str, Any], keys: Iterable[str], depth: int):
+        indent = '    ' * depth
+        keys = list(keys)
+        for position, key in enumerate(keys):
+            value = values[key]
+            comma = ',' if position < len(keys) - 1 else ''
+            if isinstance(value, dict):
+                self.file.write(f"{indent}{key!r}: {{\n")
+                self._write_dict(value, value.keys(), depth + 1)
+                self.file.write(f"{indent}}}{comma}\n")
+            else:
+                self.file.write(f"{indent}{key!r}: {value!r}{comma}\n")
+
+    def write(self, row, record):
+        self.file.write("    {\n")
+        self._write_dict(record, self.spec.py_keys, 2)
+        self.file.write("    },\n")
+
+    def close(self):
+        self.file.write("]\n")
+        super().close()
+
+class ParquetWriter(ExportWriter):
+    """Parquet with one row group per streamed batch; requires pyarrow"""
+    extension = 'parquet'
+    compressible = False  # Compressed internally, zstd when compression is requested
+
+    def __init__(self, spec: ExportSpec, path: str, compress: bool = False):
+        super().__init__(spec, path, compress)
+        self.zstd = compress
+
+    _TYPES = {
+        'int': lambda: pa.int64(),
+        'str': lambda: pa.string(),
+        'list': lambda: pa.list_(pa.string())
+    }
+
+    def open(self):
+        if pa is None:
+            raise RuntimeError("pyarrow is required for Parquet exports")
+        self.schema = pa.schema([(name, self._TYPES[kind]()) for name, kind in self.spec.parquet_types.items()])
+        self.writer = pq.ParquetWriter(self.path, self.schema, compression='zstd' if self.zstd else 'snappy')
+        self.buffer: List[Dict[str, Any]] = []
+
+    def _flatten(self, record):
+        flat = {}
+        for name, kind in self.spec.parquet_types.items():
+            if name.startswith('image_') and name != 'image_url':
+                value = record['image_details'][name[len('image_'):]]
+            else:
+                value = record[name]
+            flat[name] = [str(item) for item in value] if kind == 'list' else value
+        return flat
+
+    def _flush(self):
+        if self.buffer:
+            self.writer.write_table(pa.Table.from_pylist(self.buffer, schema=self.schema))
+            self.buffer = []
+
+    def write(self, row, record):
+        self.buffer.append(self._flatten(record))
+        if len(self.buffer) >= EXPORT_BATCH_SIZE:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+class CatalogExportWriter(ExportWriter):
+    """Indexed binary catalog for O(1) id and name lookups, see services/catalog.py"""
+    extension = 'catalog'
+    compressible = False  # Readers memory-map the file
+
+    def open(self):
+        self.catalog = CatalogWriter(self.path, self.spec.image_type)
+
+    def write(self, row, record):
+        self.catalog.add(record)
+
+    def close(self):
+        self.catalog.close()
+
+WRITERS = {writer.extension: writer for writer in
+           (CsvWriter, JsonWriter, XmlWriter, PythonWriter, NdjsonWriter, ParquetWriter, CatalogExportWriter)}
+
+def _changed_at():
+    # Rows written before updated_at existed only have created_at
+    return db.func.coalesce(ImageAnalysis.updated_at, ImageAnalysis.created_at)
+
+def iter_rows(spec: ExportSpec, since: Optional[datetime] = None,
+              batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Any]:
+    """Stream the selected columns in id order, `batch_size` rows per fetch"""
+    statement = db.select(*spec.columns, _changed_at().label('changed_at'))\
+        .where(ImageAnalysis.image_type == spec.image_type)\
+        .order_by(ImageAnalysis.id)
+    if since is not None:
+        statement = statement.where(_changed_at() > since)
+    yield from db.session.execute(statement.execution_options(yield_per=batch_size))
+
+def watermark_path(spec: ExportSpec, output_dir: str) -> str:
+    return os.path.join(output_dir, f"{spec.name}.watermark")
+
+def read_watermark(spec: ExportSpec, output_dir: str = '.') -> Optional[datetime]:
+    """Change time of the newest row in the previous export, if any"""
+    try:
+        with open(watermark_path(spec, output_dir)) as handle:
+            return datetime.fromisoformat(handle.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def parse_since(value: Optional[str], last_watermark: Optional[datetime]) -> Optional[datetime]:
+    """
+    Resolve a --since argument: 'last' means the previous export's watermark
+    (a full export when there is none), anything else is an ISO timestamp.
+    """
+    if value is None:
+        return None
+    if value == 'last':
+        if last_watermark is None:
+            logger.info("No previous export watermark, exporting everything")
+        return last_watermark
+    return datetime.fromisoformat(value)
+
+def write_watermark(spec: ExportSpec, output_dir: str, watermark: datetime):
+    with open(watermark_path(spec, output_dir), 'w') as handle:
+        handle.write(watermark.isoformat())
+
+PARALLEL_MODES = ('processes', 'threads', 'sequential')
+
+# Extra processes only pay off with cores to run them on
+DEFAULT_MODE = 'processes' if (os.cpu_count() or 1) > 1 else 'sequential'
+
+_ROW_TYPES: Dict[str, Any] = {}
+
+def _row_type(spec: ExportSpec):
+    """Named tuple with the exported columns; rows travel to writer processes as plain tuples"""
+    if spec.image_type not in _ROW_TYPES:
+        _ROW_TYPES[spec.image_type] = namedtuple(f"{spec.label}Row", [column.key for column in spec.columns] + ['changed_at'])
+    return _ROW_TYPES[spec.image_type]
+
+def _pairs(spec: ExportSpec, batch: List[tuple]) -> List[Tuple[Any, Dict[str, Any]]]:
+    row_type = _row_type(spec)
+    rows = [row_type._make(row) for row in batch]
+    return [(row, spec.record(row)) for row in rows]
+
+def _drain(writer: ExportWriter, next_batch: Callable[[], Optional[List[Tuple[Any, Dict[str, Any]]]]]) -> Optional[BaseException]:
+    """Open the writer, write batches until None arrives, close. Returns the first error."""
+    error = None
+    opened = False
+    try:
+        writer.open()
+        opened = True
+    except Exception as e:
+        error = e
+    while True:
+        batch = next_batch()
+        if batch is None:
+            break
+        # After a failure keep draining so the reader never blocks on a full queue
+        if error is None:
+            try:
+                writer.write_batch(batch)
+            except Exception as e:
+                error = e
+    if opened:
+        try:
+            writer.close()
+        except Exception as e:
+            error = error or e
+    return error
+
+class _WriterThread(threading.Thread):
+    """Runs one writer in a thread, fed (row, record) batches through a bounded queue"""
+
+    def __init__(self, writer: ExportWriter):
+        super().__init__(name=f"export-{writer.extension}", daemon=True)
+        self.writer = writer
+        self.queue: queue.Queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self.error: Optional[BaseException] = None
+
+    def put(self, rows, pairs):
+        self.queue.put(pairs)
+
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def run(self):
+        self.error = _drain(self.writer, self.queue.get)
+
+    def finish(self):
+        self.queue.put(None)
+        self.join()
+        return self.error
+
+def _writer_process_main(image_type: str, extension: str, path: str, compress: bool,
+                         batches, errors, failed):
+    spec = EXPORTS[image_type]
+    writer = WRITERS[extension](spec, path, compress)
+
+    def next_batch():
+        rows = batches.get()
+        return None if rows is None else _pairs(spec, rows)
+
+    error = _drain(writer, next_batch)
+    if error is not None:
+        failed.set()
+    errors.put(None if error is None else f"{type(error).__name__}: {error}")
+
+class _WriterProcess:
+    """Runs one writer in its own process, so formats are formatted truly in parallel"""
+
+    def __init__(self, writer: ExportWriter, context):
+        self.writer = writer
+        self.batches = context.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self.errors = context.Queue()
+        self.failed_event = context.Event()
+        self.process = context.Process(
+            target=_writer_process_main,
+            name=f"export-{writer.extension}",
+            args=(writer.spec.image_type, writer.extension, writer.base_path, writer.compress,
+                  self.batches, self.errors, self.failed_event),
+            daemon=True
+        )
+
+    def start(self):
+        self.process.start()
+
+    def _send(self, item):
+        """Queue `item` for the writer unless it died; a dead writer would never make room"""
+        while self.process.is_alive():
+            try:
+                self.batches.put(item, timeout=WRITER_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+        # Unread batches must not keep this process waiting on the queue's feeder thread at exit
+        self.batches.cancel_join_thread()
+
+    def put(self, rows, pairs):
+        self._send(rows)
+
+    def failed(self) -> bool:
+        # Before finish() the writer only exits by crashing (OOM kill, segfault, ...)
+        return self.failed_event.is_set() or not self.process.is_alive()
+
+    def finish(self):
+        self._send(None)
+        while True:
+            try:
+                message = self.errors.get(timeout=WRITER_POLL_SECONDS)
+                break
+            except queue.Empty:
+                if self.process.is_alive():
+                    continue
+            # Exited: its report, if any, is already in the queue
+            try:
+                message = self.errors.get(timeout=WRITER_POLL_SECONDS)
+                break
+            except queue.Empty:
+                self.process.join()
+                return RuntimeError(f"{self.writer.extension} export failed: the writer process exited "
+                                    f"with code {self.process.exitcode} without reporting")
+        self.process.join()
+        return RuntimeError(f"{self.writer.extension} export failed: {message}") if message else None
+
+def _batches(spec: ExportSpec, rows: Iterable[Any], batch_size: int,
+             with_records: bool) -> Iterator[Tuple[List[tuple], Optional[List[Tuple[Any, Dict[str, Any]]]]]]:
+    """Group rows into batches of plain tuples, plus (row, record) pairs when needed locally"""
+    batch = []
+    for row in rows:
+        batch.append(tuple(row))
+        if len(batch) >= batch_size:
+            yield batch, _pairs(spec, batch) if with_records else None
+            batch = []
+    if batch:
+        yield batch, _pairs(spec, batch) if with_records else None
+
+def write_rows(spec: ExportSpec, rows: Iterable[Any], writers: Sequence[ExportWriter],
+               mode: str = DEFAULT_MODE, batch_size: int = EXPORT_BATCH_SIZE) -> Tuple[int, Optional[datetime]]:
+    """
+    Feed one row stream to every writer.
+    'processes' runs each format in its own process: formatting is CPU-bound Python,
+    so this is the mode that scales with cores. 'threads' overlaps file I/O and
+    compression only. 'sequential' writes every format from the calling thread.
+    Returns the row count and the newest `changed_at` seen.
+    """
+    if mode not in PARALLEL_MODES:
+        raise ValueError(f"Unknown export mode: {mode}")
+    if len(writers) < 2:
+        mode = 'sequential'
+
+    count = 0
+    newest = None
+    changed_at_index = len(spec.columns)
+
+    if mode == 'sequential':
+        for writer in writers:
+            writer.open()
+        try:
+            for batch, pairs in _batches(spec, rows, batch_size, with_records=True):
+                for writer in writers:
+                    writer.write_batch(pairs)
+                count += len(batch)
+                newest = max(filter(None, [newest] + [row[changed_at_index] for row in batch]), default=None)
+        finally:
+            for writer in writers:
+                writer.close()
+        return count, newest
+
+    if mode == 'processes':
+        # Spawned, not forked: a forked child would inherit the parent's engine and its pooled
+        # sockets. Writers never touch the database, so nothing is lost by starting clean.
+        context = multiprocessing.get_context('spawn')
+        workers = [_WriterProcess(writer, context) for writer in writers]
+    else:
+        workers = [_WriterThread(writer) for writer in writers]
+    for worker in workers:
+        worker.start()
+
+    errors = []
+    try:
+        for batch, pairs in _batches(spec, rows, batch_size, with_records=(mode == 'threads')):
+            if any(worker.failed() for worker in workers):
+                break
+            for worker in workers:
+                worker.put(batch, pairs)
+            count += len(batch)
+            newest = max(filter(None, [newest] + [row[changed_at_index] for row in batch]), default=None)
+    finally:
+        for worker in workers:
+            error = worker.finish()
+            if error is not None:
+                errors.append(error)
+
+    if errors:
+        raise errors[0]
+    return count, newest
+
+def export(spec: ExportSpec, formats: Sequence[str] = DEFAULT_FORMATS, output_dir: str = '.',
+           since: Optional[datetime] = None, batch_size: int = EXPORT_BATCH_SIZE,
+           mode: str = DEFAULT_MODE, compress: bool = False) -> Dict[str, str]:
+    """
+    Export one image type to each requested format in a single streaming pass.
+    With `since`, only rows changed after that time are written, to '<name>_changes.*'
+    files so the full export is left intact. Deleted rows are not reported.
+    `mode` is one of PARALLEL_MODES, see write_rows().
+    `compress` gzips the text formats on the fly ('.gz' is appended to their names).
+    Returns the written file path per format.
+    """
+    unknown = [name for name in formats if name not in WRITERS]
+    if unknown:
+        raise ValueError(f"Unknown export formats: {', '.join(unknown)}")
+
+    base = spec.name if since is None else f"{spec.name}_changes"
+    writers = [WRITERS[name](spec, os.path.join(output_dir, f"{base}.{name}"), compress) for name in formats]
+
+    logger.info(f"Starting export of {spec.label.lower()} data" + (f" changed since {since}" if since else ""))
+    count, newest = write_rows(spec, iter_rows(spec, since, batch_size), writers, mode, batch_size)
+
+    watermark = max(filter(None, (since, newest)), default=None)
+    if watermark is not None:
+        write_watermark(spec, output_dir, watermark)
+    logger.info(f"Exported {count} {spec.label.lower()} entries")
+    return {writer.extension: writer.path for writer in writers}
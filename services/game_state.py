@@ -0,0 +1,206 @@
+import os
+import copy
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from database import db
+from models import GameStateDelta, UserProgress
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Fold the pending deltas into a full snapshot after this many versions
+SNAPSHOT_INTERVAL = int(os.environ.get("GAME_STATE_SNAPSHOT_INTERVAL", "20"))
+
+PATCH_FORMATS = ('merge', 'json-patch')
+
+class VersionConflict(Exception):
+    """Raised when a save is based on a version that is no longer current"""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Game state has changed, current version is {current_version}")
+        self.current_version = current_version
+
+class InvalidPatch(Exception):
+    """Raised when a game state delta cannot be applied"""
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """Apply a JSON Merge Patch (RFC 7386) and return the result"""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+def _split_pointer(path: str) -> List[str]:
+    if path == '':
+        return []
+    if not path.startswith('/'):
+        raise InvalidPatch(f"Invalid JSON pointer: {path}")
+    return [part.replace('~1', '/').replace('~0', '~') for part in path[1:].split('/')]
+
+def _resolve_parent(doc: Any, parts: List[str]):
+    parent = doc
+    for part in parts[:-1]:
+        try:
+            parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise InvalidPatch(f"Path not found: /{'/'.join(parts)}")
+    return parent, parts[-1]
+
+def _get(doc: Any, path: str) -> Any:
+    parts = _split_pointer(path)
+    if not parts:
+        return doc
+    parent, key = _resolve_parent(doc, parts)
+    try:
+        return parent[int(key)] if isinstance(parent, list) else parent[key]
+    except (KeyError, IndexError, ValueError, TypeError):
+        raise InvalidPatch(f"Path not found: {path}")
+
+def _remove(doc: Any, path: str) -> Any:
+    parent, key = _resolve_parent(doc, _split_pointer(path))
+    try:
+        return parent.pop(int(key)) if isinstance(parent, list) else parent.pop(key)
+    except (KeyError, IndexError, ValueError, TypeError):
+        raise InvalidPatch(f"Path not found: {path}")
+
+def _add(doc: Any, path: str, value: Any) -> Any:
+    parts = _split_pointer(path)
+    if not parts:
+        return value
+    parent, key = _resolve_parent(doc, parts)
+    if isinstance(parent, list):
+        index = len(parent) if key == '-' else int(key)
+        if index > len(parent):
+            raise InvalidPatch(f"Index out of range: {path}")
+        parent.insert(index, value)
+    elif isinstance(parent, dict):
+        parent[key] = value
+    else:
+        raise InvalidPatch(f"Cannot add to a scalar at {path}")
+    return doc
+
+def apply_json_patch(doc: Any, operations: List[Dict[str, Any]]) -> Any:
+    """Apply a JSON Patch (RFC 6902) and return the result"""
+    doc = copy.deepcopy(doc)
+    for operation in operations:
+        op = operation.get('op')
+        path = operation.get('path', '')
+        if op == 'add':
+            doc = _add(doc, path, copy.deepcopy(operation.get('value')))
+        elif op == 'remove':
+            _remove(doc, path)
+        elif op == 'replace':
+            _get(doc, path)
+            if path == '':
+                doc = copy.deepcopy(operation.get('value'))
+            else:
+                _remove(doc, path)
+                doc = _add(doc, path, copy.deepcopy(operation.get('value')))
+        elif op == 'move':
+            value = _remove(doc, operation['from'])
+            doc = _add(doc, path, value)
+        elif op == 'copy':
+            doc = _add(doc, path, copy.deepcopy(_get(doc, operation['from'])))
+        elif op == 'test':
+            if _get(doc, path) != operation.get('value'):
+                raise InvalidPatch(f"Test failed at {path}")
+        else:
+            raise InvalidPatch(f"Unsupported patch operation: {op}")
+    return doc
+
+def apply_patch(state: Any, patch_format: str, patch: Any) -> Any:
+    """Apply a stored delta in either supported format"""
+    if patch_format == 'merge':
+        return apply_merge_patch(state, patch)
+    return apply_json_patch(state, patch)
+
+def _validate_patch(patch_format: str, patch: Any):
+    if patch_format not in PATCH_FORMATS:
+        raise InvalidPatch(f"Unsupported delta format: {patch_format}")
+    if patch_format == 'json-patch':
+        if not isinstance(patch, list) or not all(isinstance(op, dict) and 'op' in op for op in patch):
+            raise InvalidPatch("A json-patch delta must be a list of operations")
+
+def _compare_and_swap(progress: UserProgress, base_version: Optional[int]) -> int:
+    """
+    Atomically bump the state version if it still equals base_version.
+    With no base_version the save is unconditional (legacy last-writer-wins clients).
+    Returns the new version or raises VersionConflict.
+    """
+    statement = db.update(UserProgress)\
+        .where(UserProgress.id == progress.id)\
+        .values(state_version=UserProgress.state_version + 1, last_updated=datetime.utcnow())\
+        .returning(UserProgress.state_version)
+    if base_version is not None:
+        statement = statement.where(UserProgress.state_version == base_version)
+
+    new_version = db.session.execute(statement).scalar()
+    if new_version is None:
+        current = db.session.query(UserProgress.state_version)\
+            .filter(UserProgress.id == progress.id).scalar()
+        raise VersionConflict(current or 0)
+    return new_version
+
+def _pending_deltas(progress_id: int, after_version: int):
+    return GameStateDelta.query\
+        .filter(GameStateDelta.progress_id == progress_id, GameStateDelta.version > after_version)\
+        .order_by(GameStateDelta.version)
+
+def _write_snapshot(progress_id: int, state: Any, version: int):
+    """Store a full snapshot and drop the deltas it includes"""
+    db.session.execute(
+        db.update(UserProgress)
+        .where(UserProgress.id == progress_id)
+        .values(game_state=state, snapshot_version=version)
+    )
+    GameStateDelta.query\
+        .filter(GameStateDelta.progress_id == progress_id, GameStateDelta.version <= version)\
+        .delete(synchronize_session=False)
+
+def save_full_state(progress: UserProgress, game_state: Any, base_version: Optional[int] = None) -> int:
+    """Replace the whole game state. The caller commits."""
+    db.session.flush()
+    new_version = _compare_and_swap(progress, base_version)
+    _write_snapshot(progress.id, game_state, new_version)
+    return new_version
+
+def save_delta(progress: UserProgress, patch: Any, base_version: int, patch_format: str = 'merge') -> int:
+    """
+    Append a delta against base_version, folding into a snapshot every SNAPSHOT_INTERVAL
+    versions. The caller commits.
+    """
+    _validate_patch(patch_format, patch)
+    db.session.flush()
+    new_version = _compare_and_swap(progress, base_version)
+    db.session.add(GameStateDelta(
+        progress_id=progress.id,
+        version=new_version,
+        patch_format=patch_format,
+        patch=patch
+    ))
+
+    snapshot_version = db.session.query(UserProgress.snapshot_version)\
+        .filter(UserProgress.id == progress.id).scalar() or 0
+    if new_version - snapshot_version >= SNAPSHOT_INTERVAL:
+        db.session.flush()
+        state, version = load_state(progress.id)
+        _write_snapshot(progress.id, state, version)
+        logger.debug(f"Folded game state for progress {progress.id} into snapshot v{version}")
+    return new_version
+
+def load_state(progress_id: int):
+    """Return (game_state, version): the latest snapshot with pending deltas replayed"""
+    state, snapshot_version, state_version = db.session.query(
+        UserProgress.game_state, UserProgress.snapshot_version, UserProgress.state_version
+    ).filter(UserProgress.id == progress_id).one()
+
+    for delta in _pending_deltas(progress_id, snapshot_version or 0):
+        state = apply_patch(state, delta.patch_format, delta.patch)
+    return state, state_version or 0
@@ -0,0 +1,345 @@
+import io
+import os
+import re
+import csv
+import gzip
+import json
+import logging
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import db
+from models import ImageAnalysis, ImageAnalysisRaw
+from services.catalog import Catalog
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+
+# Characters read per chunk when streaming a JSON array
+_JSON_CHUNK_SIZE = 64 * 1024
+_SEPARATORS = re.compile(r'[\s,]*')
+
+CHARACTER_FIELDS = ('character_name', 'character_traits', 'character_role', 'plot_lines')
+SCENE_FIELDS = ('scene_type', 'setting', 'setting_description', 'story_fit', 'dramatic_moments')
+LIST_FIELDS = ('character_traits', 'plot_lines', 'dramatic_moments')
+
+IMAGE_DETAIL_COLUMNS = ('image_width', 'image_height', 'image_format', 'image_size_bytes')
+
+# Columns written to image_analysis on import; search_vector is generated by Postgres
+IMPORT_COLUMNS = ('id', 'image_url') + IMAGE_DETAIL_COLUMNS + ('image_type',) + CHARACTER_FIELDS + SCENE_FIELDS
+# The COPY staging table also carries the analysis, which goes to image_analysis_raw
+STAGED_COLUMNS = IMPORT_COLUMNS + ('analysis_result',)
+
+def infer_kind(path: str) -> str:
+    """'character' or 'scene' from an export file name such as scene_data.csv.gz"""
+    name = os.path.basename(path)
+    for kind in ('character', 'scene'):
+        if name.startswith(kind):
+            return kind
+    raise ValueError(f"Cannot tell whether {path} holds characters or scenes, pass the kind explicitly")
+
+def _open_text(path: str, newline: Optional[str] = None):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline=newline)
+    return open(path, 'r', encoding='utf-8', newline=newline)
+
+def _format(path: str) -> str:
+    name = path[:-3] if path.endswith('.gz') else path
+    return os.path.splitext(name)[1].lstrip('.')
+
+def _int(value) -> Optional[int]:
+    if value in (None, '', 'None'):
+        return None
+    return int(value)
+
+def _text(value) -> Optional[str]:
+    if value in (None, '', 'None'):
+        return None
+    return str(value)
+
+def _list(value) -> List[Any]:
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+def read_json(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the objects of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    with _open_text(path) as f:
+        buffer = ''
+        while not buffer.strip():
+            chunk = f.read(_JSON_CHUNK_SIZE)
+            if not chunk:
+                return
+            buffer += chunk
+        buffer = buffer.lstrip()
+        if buffer[0] != '[':
+            raise ValueError(f"{path} does not contain a JSON array")
+
+        pos = 1
+        eof = False
+        while True:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if pos < len(buffer):
+                if buffer[pos] == ']':
+                    return
+                try:
+                    record, pos = decoder.raw_decode(buffer, pos)
+                    yield record
+                    continue
+                except json.JSONDecodeError:
+                    # Most likely an object cut off at the chunk boundary
+                    if eof:
+                        raise
+            elif eof:
+                raise ValueError(f"{path} ends before the JSON array is closed")
+            chunk = f.read(_JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+def read_ndjson(path: str) -> Iterator[Dict[str, Any]]:
+    with _open_text(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_csv(path: str) -> Iterator[Dict[str, Any]]:
+    """CSV exports carry the image details as flat image_* columns"""
+    with _open_text(path, newline='') as f:
+        for row in csv.DictReader(f):
+            record = dict(row)
+            record['image_details'] = {
+                'width': row.get('image_width'),
+                'height': row.get('image_height'),
+                'format': row.get('image_format'),
+                'size_bytes': row.get('image_size_bytes')
+            }
+            yield record
+
+def read_xml(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream <character>/<scene> elements, clearing each one once it has been read"""
+    with _open_text(path) as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        item_tag = root.tag[:-1]  # characters -> character, scenes -> scene
+        for event, element in context:
+            if event != 'end' or element.tag != item_tag:
+                continue
+            record: Dict[str, Any] = {}
+            for child in element:
+                if child.tag == 'image_details':
+                    record['image_details'] = {detail.tag: detail.text for detail in child}
+                elif child.tag in LIST_FIELDS:
+                    record[child.tag] = [item.text or '' for item in child]
+                else:
+                    record[child.tag] = child.text
+            yield record
+            element.clear()
+            root.clear()
+
+def read_catalog(path: str) -> Iterator[Dict[str, Any]]:
+    catalog = Catalog(path)
+    try:
+        yield from catalog
+    finally:
+        catalog.close()
+
+READERS: Dict[str, Callable[[str], Iterator[Dict[str, Any]]]] = {
+    'json': read_json,
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+    'xml': read_xml,
+    'catalog': read_catalog,
+}
+
+def to_row(kind: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn an export record into ImageAnalysis column values plus its analysis_result.
+    The export does not carry the analysis, so it is rebuilt from the derived columns in the shape the
+    analysis produces, which the app falls back to when a column is empty.
+    """
+    details = record.get('image_details') or {}
+    row = {
+        'id': _int(record.get('id')),
+        'image_url': record['image_url'],
+        'image_width': _int(details.get('width')),
+        'image_height': _int(details.get('height')),
+        'image_format': _text(details.get('format')),
+        'image_size_bytes': _int(details.get('size_bytes')),
+        'image_type': kind,
+    }
+    for field in CHARACTER_FIELDS + SCENE_FIELDS:
+        row[field] = None
+    fields = CHARACTER_FIELDS if kind == 'character' else SCENE_FIELDS
+    for field in fields:
+        row[field] = _list(record.get(field)) if field in LIST_FIELDS else _text(record.get(field))
+
+    if kind == 'character':
+        row['analysis_result'] = {
+            'name': row['character_name'] or '',
+            'character_traits': row['character_traits'],
+            'role': row['character_role'] or '',
+            'plot_lines': row['plot_lines']
+        }
+    else:
+        row['analysis_result'] = {field: row[field] if row[field] is not None else '' for field in SCENE_FIELDS}
+    return row
+
+def _deduplicate(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep the last row per id (or URL when there is no id); ON CONFLICT cannot update a row twice"""
+    unique: Dict[Any, Dict[str, Any]] = {}
+    for row in rows:
+        key = ('id', row['id']) if row['id'] is not None else ('url', row['image_url'])
+        unique.pop(key, None)
+        unique[key] = row
+    return list(unique.values())
+
+def _assign_ids_by_url(rows: List[Dict[str, Any]]):
+    """Rows without an id (e.g. from scene CSVs) update the existing image with the same URL"""
+    missing = {row['image_url']: row for row in rows if row['id'] is None}
+    if not missing:
+        return
+    existing = db.session.query(ImageAnalysis.image_url, db.func.min(ImageAnalysis.id))\
+        .filter(ImageAnalysis.image_url.in_(list(missing)))\
+        .group_by(ImageAnalysis.image_url)
+    for url, image_id in existing:
+        for row in rows:
+            if row['id'] is None and row['image_url'] == url:
+                row['id'] = image_id
+
+def _assign_new_ids(rows: List[Dict[str, Any]]):
+    """Give the remaining id-less rows new ids from the sequence, so their analyses can reference them"""
+    new = [row for row in rows if row['id'] is None]
+    if not new:
+        return
+    ids = db.session.execute(db.text(
+        "SELECT nextval(pg_get_serial_sequence('image_analysis', 'id')) FROM generate_series(1, :count)"
+    ), {'count': len(new)}).scalars().all()
+    for row, image_id in zip(new, ids):
+        row['id'] = image_id
+
+def _upsert(rows: List[Dict[str, Any]]) -> int:
+    """Multi-row INSERT ... ON CONFLICT DO UPDATE into image_analysis, then image_analysis_raw, for one batch"""
+    table = ImageAnalysis.__table__
+    now = datetime.utcnow()
+    statement = pg_insert(table).values([
+        dict({column: row[column] for column in IMPORT_COLUMNS}, created_at=now, updated_at=now) for row in rows
+    ])
+    updates = {column: statement.excluded[column] for column in IMPORT_COLUMNS if column != 'id'}
+    # Character CSVs carry no image details; keep what the database already has
+    for column in IMAGE_DETAIL_COLUMNS:
+        updates[column] = db.func.coalesce(statement.excluded[column], table.c[column])
+    updates['updated_at'] = statement.excluded.updated_at
+    db.session.execute(statement.on_conflict_do_update(index_elements=['id'], set_=updates))
+
+    analyses = pg_insert(ImageAnalysisRaw.__table__).values([
+        {'image_id': row['id'], 'analysis_result': row['analysis_result']} for row in rows
+    ])
+    db.session.execute(analyses.on_conflict_do_update(
+        index_elements=['image_id'], set_={'analysis_result': analyses.excluded.analysis_result}
+    ))
+    return len(rows)
+
+def _copy_value(value) -> str:
+    if value is None:
+        return '\\N'
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def _copy(rows: List[Dict[str, Any]]) -> int:
+    """
+    COPY the batch into a temporary staging table, then upsert from there into
+    image_analysis and image_analysis_raw, one statement each
+    """
+    connection = db.session.connection()
+    columns = ', '.join(IMPORT_COLUMNS)
+    connection.exec_driver_sql(
+        f"CREATE TEMP TABLE IF NOT EXISTS image_import_staging ON COMMIT DELETE ROWS AS "
+        f"SELECT {columns}, NULL::jsonb AS analysis_result FROM image_analysis WITH NO DATA"
+    )
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(row[column]) for column in STAGED_COLUMNS) + '\n')
+    buffer.seek(0)
+
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY image_import_staging ({', '.join(STAGED_COLUMNS)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+    other_columns = [column for column in IMPORT_COLUMNS if column != 'id']
+    updates = ', '.join(
+        f"{column} = coalesce(EXCLUDED.{column}, image_analysis.{column})" if column in IMAGE_DETAIL_COLUMNS
+        else f"{column} = EXCLUDED.{column}"
+        for column in other_columns
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO image_analysis ({columns}, created_at, updated_at) "
+        f"SELECT {columns}, now(), now() FROM image_import_staging "
+        f"ON CONFLICT (id) DO UPDATE SET {updates}, updated_at = EXCLUDED.updated_at"
+    )
+    connection.exec_driver_sql(
+        "INSERT INTO image_analysis_raw (image_id, analysis_result) "
+        "SELECT id, analysis_result FROM image_import_staging "
+        "ON CONFLICT (image_id) DO UPDATE SET analysis_result = EXCLUDED.analysis_result"
+    )
+    return len(rows)
+
+def reset_id_sequence():
+    """Move the id sequence past imported ids so new analyses do not collide with them"""
+    db.session.execute(db.text(
+        "SELECT setval(pg_get_serial_sequence('image_analysis', 'id'), "
+        "coalesce(max(id), 1), max(id) IS NOT NULL) FROM image_analysis"
+    ))
+
+def _batched(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def import_file(path: str, kind: Optional[str] = None, batch_size: int = IMPORT_BATCH_SIZE,
+                use_copy: bool = False) -> int:
+    """
+    Stream one export file (json, ndjson, csv, xml or catalog, optionally .gz) into
+    image_analysis. Records upsert on id, or on image URL when the file has no ids.
+    Each batch commits on its own, so an interrupted import can simply be re-run.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        raise RuntimeError("Bulk import requires PostgreSQL")
+    file_format = _format(path)
+    if file_format not in READERS:
+        raise ValueError(f"Unsupported import format: {file_format}")
+    kind = kind or infer_kind(path)
+
+    imported = 0
+    write_batch = _copy if use_copy else _upsert
+    try:
+        for records in _batched(READERS[file_format](path), batch_size):
+            rows = _deduplicate([to_row(kind, record) for record in records])
+            _assign_ids_by_url(rows)
+            rows = _deduplicate(rows)
+            _assign_new_ids(rows)
+            imported += write_batch(rows)
+            db.session.commit()
+            logger.info(f"Imported {imported} {kind} records from {path}")
+        reset_id_sequence()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return imported
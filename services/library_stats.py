@@ -0,0 +1,195 @@
+import os
+import logging
+from typing import Any, Dict
+
+from sqlalchemy import text
+
+from database import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds the orphaned-images materialized view may lag behind before readers warn that the
+# periodic refresh (refresh_library_stats.py) is not running
+ORPHAN_STATS_MAX_AGE = int(os.environ.get("LIBRARY_STATS_MAX_AGE", "300"))
+
+# Counters kept in library_stat by statement-level triggers: name -> row predicate
+COUNTERS = {
+    'image_analysis': {
+        'image_count': "true",
+        'character_count': "image_type = 'character'",
+        'scene_count': "image_type = 'scene'",
+    },
+    'story_generation': {
+        'story_count': "true",
+        'empty_stories': "generated_story IS NULL",
+    },
+}
+
+ORPHAN_VIEW = 'library_orphan_stats'
+
+# Arbitrary key for the advisory lock that keeps concurrent readers from refreshing together
+_REFRESH_LOCK_KEY = 7340034
+
+def _count(rows: str, predicate: str) -> str:
+    return f"(SELECT count(*) FROM {rows} WHERE {predicate})"
+
+def _apply_deltas(counters: Dict[str, str], delta) -> str:
+    """One upsert adding the per-counter deltas of a statement to library_stat"""
+    values = ', '.join(f"('{name}', {delta(predicate)})" for name, predicate in counters.items())
+    return (
+        f"INSERT INTO library_stat AS s (name, value) "
+        f"SELECT name, value FROM (VALUES {values}) AS d(name, value) WHERE value <> 0 "
+        f"ON CONFLICT (name) DO UPDATE SET value = s.value + EXCLUDED.value;"
+    )
+
+def _trigger_function(table: str, counters: Dict[str, str]) -> str:
+    names = ', '.join(f"'{name}'" for name in counters)
+    return f"""
+CREATE OR REPLACE FUNCTION library_stat_{table}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {_apply_deltas(counters, lambda p: _count('new_rows', p))}
+    ELSIF TG_OP = 'DELETE' THEN
+        {_apply_deltas(counters, lambda p: '-' + _count('old_rows', p))}
+    ELSIF TG_OP = 'UPDATE' THEN
+        {_apply_deltas(counters, lambda p: _count('new_rows', p) + ' - ' + _count('old_rows', p))}
+    ELSE
+        UPDATE library_stat SET value = 0 WHERE name IN ({names});
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+def _triggers(table: str):
+    function = f"library_stat_{table}()"
+    return {
+        f"library_stat_{table}_insert": f"AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows "
+                                         f"FOR EACH STATEMENT EXECUTE FUNCTION {function}",
+        f"library_stat_{table}_delete": f"AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows "
+                                         f"FOR EACH STATEMENT EXECUTE FUNCTION {function}",
+        f"library_stat_{table}_update": f"AFTER UPDATE ON {table} REFERENCING OLD TABLE AS old_rows "
+                                         f"NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION {function}",
+        f"library_stat_{table}_truncate": f"AFTER TRUNCATE ON {table} "
+                                           f"FOR EACH STATEMENT EXECUTE FUNCTION {function}",
+    }
+
+def is_installed(connection) -> bool:
+    return bool(connection.execute(text(
+        "SELECT 1 FROM pg_trigger WHERE tgname = 'library_stat_image_analysis_insert'"
+    )).scalar()) and bool(connection.execute(text(
+        f"SELECT to_regclass('{ORPHAN_VIEW}')"
+    )).scalar())
+
+def recount(connection) -> None:
+    """Reset every counter from a full count, e.g. after installing the triggers"""
+    for table, counters in COUNTERS.items():
+        values = ', '.join(f"('{name}', {_count(table, predicate)})" for name, predicate in counters.items())
+        connection.execute(text(
+            f"INSERT INTO library_stat (name, value) "
+            f"SELECT name, value FROM (VALUES {values}) AS d(name, value) "
+            f"ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value"
+        ))
+
+def remove_rows(connection, table: str, rows: str) -> None:
+    """
+    Take the rows of `rows` off `table`'s counters, for removals that fire no DELETE
+    trigger such as detaching a partition. Does nothing before the counters are installed.
+    """
+    if not connection.execute(text("SELECT to_regclass('library_stat')")).scalar():
+        return
+    connection.execute(text(_apply_deltas(COUNTERS[table], lambda p: '-' + _count(rows, p))))
+
+def install(connection) -> None:
+    """
+    Create the counter triggers and the orphaned-images materialized view, then seed
+    the counters. Writes to the counted tables are blocked until the transaction ends
+    so no statement slips between the recount and the triggers.
+    """
+    if connection.dialect.name != 'postgresql':
+        return
+
+    connection.execute(text(f"LOCK TABLE {', '.join(COUNTERS)} IN SHARE ROW EXCLUSIVE MODE"))
+    for table, counters in COUNTERS.items():
+        connection.execute(text(_trigger_function(table, counters)))
+        for name, definition in _triggers(table).items():
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {name} ON {table}"))
+            connection.execute(text(f"CREATE TRIGGER {name} {definition}"))
+    recount(connection)
+
+    # The anti-join is too expensive to keep incrementally, so it is refreshed periodically
+    connection.execute(text(
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {ORPHAN_VIEW} AS "
+        f"SELECT 1 AS id, count(*) AS orphaned_images, now() AS refreshed_at "
+        f"FROM image_analysis ia "
+        f"WHERE NOT EXISTS (SELECT 1 FROM story_images si WHERE si.image_id = ia.id)"
+    ))
+    # REFRESH ... CONCURRENTLY needs a unique index
+    connection.execute(text(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{ORPHAN_VIEW}_id ON {ORPHAN_VIEW} (id)"
+    ))
+    logger.info("Installed library statistics triggers and materialized view")
+
+def refresh_orphan_stats() -> bool:
+    """
+    Refresh the orphaned-images view unless another process is already doing it. Run by
+    the periodic maintenance job (services/maintenance.refresh_library_stats), never on
+    the request path.
+    """
+    with db.engine.begin() as connection:
+        if not connection.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                                  {'key': _REFRESH_LOCK_KEY}).scalar():
+            return False
+        connection.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {ORPHAN_VIEW}"))
+    return True
+
+def _live_stats() -> Dict[str, Any]:
+    """Count everything directly; used outside Postgres or before the triggers are installed"""
+    row = db.session.execute(text(
+        "SELECT "
+        "(SELECT count(*) FROM image_analysis) AS image_count, "
+        "(SELECT count(*) FROM image_analysis WHERE image_type = 'character') AS character_count, "
+        "(SELECT count(*) FROM image_analysis WHERE image_type = 'scene') AS scene_count, "
+        "(SELECT count(*) FROM story_generation) AS story_count, "
+        "(SELECT count(*) FROM image_analysis ia WHERE NOT EXISTS "
+        "    (SELECT 1 FROM story_images si WHERE si.image_id = ia.id)) AS orphaned_images, "
+        "(SELECT count(*) FROM story_generation WHERE generated_story IS NULL) AS empty_stories"
+    )).mappings().one()
+    stats = dict(row)
+    stats['orphaned_images_as_of'] = None
+    return stats
+
+def get_library_stats() -> Dict[str, Any]:
+    """
+    Library counters in a single cheap read-only query: trigger-maintained counts plus the
+    orphaned-images count from a materialized view the maintenance job refreshes.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return _live_stats()
+
+    try:
+        row = db.session.execute(text(
+            f"SELECT (SELECT coalesce(json_object_agg(name, value), '{{}}') FROM library_stat) AS counters, "
+            f"o.orphaned_images, o.refreshed_at, "
+            f"extract(epoch FROM now() - o.refreshed_at) AS age "
+            f"FROM {ORPHAN_VIEW} o"
+        )).one_or_none()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Library statistics are not installed, counting directly: {str(e)}")
+        return _live_stats()
+
+    if row is None:
+        return _live_stats()
+
+    orphaned_images, refreshed_at = row.orphaned_images, row.refreshed_at
+    if row.age is not None and row.age > 2 * ORPHAN_STATS_MAX_AGE:
+        logger.warning(f"{ORPHAN_VIEW} was last refreshed {int(row.age)}s ago; "
+                       f"is refresh_library_stats.py scheduled?")
+
+    stats = {name: int(row.counters.get(name, 0))
+             for counters in COUNTERS.values() for name in counters}
+    stats['orphaned_images'] = int(orphaned_images)
+    stats['orphaned_images_as_of'] = refreshed_at.isoformat() if refreshed_at else None
+    return stats
@@ -1,73 +1,15 @@
-import os
 import json
-import requests
 import logging
-import base64
-from typing import Dict, Any, Optional
-import ollama
+from typing import Dict, Any, List
+
+from services.connection_guard import external_call
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-class LocalLLMService:
-    """Service for interacting with local LLM models via Ollama"""
-    
-    def __init__(self, model_name: str = "phi3:mini"):
-        self.model_name = model_name
-        self.client = ollama.Client()
-        self._ensure_model_available()
-    
-    def _ensure_model_available(self):
-        """Ensure the model is downloaded and available"""
-        try:
-            # Check if model is already available
-            models = self.client.list()
-            model_names = [model['name'] for model in models['models']]
-            
-            if self.model_name not in model_names:
-                logger.info(f"Downloading {self.model_name} model...")
-                self.client.pull(self.model_name)
-                logger.info(f"Model {self.model_name} downloaded successfully")
-            else:
-                logger.info(f"Model {self.model_name} is available")
-                
-        except Exception as e:
-            logger.error(f"Error checking/downloading model: {str(e)}")
-            raise Exception(f"Failed to setup model {self.model_name}: {str(e)}")
-    
-    def analyze_artwork(self, image_url: str) -> Dict[str, Any]:
-        """Analyze artwork using local vision model"""
-        try:
-            # Download the image
-            response = requests.get(image_url, timeout=30)
-            response.raise_for_status()
-            
-            # Get image metadata
-            image_metadata = {
-                "width": None,
-                "height": None, 
-                "format": None,
-                "size_bytes": len(response.content)
-            }
-            
-            # Try to get image dimensions and format
-            try:
-                from PIL import Image
-                import io
-                img = Image.open(io.BytesIO(response.content))
-                image_metadata.update({
-                    "width": img.width,
-                    "height": img.height,
-                    "format": img.format.lower() if img.format else "unknown"
-                })
-            except Exception as img_err:
-                logger.warning(f"Could not extract image metadata: {str(img_err)}")
-            
-            # Convert image to base64
-            image_base64 = base64.b64encode(response.content).decode('utf-8')
-            
-            # Create the analysis prompt
-            system_prompt = """You are an expert analyzer of images for a "Choose Your Own Adventure" story universe.
+DEFAULT_MODEL = "phi3:mini"
+
+ANALYSIS_SYSTEM_PROMPT = """You are an expert analyzer of images for a "Choose Your Own Adventure" story universe.
 
 The universe is centered around Uncle Mark's forest farm where two Yorkshire Terriers are the main characters:
 - Pawel (male) - fearless, clever, impulsive
@@ -100,24 +42,127 @@ For SCENES, provide:
 
 Respond in JSON format with the appropriate keys based on the image type. Use snake_case for all field names."""
 
-            user_prompt = "Please analyze this image for our Choose Your Own Adventure story:"
+ANALYSIS_USER_PROMPT = "Please analyze this image for our Choose Your Own Adventure story:"
+
+STORY_SYSTEM_PROMPT = 'You are a creative storyteller specializing in Choose Your Own Adventure stories. Generate engaging, interactive narratives with meaningful choices.'
+
+DESCRIPTION_SYSTEM_PROMPT = 'You are a skilled writer. Create concise, vivid descriptions based on image analysis data.'
+
+# The prompts and parsing below are shared with the async client in services/async_llm.py
+
+def read_image_metadata(content: bytes) -> Dict[str, Any]:
+    """Size, dimensions and format of a downloaded image"""
+    image_metadata = {
+        "width": None,
+        "height": None, 
+        "format": None,
+        "size_bytes": len(content)
+    }
+    
+    # Try to get image dimensions and format
+    try:
+        from PIL import Image
+        import io
+        img = Image.open(io.BytesIO(content))
+        image_metadata.update({
+            "width": img.width,
+            "height": img.height,
+            "format": img.format.lower() if img.format else "unknown"
+        })
+    except Exception as img_err:
+        logger.warning(f"Could not extract image metadata: {str(img_err)}")
+    return image_metadata
+
+def installed_models(models) -> List[str]:
+    """Model names from an Ollama list response; clients since 0.4 report them under 'model'"""
+    return [model.get('model') or model.get('name') for model in models['models']]
+
+def analysis_messages(image_url: str, image_metadata: Dict[str, Any]) -> List[Dict[str, str]]:
+    # For Phi-3, we'll use text-only analysis since vision capabilities may be limited
+    # We'll describe what we can infer from the image URL/context
+    return [
+        {
+            'role': 'system',
+            'content': ANALYSIS_SYSTEM_PROMPT
+        },
+        {
+            'role': 'user', 
+            'content': f"{ANALYSIS_USER_PROMPT}\n\nImage URL: {image_url}\nImage size: {image_metadata['size_bytes']} bytes"
+        }
+    ]
+
+def story_messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {
+            'role': 'system',
+            'content': STORY_SYSTEM_PROMPT
+        },
+        {
+            'role': 'user',
+            'content': prompt
+        }
+    ]
+
+def description_messages(analysis: Dict[str, Any]) -> List[Dict[str, str]]:
+    prompt = f"Based on this image analysis, write a concise, engaging description:\n{json.dumps(analysis, indent=2)}"
+    return [
+        {
+            'role': 'system',
+            'content': DESCRIPTION_SYSTEM_PROMPT
+        },
+        {
+            'role': 'user',
+            'content': prompt
+        }
+    ]
+
+class LocalLLMService:
+    """Service for interacting with local LLM models via Ollama"""
+    
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        # Imported here so loading the app does not pay for the SDK until the first analysis
+        import ollama
+        self.model_name = model_name
+        self.client = ollama.Client()
+        self._ensure_model_available()
+    
+    def _ensure_model_available(self):
+        """Ensure the model is downloaded and available"""
+        try:
+            # Check if model is already available
+            with external_call('Ollama model check'):
+                model_names = installed_models(self.client.list())
+            
+            if self.model_name not in model_names:
+                logger.info(f"Downloading {self.model_name} model...")
+                with external_call('Ollama model download'):
+                    self.client.pull(self.model_name)
+                logger.info(f"Model {self.model_name} downloaded successfully")
+            else:
+                logger.info(f"Model {self.model_name} is available")
+                
+        except Exception as e:
+            logger.error(f"Error checking/downloading model: {str(e)}")
+            raise Exception(f"Failed to setup model {self.model_name}: {str(e)}")
+    
+    def analyze_artwork(self, image_url: str) -> Dict[str, Any]:
+        """Analyze artwork using local vision model"""
+        import requests
+
+        try:
+            # Download the image
+            with external_call('Image download'):
+                response = requests.get(image_url, timeout=30)
+            response.raise_for_status()
             
-            # For Phi-3, we'll use text-only analysis since vision capabilities may be limited
-            # We'll describe what we can infer from the image URL/context
-            response = self.client.chat(
-                model=self.model_name,
-                messages=[
-                    {
-                        'role': 'system',
-                        'content': system_prompt
-                    },
-                    {
-                        'role': 'user', 
-                        'content': f"{user_prompt}\n\nImage URL: {image_url}\nImage size: {image_metadata['size_bytes']} bytes"
-                    }
-                ],
-                format='json'
-            )
+            image_metadata = read_image_metadata(response.content)
+            
+            with external_call('Artwork analysis'):
+                response = self.client.chat(
+                    model=self.model_name,
+                    messages=analysis_messages(image_url, image_metadata),
+                    format='json'
+                )
             
             # Parse the response
             content = response['message']['content']
@@ -142,20 +187,12 @@ Respond in JSON format with the appropriate keys based on the image type. Use sn
     def generate_story(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """Generate story content using local LLM"""
         try:
-            response = self.client.chat(
-                model=self.model_name,
-                messages=[
-                    {
-                        'role': 'system',
-                        'content': 'You are a creative storyteller specializing in Choose Your Own Adventure stories. Generate engaging, interactive narratives with meaningful choices.'
-                    },
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                format='json'
-            )
+            with external_call('Story generation'):
+                response = self.client.chat(
+                    model=self.model_name,
+                    messages=story_messages(prompt),
+                    format='json'
+                )
             
             content = response['message']['content']
             result = json.loads(content)
@@ -173,21 +210,11 @@ Respond in JSON format with the appropriate keys based on the image type. Use sn
     def generate_image_description(self, analysis: Dict[str, Any]) -> str:
         """Generate a concise description of the analyzed image"""
         try:
-            prompt = f"Based on this image analysis, write a concise, engaging description:\n{json.dumps(analysis, indent=2)}"
-            
-            response = self.client.chat(
-                model=self.model_name,
-                messages=[
-                    {
-                        'role': 'system',
-                        'content': 'You are a skilled writer. Create concise, vivid descriptions based on image analysis data.'
-                    },
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ]
-            )
+            with external_call('Image description'):
+                response = self.client.chat(
+                    model=self.model_name,
+                    messages=description_messages(analysis)
+                )
             
             return response['message']['content'].strip()
             
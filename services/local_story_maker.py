@@ -1,5 +1,3 @@
-import os
-import json
 import logging
 from typing import Dict, List, Tuple, Optional, Any
 from services.local_llm_service import get_local_llm_service
@@ -52,7 +50,7 @@ def get_story_options() -> Dict[str, List[Tuple[str, str]]]:
         ]
     }
 
-def generate_story(
+def story_prompt(
     conflict: str,
     setting: str,
     narrative_style: str,
@@ -64,44 +62,49 @@ def generate_story(
     custom_mood: Optional[str] = None,
     previous_choice: Optional[str] = None,
     story_context: Optional[str] = None,
-    additional_characters: Optional[List[Dict[str, Any]]] = None
-) -> Dict[str, Any]:
-    """Generate a story based on selected or custom parameters and character info"""
+    additional_characters: Optional[List[Dict[str, Any]]] = None,
+    scene_info: Optional[Dict[str, Any]] = None
+) -> str:
+    """The prompt for one story segment; shared with the async path in services/async_llm.py"""
+    # Use custom parameters if provided, otherwise use selected ones
+    final_conflict = custom_conflict if custom_conflict else conflict
+    final_setting = custom_setting if custom_setting else setting
+    final_narrative = custom_narrative if custom_narrative else narrative_style
+    final_mood = custom_mood if custom_mood else mood
     
-    try:
-        # Use custom parameters if provided, otherwise use selected ones
-        final_conflict = custom_conflict if custom_conflict else conflict
-        final_setting = custom_setting if custom_setting else setting
-        final_narrative = custom_narrative if custom_narrative else narrative_style
-        final_mood = custom_mood if custom_mood else mood
-        
-        # Build the character context
-        character_context = ""
-        if character_info:
-            if character_info.get('character_name'):
-                character_context += f"Main character: {character_info['character_name']}\n"
-            if character_info.get('character_traits'):
-                character_context += f"Traits: {', '.join(character_info['character_traits'])}\n"
-            if character_info.get('character_role'):
-                character_context += f"Role: {character_info['character_role']}\n"
-        
-        # Add additional characters
-        if additional_characters:
-            character_context += "\nAdditional characters:\n"
-            for char in additional_characters:
-                if char.get('character_name'):
-                    character_context += f"- {char['character_name']}"
-                    if char.get('character_traits'):
-                        character_context += f" ({', '.join(char['character_traits'])})"
-                    character_context += "\n"
-        
-        # Build context for continuing stories
-        continuation_context = ""
-        if previous_choice and story_context:
-            continuation_context = f"\nPrevious story context:\n{story_context}\n\nPlayer's last choice: {previous_choice}\n"
-        
-        # Create the story generation prompt
-        prompt = f"""Create an engaging Choose Your Own Adventure story segment with the following parameters:
+    # Build the character context
+    character_context = ""
+    if character_info:
+        if character_info.get('character_name'):
+            character_context += f"Main character: {character_info['character_name']}\n"
+        if character_info.get('character_traits'):
+            character_context += f"Traits: {', '.join(character_info['character_traits'])}\n"
+        if character_info.get('character_role'):
+            character_context += f"Role: {character_info['character_role']}\n"
+    
+    # Add additional characters
+    if additional_characters:
+        character_context += "\nAdditional characters:\n"
+        for char in additional_characters:
+            if char.get('character_name'):
+                character_context += f"- {char['character_name']}"
+                if char.get('character_traits'):
+                    character_context += f" ({', '.join(char['character_traits'])})"
+                character_context += "\n"
+    
+    # Describe the scene picked for this story
+    if scene_info and (scene_info.get('setting') or scene_info.get('setting_description')):
+        character_context += "\nScene: " + ' - '.join(
+            part for part in (scene_info.get('setting'), scene_info.get('setting_description')) if part
+        ) + "\n"
+
+    # Build context for continuing stories
+    continuation_context = ""
+    if previous_choice and story_context:
+        continuation_context = f"\nPrevious story context:\n{story_context}\n\nPlayer's last choice: {previous_choice}\n"
+    
+    # Create the story generation prompt
+    prompt = f"""Create an engaging Choose Your Own Adventure story segment with the following parameters:
 
 STORY UNIVERSE: Uncle Mark's forest farm with Yorkshire Terriers Pawel and Pawleen as main characters.
 
@@ -142,51 +145,82 @@ Respond in JSON format with:
     "character_focus": "Which characters are prominently featured",
     "tension_level": "low/medium/high"
 }}"""
+    return prompt
+
+def complete_story(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in any fields the model left out"""
+    # Validate the response structure
+    required_fields = ['narrative', 'choices', 'setting_details', 'character_focus', 'tension_level']
+    for field in required_fields:
+        if field not in result:
+            logger.warning(f"Missing field '{field}' in story generation response")
+            if field == 'narrative':
+                result[field] = "The adventure continues..."
+            elif field == 'choices':
+                result[field] = [
+                    {"text": "Continue the adventure", "consequence_hint": "See what happens next"},
+                    {"text": "Take a different path", "consequence_hint": "Explore new possibilities"},
+                    {"text": "Return to safety", "consequence_hint": "Play it safe"}
+                ]
+            else:
+                result[field] = "Unknown"
+    
+    # Ensure choices is a list with at least 3 options
+    if not isinstance(result.get('choices'), list) or len(result['choices']) < 3:
+        result['choices'] = [
+            {"text": "Continue forward", "consequence_hint": "Push ahead with determination"},
+            {"text": "Look for another way", "consequence_hint": "Seek alternative solutions"},
+            {"text": "Call for help", "consequence_hint": "Get assistance from friends"}
+        ]
+    return result
+
+def fallback_story(setting: str) -> Dict[str, Any]:
+    """A fixed story segment, used when generation fails"""
+    return {
+        "narrative": "Pawel and Pawleen stood at the forest edge, their keen eyes scanning the horizon. Something interesting was about to happen, and they could feel the excitement building. The adventure was just beginning, and they needed to decide their next move carefully.",
+        "choices": [
+            {"text": "Investigate the mysterious sound", "consequence_hint": "Discover something unexpected"},
+            {"text": "Gather more information first", "consequence_hint": "Learn before acting"},
+            {"text": "Rally the other animals", "consequence_hint": "Seek help from friends"}
+        ],
+        "setting_details": setting,
+        "character_focus": "Pawel and Pawleen",
+        "tension_level": "medium"
+    }
+
+def generate_story(
+    conflict: str,
+    setting: str,
+    narrative_style: str,
+    mood: str,
+    character_info: Optional[Dict[str, Any]] = None,
+    custom_conflict: Optional[str] = None,
+    custom_setting: Optional[str] = None,
+    custom_narrative: Optional[str] = None,
+    custom_mood: Optional[str] = None,
+    previous_choice: Optional[str] = None,
+    story_context: Optional[str] = None,
+    additional_characters: Optional[List[Dict[str, Any]]] = None,
+    scene_info: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Generate a story based on selected or custom parameters and character info"""
+    
+    try:
+        prompt = story_prompt(conflict, setting, narrative_style, mood, character_info=character_info,
+                              custom_conflict=custom_conflict, custom_setting=custom_setting,
+                              custom_narrative=custom_narrative, custom_mood=custom_mood,
+                              previous_choice=previous_choice, story_context=story_context,
+                              additional_characters=additional_characters, scene_info=scene_info)
 
         # Generate the story using local LLM
         llm_service = get_local_llm_service()
-        result = llm_service.generate_story(prompt)
-        
-        # Validate the response structure
-        required_fields = ['narrative', 'choices', 'setting_details', 'character_focus', 'tension_level']
-        for field in required_fields:
-            if field not in result:
-                logger.warning(f"Missing field '{field}' in story generation response")
-                if field == 'narrative':
-                    result[field] = "The adventure continues..."
-                elif field == 'choices':
-                    result[field] = [
-                        {"text": "Continue the adventure", "consequence_hint": "See what happens next"},
-                        {"text": "Take a different path", "consequence_hint": "Explore new possibilities"},
-                        {"text": "Return to safety", "consequence_hint": "Play it safe"}
-                    ]
-                else:
-                    result[field] = "Unknown"
-        
-        # Ensure choices is a list with at least 3 options
-        if not isinstance(result.get('choices'), list) or len(result['choices']) < 3:
-            result['choices'] = [
-                {"text": "Continue forward", "consequence_hint": "Push ahead with determination"},
-                {"text": "Look for another way", "consequence_hint": "Seek alternative solutions"},
-                {"text": "Call for help", "consequence_hint": "Get assistance from friends"}
-            ]
+        result = complete_story(llm_service.generate_story(prompt))
         
-        logger.info(f"Successfully generated story with conflict: {final_conflict}, setting: {final_setting}")
+        logger.info(f"Successfully generated story with conflict: {custom_conflict or conflict}, setting: {custom_setting or setting}")
         return result
         
     except Exception as e:
         logger.error(f"Error generating story: {str(e)}")
         
         # Return a fallback story structure
-        fallback_setting = custom_setting if custom_setting else setting if 'setting' in locals() else "forest"
-        return {
-            "narrative": "Pawel and Pawleen stood at the forest edge, their keen eyes scanning the horizon. Something interesting was about to happen, and they could feel the excitement building. The adventure was just beginning, and they needed to decide their next move carefully.",
-            "choices": [
-                {"text": "Investigate the mysterious sound", "consequence_hint": "Discover something unexpected"},
-                {"text": "Gather more information first", "consequence_hint": "Learn before acting"},
-                {"text": "Rally the other animals", "consequence_hint": "Seek help from friends"}
-            ],
-            "setting_details": fallback_setting,
-            "character_focus": "Pawel and Pawleen",
-            "tension_level": "medium"
-        }
\ No newline at end of file
+        return fallback_story(custom_setting if custom_setting else setting)
@@ -0,0 +1,281 @@
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, cast, func, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import JSONB, array
+
+from database import db
+from models import ImageAnalysis, ImageAnalysisRaw
+from services import library_stats
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+ProgressCallback = Callable[[str, int, int], None]
+
+# The analysis lives in image_analysis_raw; every batch joins it to image_analysis
+ANALYSIS = ImageAnalysisRaw.analysis_result
+WITH_ANALYSIS = ImageAnalysisRaw.image_id == ImageAnalysis.id
+NESTED_CHARACTER = ANALYSIS['character']
+EMPTY_LIST = cast(literal('[]'), JSONB)
+
+def _is_empty_text(column):
+    return or_(column.is_(None), column == '')
+
+def _is_empty_list(column):
+    return or_(column.is_(None), func.jsonb_typeof(column) != 'array', column == EMPTY_LIST)
+
+def _text_value(element):
+    """A JSON string value as text, or NULL when it is missing or empty"""
+    return func.nullif(element.astext, '')
+
+def _list_value(element):
+    """A JSON array value, or NULL when it is missing, empty or not an array"""
+    return case((and_(func.jsonb_typeof(element) == 'array', element != EMPTY_LIST), element))
+
+def _first_in_character(key: str, list_value: bool = False):
+    """`key` from the nested character object, falling back to the top level of the analysis"""
+    value = _list_value if list_value else _text_value
+    return func.coalesce(value(NESTED_CHARACTER[key]), value(ANALYSIS[key]))
+
+HAS_ANALYSIS = and_(func.jsonb_typeof(ANALYSIS) == 'object', ANALYSIS != cast(literal('{}'), JSONB))
+
+# Same rules fix_image_types.py applied in Python: a nested character object,
+# character-specific keys, or a character role
+IS_CHARACTER = or_(
+    func.jsonb_typeof(NESTED_CHARACTER) == 'object',
+    ANALYSIS.has_any(array(['character_name', 'character_traits', 'plot_lines'])),
+    ANALYSIS['role'].astext.in_(['hero', 'villain', 'neutral'])
+)
+DETECTED_TYPE = case((IS_CHARACTER, 'character'), else_='scene')
+
+ANALYSIS_NAME = func.coalesce(_text_value(NESTED_CHARACTER['name']), _text_value(ANALYSIS['character_name']),
+                              _text_value(ANALYSIS['name']))
+
+IS_NAMELESS_CHARACTER = and_(ImageAnalysis.image_type == 'character', _is_empty_text(ImageAnalysis.character_name))
+
+def _fill_text(column, value, condition=True):
+    return case((and_(condition, _is_empty_text(column)), func.coalesce(value, column)), else_=column)
+
+def _fill_list(column, value, condition=True):
+    return case((and_(condition, _is_empty_list(column)), func.coalesce(value, column)), else_=column)
+
+@dataclass
+class Fix:
+    """
+    One normalization of image_analysis. `where` selects the rows that need it and
+    `values` the new column values, both as SQL so the update runs in the database.
+    Rows SQL cannot fix can be handed to `fallback`, which gets the analysis_result and
+    returns the column values to set (or None).
+    """
+    name: str
+    description: str
+    where: Any
+    values: Dict[str, Any]
+    fallback_where: Any = None
+    fallback: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None
+
+def extract_character_name_from_analysis(analysis):
+    """
+    Extract the character name from the analysis result, checking all possible locations
+    This is a robust function that handles different API response structures
+    """
+    if not analysis:
+        return None
+
+    # Handle string JSON
+    if isinstance(analysis, str):
+        try:
+            analysis = json.loads(analysis)
+        except ValueError:
+            logger.warning("Could not parse string analysis_result")
+            return None
+
+    if not isinstance(analysis, dict):
+        return None
+
+    # Option 1: Check if name is in a nested character object
+    if 'character' in analysis and isinstance(analysis['character'], dict):
+        name = analysis['character'].get('name')
+        if name:
+            logger.info(f"Found name '{name}' in character object")
+            return name
+
+    # Option 2: Check if there's a character_name field at top level
+    name = analysis.get('character_name')
+    if name:
+        logger.info(f"Found name '{name}' as character_name at top level")
+        return name
+
+    # Option 3: Check if there's a name field at top level
+    name = analysis.get('name')
+    if name:
+        logger.info(f"Found name '{name}' as name at top level")
+        return name
+
+    # Option 4: Try to extract name from the first plot line (as last resort)
+    plot_lines = analysis.get('plot_lines')
+    if isinstance(plot_lines, list) and plot_lines and isinstance(plot_lines[0], str):
+        # Look for the first capitalized word that might be a name
+        for word in plot_lines[0].split():
+            if word[0].isupper() and len(word) > 2 and word.lower() not in ['the', 'and', 'but', 'with']:
+                potential_name = word.rstrip('.,;:!?')
+                logger.info(f"Extracted potential name '{potential_name}' from plot line")
+                return potential_name
+
+    return None
+
+def _name_from_analysis(analysis) -> Optional[Dict[str, Any]]:
+    name = extract_character_name_from_analysis(analysis)
+    return {'character_name': name} if name else None
+
+FIXES: Dict[str, Fix] = {fix.name: fix for fix in [
+    Fix(
+        name='image_types',
+        description="classify images as character or scene from their analysis, filling empty character fields",
+        where=and_(HAS_ANALYSIS, ImageAnalysis.image_type.is_distinct_from(DETECTED_TYPE)),
+        values={
+            'image_type': DETECTED_TYPE,
+            'character_name': _fill_text(ImageAnalysis.character_name, ANALYSIS_NAME, IS_CHARACTER),
+            'character_traits': _fill_list(ImageAnalysis.character_traits,
+                                           _first_in_character('character_traits', list_value=True), IS_CHARACTER),
+            'character_role': _fill_text(ImageAnalysis.character_role, _first_in_character('role'), IS_CHARACTER),
+            'plot_lines': _fill_list(ImageAnalysis.plot_lines,
+                                     _first_in_character('plot_lines', list_value=True), IS_CHARACTER),
+        }
+    ),
+    Fix(
+        name='missing_names',
+        description="fill empty character names from the analysis",
+        where=and_(IS_NAMELESS_CHARACTER, ANALYSIS_NAME.isnot(None)),
+        values={'character_name': ANALYSIS_NAME},
+        # String-encoded analyses and names only found in a plot line need Python
+        fallback_where=and_(IS_NAMELESS_CHARACTER, ANALYSIS.isnot(None), ANALYSIS_NAME.is_(None)),
+        fallback=_name_from_analysis
+    ),
+    Fix(
+        name='analysis_names',
+        description="fill empty character names from the analysis 'name' field",
+        where=and_(IS_NAMELESS_CHARACTER, _text_value(ANALYSIS['name']).isnot(None)),
+        values={'character_name': _text_value(ANALYSIS['name'])}
+    ),
+    Fix(
+        name='plot_lines',
+        description="fill empty character plot lines from the analysis 'plot_lines' field",
+        where=and_(ImageAnalysis.image_type == 'character', _is_empty_list(ImageAnalysis.plot_lines),
+                   _list_value(ANALYSIS['plot_lines']).isnot(None)),
+        values={'plot_lines': _list_value(ANALYSIS['plot_lines'])}
+    ),
+]}
+
+def _log_progress(fix_name: str, changed: int, watermark: int):
+    logger.info(f"{fix_name}: {changed} records so far, through id {watermark}")
+
+def _report_changes(fix: Fix, batch_where):
+    """Dry run: log the column changes `fix` would make in this batch"""
+    columns = [getattr(ImageAnalysis, column) for column in fix.values]
+    proposed = [value.label(f"new_{column}") for column, value in fix.values.items()]
+    rows = db.session.execute(select(ImageAnalysis.id, *columns, *proposed).where(batch_where)).all()
+    for row in rows:
+        changes = []
+        for i, column in enumerate(fix.values):
+            old, new = row[1 + i], row[1 + len(columns) + i]
+            if old != new:
+                changes.append(f"{column} {old!r} -> {new!r}")
+        logger.info(f"[dry run] record {row.id}: {', '.join(changes)}")
+    return len(rows)
+
+def _run_fallback(fix: Fix, batch_where, dry_run: bool) -> int:
+    rows = db.session.execute(
+        select(ImageAnalysis.id, ImageAnalysisRaw.analysis_result).where(and_(batch_where, fix.fallback_where))
+    )
+    updates = []
+    for row in rows:
+        values = fix.fallback(row.analysis_result)
+        if values:
+            logger.info(f"{'[dry run] ' if dry_run else ''}record {row.id}: set {values}")
+            updates.append(dict(values, id=row.id))
+    if updates and not dry_run:
+        # ORM bulk UPDATE by primary key, sent as one executemany
+        db.session.execute(update(ImageAnalysis), updates)
+    return len(updates)
+
+def run_fix(name: str, dry_run: bool = False, batch_size: int = DEFAULT_BATCH_SIZE, after_id: int = 0,
+            progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Apply one fix to image_analysis in id-ordered batches, committing after each so
+    locks are held briefly. `after_id` resumes from the watermark of an earlier run.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        raise RuntimeError("Maintenance fixes require PostgreSQL")
+    fix = FIXES[name]
+    progress = progress or _log_progress
+
+    changed = 0
+    batches = 0
+    watermark = after_id
+    logger.info(f"{name}: {fix.description}{' (dry run)' if dry_run else ''}")
+    try:
+        while True:
+            ids = db.session.execute(
+                select(ImageAnalysis.id).where(ImageAnalysis.id > watermark).order_by(ImageAnalysis.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            in_batch = and_(ImageAnalysis.id.between(ids[0], ids[-1]), WITH_ANALYSIS)
+
+            if dry_run:
+                changed += _report_changes(fix, and_(in_batch, fix.where))
+            else:
+                result = db.session.execute(
+                    update(ImageAnalysis).where(and_(in_batch, fix.where)).values(fix.values)
+                    .execution_options(synchronize_session=False)
+                )
+                changed += result.rowcount
+            if fix.fallback:
+                changed += _run_fallback(fix, in_batch, dry_run)
+
+            if dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+            watermark = ids[-1]
+            batches += 1
+            progress(name, changed, watermark)
+    except Exception:
+        db.session.rollback()
+        logger.error(f"{name} stopped after id {watermark}; resume with after_id={watermark}")
+        raise
+
+    verb = "would update" if dry_run else "updated"
+    logger.info(f"{name}: {verb} {changed} records in {batches} batches")
+    return {
+        'fix': name,
+        'changed': changed,
+        'batches': batches,
+        'watermark': watermark,
+        'dry_run': dry_run
+    }
+
+def run_fixes(names: Iterable[str], **options) -> List[Dict[str, Any]]:
+    """Run several fixes in order; each starts from the same `after_id`"""
+    return [run_fix(name, **options) for name in names]
+
+def refresh_library_stats() -> bool:
+    """
+    Refresh the orphaned-images materialized view behind get_library_stats. Meant to run
+    every few minutes from cron; returns False when another run holds the refresh lock.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        logger.info("Library statistics are counted live outside PostgreSQL, nothing to refresh")
+        return False
+    refreshed = library_stats.refresh_orphan_stats()
+    if refreshed:
+        logger.info(f"Refreshed {library_stats.ORPHAN_VIEW}")
+    else:
+        logger.info(f"{library_stats.ORPHAN_VIEW} is already being refreshed by another process")
+    return refreshed
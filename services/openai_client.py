@@ -0,0 +1,37 @@
+import os
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Variable names the OpenAI API key has been deployed under, in order of preference
+API_KEY_VARIABLES = ["OPENAI_API_KEY", "OPENAI_KEY", "OPENAI_SECRET_KEY", "OPENAI_TOKEN", "OPENAI_ACCESS_TOKEN",
+                     "OPEN_AI_KEY", "OPEN_AI_API_KEY", "OPENAI", "OPENAI_API"]
+
+_client = None
+
+def find_api_key():
+    """The OpenAI API key from the first known variable that is set, looked up when needed"""
+    for name in API_KEY_VARIABLES:
+        value = os.environ.get(name)
+        if value:
+            if name != "OPENAI_API_KEY":
+                logger.info(f"Using the OpenAI API key from {name}")
+                # Set the standard environment variable for all code to use
+                os.environ["OPENAI_API_KEY"] = value
+            return value
+    return None
+
+def get_openai_client():
+    """The shared OpenAI client; the SDK is imported on first use because it is slow to load"""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        api_key = find_api_key()
+        if not api_key:
+            if os.environ.get("REPLIT_DEPLOYMENT") == "1":
+                logger.error("OpenAI API key not found in deployment environment! Make sure to add it in the Secrets tab of your deployment.")
+            else:
+                logger.warning("OpenAI API key not found. Please add it to your Replit Secrets.")
+        _client = OpenAI(api_key=api_key)
+    return _client
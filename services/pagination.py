@@ -0,0 +1,83 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Upper bound for a single page so a client cannot ask for the whole library at once
+MAX_PER_PAGE = 200
+
+COUNT_MODES = ('exact', 'approx', 'none')
+
+def keyset_page(query, id_column, cursor: Optional[int], per_page: int) -> Tuple[List[Any], Optional[int]]:
+    """
+    Fetch one page ordered by id descending, starting after `cursor` (the last id of the
+    previous page). Uses an index range scan instead of OFFSET, so every page costs the same.
+    Returns the rows and the cursor for the next page (None on the last page).
+    """
+    if cursor is not None:
+        query = query.filter(id_column < cursor)
+    rows = query.order_by(id_column.desc()).limit(per_page + 1).all()
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        return rows, rows[-1].id
+    return rows, None
+
+def offset_page(query, id_column, page: int, per_page: int) -> Tuple[List[Any], Optional[int]]:
+    """Classic page-number pagination for older clients"""
+    rows = query.order_by(id_column.desc()).offset((page - 1) * per_page).limit(per_page + 1).all()
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        return rows, rows[-1].id
+    return rows, None
+
+def table_row_estimate(table_name: str) -> Optional[int]:
+    """Planner statistics for the table size, refreshed by autovacuum/ANALYZE"""
+    estimate = db.session.execute(
+        db.text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+        {'table': table_name}
+    ).scalar()
+    # reltuples is -1 (or 0) for tables that have never been analyzed
+    return estimate if estimate and estimate > 0 else None
+
+def plan_row_estimate(query) -> Optional[int]:
+    """Row estimate from EXPLAIN for a filtered query, without executing it"""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    plan = db.session.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    if isinstance(plan, list) and plan:
+        return int(plan[0]['Plan']['Plan Rows'])
+    return None
+
+def count_rows(query, mode: str, table_name: str, filtered: bool) -> Tuple[Optional[int], bool]:
+    """
+    Count the rows of a listing. Returns (total, is_estimate).
+    'approx' uses pg_class.reltuples for unfiltered listings and the planner estimate
+    otherwise, falling back to an exact count when no estimate is available.
+    """
+    if mode == 'none':
+        return None, False
+    if mode == 'approx' and db.engine.dialect.name == 'postgresql':
+        try:
+            estimate = plan_row_estimate(query) if filtered else table_row_estimate(table_name)
+            if estimate is not None:
+                return estimate, True
+        except Exception as e:
+            logger.warning(f"Could not estimate row count for {table_name}: {str(e)}")
+    return query.order_by(None).count(), False
+
+def pagination_info(page: int, per_page: int, total: Optional[int], is_estimate: bool,
+                    next_cursor: Optional[int]) -> Dict[str, Any]:
+    """Pagination block shared by the listing endpoints"""
+    return {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'total_is_estimate': is_estimate,
+        'pages': (total + per_page - 1) // per_page if total is not None else None,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    }
@@ -0,0 +1,167 @@
+import os
+import re
+import logging
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Tables range-partitioned by month on created_at, and how many months ahead of the
+# current one roll_partitions keeps ready
+MONTHLY_TABLES = ('choice_event', 'story_generation')
+MONTHS_AHEAD = int(os.environ.get("PARTITION_MONTHS_AHEAD", "3"))
+
+def month_bounds(day: date) -> Tuple[date, date]:
+    """Return the first day of the month containing `day` and of the following month"""
+    start = date(day.year, day.month, 1)
+    if start.month == 12:
+        end = date(start.year + 1, 1, 1)
+    else:
+        end = date(start.year, start.month + 1, 1)
+    return start, end
+
+def partition_name(table: str, start: date) -> str:
+    """Name of the monthly partition of `table` starting at `start`"""
+    return f"{table}_{start:%Y_%m}"
+
+def create_default_partition(connection, table: str) -> None:
+    """Create the catch-all DEFAULT partition so inserts never fail for a missing month"""
+    if connection.dialect.name != 'postgresql':
+        return
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"
+    ))
+
+def months_before(day: date, months: int) -> date:
+    """First day of the month `months` months before the one containing `day`"""
+    index = day.year * 12 + day.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+def months_between(first: date, last: date) -> int:
+    """Whole months from the month containing `first` to the one containing `last`"""
+    return (last.year - first.year) * 12 + last.month - first.month
+
+def _exists(connection, name: str) -> bool:
+    return bool(connection.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar())
+
+def _stored_columns(connection, table: str) -> List[str]:
+    """Columns of `table` that can be inserted into, i.e. all but the generated ones"""
+    return connection.execute(text(
+        "SELECT attname FROM pg_attribute WHERE attrelid = CAST(:table AS regclass) "
+        "AND attnum > 0 AND NOT attisdropped AND attgenerated = '' ORDER BY attnum"
+    ), {'table': table}).scalars().all()
+
+def create_monthly_partition(connection, table: str, month_start: date, key: str = 'created_at') -> str:
+    """
+    Create the partition of `table` for the month starting at `month_start` unless it exists.
+    Postgres refuses a partition whose range covers rows in the DEFAULT partition, so rows
+    that landed there while the month had no partition are moved into the new one.
+    """
+    month_start, month_end = month_bounds(month_start)
+    name = partition_name(table, month_start)
+    if _exists(connection, name):
+        attached = connection.execute(text(
+            "SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:name AS regclass) "
+            "AND inhparent = CAST(:table AS regclass)"
+        ), {'name': name, 'table': table}).scalar()
+        if not attached:
+            raise RuntimeError(f"{name} exists but is not a partition of {table}; attach or drop it first")
+        return name
+
+    bounds = f"FOR VALUES FROM ('{month_start.isoformat()}') TO ('{month_end.isoformat()}')"
+    in_month = f"{key} >= '{month_start.isoformat()}' AND {key} < '{month_end.isoformat()}'"
+    default = f"{table}_default"
+    stranded = _exists(connection, default) and connection.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})"
+    )).scalar()
+    if not stranded:
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {bounds}"))
+        return name
+
+    # With the default partition detached its rows move straight between the two tables,
+    # so statement triggers on the parent (the library_stat counters) do not count them again
+    columns = ', '.join(_stored_columns(connection, table))
+    connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    connection.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bounds}"))
+    moved = connection.execute(text(
+        f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {default} WHERE {in_month}"
+    )).rowcount
+    connection.execute(text(f"DELETE FROM {default} WHERE {in_month}"))
+    connection.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    logger.info(f"Created {name} and moved its {moved} rows out of {default}")
+    return name
+
+def ensure_monthly_partitions(connection, table: str, months_ahead: int = 2,
+                              start: Optional[date] = None) -> List[str]:
+    """
+    Create monthly range partitions of `table` from the month containing `start`
+    (today by default) through `months_ahead` months into the future.
+    Returns the names of the partitions that exist afterwards.
+    """
+    if connection.dialect.name != 'postgresql':
+        return []
+
+    month_start, _ = month_bounds(start or datetime.utcnow().date())
+    names = []
+    for _ in range(months_ahead + 1):
+        names.append(create_monthly_partition(connection, table, month_start))
+        _, month_start = month_bounds(month_start)
+
+    logger.debug(f"Ensured partitions for {table}: {', '.join(names)}")
+    return names
+
+def monthly_partitions(connection, table: str) -> List[Tuple[str, date, date]]:
+    """The attached monthly partitions of `table` as (name, start, end), oldest first"""
+    names = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:table AS regclass)"
+    ), {'table': table}).scalars()
+    partitions = []
+    for name in names:
+        match = re.fullmatch(rf'{table}_(\d{{4}})_(\d{{2}})', name)
+        if match:
+            partitions.append((name, *month_bounds(date(int(match.group(1)), int(match.group(2)), 1))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def expired_partitions(connection, table: str, retention_months: int,
+                       today: Optional[date] = None) -> List[Tuple[str, date, date]]:
+    """
+    Monthly partitions of `table` holding only rows older than the retention period:
+    the current month plus the `retention_months` before it are kept
+    """
+    cutoff = months_before(today or datetime.utcnow().date(), retention_months)
+    return [partition for partition in monthly_partitions(connection, table) if partition[2] <= cutoff]
+
+def detach_partition(connection, table: str, name: str, drop: bool = True) -> None:
+    """Detach partition `name` from `table`, dropping it unless `drop` is False"""
+    connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    if drop:
+        connection.execute(text(f"DROP TABLE {name}"))
+
+def roll_partitions(connection, tables: Iterable[str] = MONTHLY_TABLES, months_ahead: int = MONTHS_AHEAD,
+                    key: str = 'created_at') -> Dict[str, List[str]]:
+    """
+    Keep the monthly partitions of `tables` ready: the current month and `months_ahead`
+    after it, plus every month that has rows waiting in the DEFAULT partition (e.g. because
+    this did not run for a while), which are moved into their month. Safe to run any time.
+    """
+    if connection.dialect.name != 'postgresql':
+        return {}
+
+    today = datetime.utcnow().date()
+    rolled = {}
+    for table in tables:
+        if not _exists(connection, table):
+            continue
+        start = today
+        if _exists(connection, f"{table}_default"):
+            oldest = connection.execute(text(f"SELECT min({key}) FROM {table}_default")).scalar()
+            if oldest is not None and oldest.date() < start:
+                start = oldest.date()
+        rolled[table] = ensure_monthly_partitions(connection, table, months_between(start, today) + months_ahead,
+                                                  start=start)
+        logger.info(f"Partitions of {table} are ready through {rolled[table][-1]}")
+    return rolled
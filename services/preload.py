@@ -0,0 +1,77 @@
+import gc
+import random
+import logging
+import importlib
+
+from database import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Imported in the master so workers share the loaded code instead of importing it on first use
+PRELOAD_MODULES = ('requests', 'numpy', 'ollama', 'openai')
+
+def _import_optional(name: str):
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        logger.debug(f"{name} is not installed, skipping preload")
+
+def preload_shared_state(app):
+    """
+    Load read-mostly state once in the gunicorn master, before workers are forked:
+    SDK modules, compiled templates, catalogs, achievement definitions and embedding
+    matrices. Every step is best effort; a worker loads anything missing on first use.
+    """
+    from services.catalog import catalog_mode, get_catalog
+    from services.local_story_maker import get_story_options
+
+    for name in PRELOAD_MODULES:
+        _import_optional(name)
+
+    get_story_options()
+    for template in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template)
+
+    if catalog_mode():
+        for kind in ('character', 'scene'):
+            get_catalog(kind)
+    else:
+        with app.app_context():
+            try:
+                from services.achievement_engine import engine as achievement_engine
+                achievement_engine.all()
+
+                from services.embedding_index import index, is_available
+                if is_available():
+                    for kind in ('character', 'scene'):
+                        index.warm(kind)
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Preloading database-backed state failed, workers will load it lazily: {str(e)}")
+            finally:
+                db.session.remove()
+                # Connections must not be shared with the workers
+                for engine in db.engines.values():
+                    engine.dispose()
+
+    # Move everything allocated so far out of the collector's reach, so collections in the
+    # workers do not write to (and un-share) these pages
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded shared state, {gc.get_freeze_count()} objects frozen")
+
+def reset_after_fork(app):
+    """Re-create what must not be shared across processes, in each newly forked worker"""
+    with app.app_context():
+        # Drop the parent's pooled connections without closing them under the parent
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    from services import embedding_index, local_llm_service, openai_client
+    local_llm_service.local_llm_service = None
+    embedding_index._ollama_client = None
+    openai_client._client = None
+
+    # Forked workers would otherwise draw the same "random" characters and scenes
+    random.seed()
@@ -0,0 +1,138 @@
+"""
+Read models for the hot image endpoints: column-projected Core selects, built once at
+import with bound parameters, returning slotted dataclasses instead of ORM objects.
+Only the endpoints that return parts of the analysis join image_analysis_raw, and orjson serializes
+lists of these DTOs straight to JSON (api.response_encoding.dumps_json) without an
+intermediate dict per row.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, func, literal_column, select
+
+from database import db
+from models import ImageAnalysis, ImageAnalysisRaw
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Stored JSON arrays may be NULL; the endpoints have always answered with []
+_EMPTY_ARRAY = literal_column("'[]'")
+
+@dataclass(slots=True)
+class CharacterCard:
+    """A character on the story page (index)"""
+    id: int
+    image_url: str
+    name: str
+    style: str
+    story: str
+    character_traits: List[str]
+    plot_lines: List[str]
+
+@dataclass(slots=True)
+class CharacterSummary:
+    """A character in the Unity character list; field names are the response keys"""
+    id: int
+    name: Optional[str]
+    image_url: str
+    traits: Optional[List[str]]
+    role: Optional[str]
+    plot_lines: Optional[List[str]]
+
+@dataclass(slots=True)
+class RandomCharacter:
+    """/api/random_character"""
+    id: int
+    image_url: str
+    name: str
+    style: str
+    character_traits: List[str]
+
+@dataclass(slots=True)
+class ImageDetail:
+    """/api/image/<id>"""
+    id: int
+    image_url: str
+    image_type: Optional[str]
+    analysis: Optional[Dict[str, Any]]
+    created_at: Optional[str]
+
+# Table columns rather than ORM attributes, so the selects run without the ORM's compile step
+images = ImageAnalysis.__table__.c
+raw = ImageAnalysisRaw.__table__.c
+with_raw = ImageAnalysis.__table__.outerjoin(ImageAnalysisRaw.__table__, raw.image_id == images.id)
+
+CARD_COLUMNS = (
+    images.id,
+    images.image_url,
+    func.coalesce(images.character_name, ''),
+    func.coalesce(raw.analysis_result['style'].as_string(), ''),
+    func.coalesce(raw.analysis_result['story'].as_string(), ''),
+    func.coalesce(images.character_traits, _EMPTY_ARRAY),
+    func.coalesce(images.plot_lines, _EMPTY_ARRAY)
+)
+
+SUMMARY_COLUMNS = (
+    images.id,
+    images.character_name,
+    images.image_url,
+    images.character_traits,
+    images.character_role,
+    images.plot_lines
+)
+
+RANDOM_COLUMNS = (
+    images.id,
+    images.image_url,
+    func.coalesce(images.character_name, ''),
+    func.coalesce(raw.analysis_result['style'].as_string(), ''),
+    func.coalesce(images.character_traits, _EMPTY_ARRAY)
+)
+
+DETAIL_COLUMNS = (
+    images.id,
+    images.image_url,
+    images.image_type,
+    raw.analysis_result,
+    images.created_at
+)
+
+# Statements are built once; SQLAlchemy's compiled cache then reuses their SQL, and each
+# call only binds parameters. Only ids are shuffled for the random picks (an index-only
+# scan of ix_image_analysis_type_id), so JSON fields are extracted for the chosen rows alone.
+_random_character_ids = select(images.id).where(images.image_type == 'character')\
+    .order_by(func.random()).limit(bindparam('limit'))
+
+RANDOM_CARDS = select(*CARD_COLUMNS).select_from(with_raw).where(images.id.in_(_random_character_ids.scalar_subquery()))
+CHARACTER_SUMMARIES = select(*SUMMARY_COLUMNS).where(images.image_type == 'character').order_by(images.id)
+RANDOM_CHARACTER = select(*RANDOM_COLUMNS).select_from(with_raw).where(images.id.in_(_random_character_ids.scalar_subquery()))
+IMAGE_DETAIL = select(*DETAIL_COLUMNS).select_from(with_raw).where(images.id == bindparam('image_id'))
+
+def random_character_cards(limit: int) -> List[CharacterCard]:
+    """`limit` random characters for the story page"""
+    return [CharacterCard(*row) for row in db.session.execute(RANDOM_CARDS, {'limit': limit})]
+
+def character_summaries() -> List[CharacterSummary]:
+    """Every character, in id order"""
+    return [CharacterSummary(*row) for row in db.session.execute(CHARACTER_SUMMARIES)]
+
+def random_character() -> Optional[RandomCharacter]:
+    """One random character, or None when there are none"""
+    row = db.session.execute(RANDOM_CHARACTER, {'limit': 1}).first()
+    return RandomCharacter(*row) if row else None
+
+def image_detail(image_id: int) -> Optional[ImageDetail]:
+    """One image with its full analysis, or None"""
+    row = db.session.execute(IMAGE_DETAIL, {'image_id': image_id}).first()
+    if row is None:
+        return None
+    created_at: Optional[datetime] = row[4]
+    return ImageDetail(row[0], row[1], row[2], row[3],
+                       created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else None)
+
+def fields(dto) -> Dict[str, Any]:
+    """A DTO's fields as a dict, for responses that add envelope keys next to them"""
+    return {name: getattr(dto, name) for name in dto.__slots__}
@@ -0,0 +1,124 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from database import db
+from models import ImageAnalysis, StoryGeneration
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SEARCH_KINDS = ('character', 'scene', 'story')
+
+def like_pattern(term: str) -> str:
+    """A `%term%` pattern for ilike(..., escape='\\') that matches `%`, `_` and `\\` literally"""
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def _is_postgres() -> bool:
+    return db.engine.dialect.name == 'postgresql'
+
+def _query_vector(term: str):
+    return db.func.websearch_to_tsquery('english', term)
+
+def search_images(term: str, image_types: Iterable[str], limit: int = 20) -> List[Dict[str, Any]]:
+    """Ranked full-text search over characters and scenes, with fuzzy matching on names"""
+    image_types = list(image_types)
+    columns = (
+        ImageAnalysis.id,
+        ImageAnalysis.image_url,
+        ImageAnalysis.image_type,
+        ImageAnalysis.character_name,
+        ImageAnalysis.setting,
+        ImageAnalysis.created_at
+    )
+
+    if _is_postgres():
+        query_vector = _query_vector(term)
+        text_rank = db.func.ts_rank_cd(ImageAnalysis.search_vector, query_vector)
+        name_similarity = db.func.coalesce(db.func.similarity(ImageAnalysis.character_name, term), 0)
+        score = db.func.greatest(text_rank, name_similarity)
+        query = db.session.query(*columns, score.label('score'))\
+            .filter(db.or_(
+                ImageAnalysis.search_vector.op('@@')(query_vector),
+                ImageAnalysis.character_name.op('%')(term)
+            ))\
+            .order_by(score.desc(), ImageAnalysis.id.desc())
+    else:
+        # Development fallback without the Postgres search columns
+        query = db.session.query(*columns, db.literal(1.0).label('score'))\
+            .filter(ImageAnalysis.character_name.ilike(like_pattern(term), escape='\\'))\
+            .order_by(ImageAnalysis.id.desc())
+
+    if image_types:
+        query = query.filter(ImageAnalysis.image_type.in_(image_types))
+
+    return [{
+        'kind': row.image_type,
+        'id': row.id,
+        'image_url': row.image_url,
+        'image_type': row.image_type,
+        'name': row.character_name or row.setting or '',
+        'created_at': row.created_at.strftime('%Y-%m-%d %H:%M') if row.created_at else None,
+        'score': round(float(row.score or 0), 4)
+    } for row in query.limit(limit)]
+
+def search_stories(term: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Ranked full-text search over story parameters and story text"""
+    columns = (
+        StoryGeneration.id,
+        StoryGeneration.primary_conflict,
+        StoryGeneration.setting,
+        StoryGeneration.created_at
+    )
+
+    if _is_postgres():
+        query_vector = _query_vector(term)
+        score = db.func.ts_rank_cd(StoryGeneration.search_vector, query_vector)
+        query = db.session.query(*columns, score.label('score'))\
+            .filter(StoryGeneration.search_vector.op('@@')(query_vector))\
+            .order_by(score.desc(), StoryGeneration.id.desc())
+    else:
+        query = db.session.query(*columns, db.literal(1.0).label('score'))\
+            .filter(db.or_(
+                StoryGeneration.primary_conflict.ilike(like_pattern(term), escape='\\'),
+                StoryGeneration.setting.ilike(like_pattern(term), escape='\\')
+            ))\
+            .order_by(StoryGeneration.id.desc())
+
+    return [{
+        'kind': 'story',
+        'id': row.id,
+        'conflict': row.primary_conflict,
+        'setting': row.setting,
+        'created_at': row.created_at.strftime('%Y-%m-%d %H:%M') if row.created_at else None,
+        'score': round(float(row.score or 0), 4)
+    } for row in query.limit(limit)]
+
+def search_library(term: str, kinds: Optional[Iterable[str]] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """Search characters, scenes and stories, returning results ordered by score"""
+    kinds = [kind for kind in (kinds or SEARCH_KINDS) if kind in SEARCH_KINDS]
+    results = []
+
+    image_types = [kind for kind in kinds if kind != 'story']
+    if image_types:
+        results.extend(search_images(term, image_types, limit))
+    if 'story' in kinds:
+        results.extend(search_stories(term, limit))
+
+    results.sort(key=lambda result: result['score'], reverse=True)
+    return results[:limit]
+
+def find_character_by_name(name: str) -> Optional[ImageAnalysis]:
+    """Best fuzzy match for a character name, tolerant of typos and partial names"""
+    query = ImageAnalysis.query.filter(ImageAnalysis.image_type == 'character')
+
+    if _is_postgres():
+        # The % operator matches above pg_trgm.similarity_threshold and uses the trigram index
+        similarity = db.func.similarity(ImageAnalysis.character_name, name)
+        return query.filter(db.or_(
+                ImageAnalysis.character_name.op('%')(name),
+                ImageAnalysis.character_name.ilike(like_pattern(name), escape='\\')
+            ))\
+            .order_by(similarity.desc())\
+            .first()
+
+    return query.filter(ImageAnalysis.character_name.ilike(like_pattern(name), escape='\\')).first()
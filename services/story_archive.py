@@ -0,0 +1,236 @@
+import os
+import gzip
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import db
+from models import ImageAnalysis, StoryGeneration, story_images
+from services import library_stats
+from services.bulk_ops import ARCHIVE_DIR
+from services.importer import read_ndjson
+from services.partitions import (create_monthly_partition, detach_partition, expired_partitions, month_bounds,
+                                 roll_partitions)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+STORY_TABLE = StoryGeneration.__tablename__
+
+# Months of stories kept in the database besides the current one; older monthly
+# partitions are archived to files and dropped
+RETENTION_MONTHS = int(os.environ.get("STORY_RETENTION_MONTHS", "12"))
+
+STORY_ARCHIVE_DIR = os.environ.get("STORY_ARCHIVE_DIR", os.path.join(ARCHIVE_DIR, "stories"))
+
+# Rows fetched per round trip while archiving, and inserted per statement while restoring
+ARCHIVE_BATCH_SIZE = 500
+
+FORMATS = ('ndjson', 'parquet')
+EXTENSIONS = {'ndjson': '.ndjson.gz', 'parquet': '.parquet'}
+
+# Every stored column; search_vector is generated again on restore
+COLUMNS = [column.name for column in StoryGeneration.__table__.columns if column.name != 'search_vector']
+
+def _parquet_schema():
+    return pa.schema([
+        ('id', pa.int64()),
+        ('primary_conflict', pa.string()),
+        ('setting', pa.string()),
+        ('narrative_style', pa.string()),
+        ('mood', pa.string()),
+        ('generated_story', pa.string()),  # JSON text
+        ('created_at', pa.timestamp('us')),
+        ('image_ids', pa.list_(pa.int64())),
+    ])
+
+def archive_path(partition: str, file_format: str = 'ndjson', directory: Optional[str] = None) -> str:
+    return os.path.join(directory or STORY_ARCHIVE_DIR, partition + EXTENSIONS[file_format])
+
+def _stream_partition(connection, partition: str) -> Iterator[Dict[str, Any]]:
+    """The stories of one partition in id order, each with the ids of its images"""
+    result = connection.execution_options(stream_results=True, yield_per=ARCHIVE_BATCH_SIZE).execute(text(
+        f"SELECT {', '.join('s.' + column for column in COLUMNS)}, "
+        f"ARRAY(SELECT si.image_id FROM story_images si WHERE si.story_id = s.id ORDER BY si.image_id) AS image_ids "
+        f"FROM {partition} s ORDER BY s.id"
+    ))
+    for row in result.mappings():
+        yield dict(row)
+
+def _write_ndjson(path: str, records: Iterator[Dict[str, Any]]) -> int:
+    written = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as archive:
+        for record in records:
+            record['created_at'] = record['created_at'].isoformat()
+            archive.write(json.dumps(record, default=str) + '\n')
+            written += 1
+    return written
+
+def _write_parquet(path: str, records: Iterator[Dict[str, Any]]) -> int:
+    if pa is None:
+        raise RuntimeError("pyarrow is required for Parquet archives")
+    schema = _parquet_schema()
+    written = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        batch = []
+        for record in records:
+            if record['generated_story'] is not None:
+                record['generated_story'] = json.dumps(record['generated_story'])
+            batch.append(record)
+            if len(batch) >= ARCHIVE_BATCH_SIZE:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                written += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            written += len(batch)
+    return written
+
+WRITERS = {'ndjson': _write_ndjson, 'parquet': _write_parquet}
+
+def archive_partition(partition: str, file_format: str = 'ndjson', directory: Optional[str] = None,
+                      drop: bool = True) -> Dict[str, Any]:
+    """
+    Write one monthly partition to a compressed file, then detach it (and drop it unless
+    `drop` is False) along with its story_images links, all in one transaction. The
+    partition is locked against writes while it is read, so the file holds exactly the
+    rows removed; a failure leaves the partition attached and the run can be repeated.
+    """
+    path = archive_path(partition, file_format, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + '.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    with db.engine.begin() as connection:
+        connection.execute(text(f"LOCK TABLE {partition} IN SHARE MODE"))
+        try:
+            archived = WRITERS[file_format](partial, _stream_partition(connection, partition))
+        except Exception:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        os.replace(partial, path)
+
+        links = connection.execute(text(
+            f"DELETE FROM story_images si USING {partition} s WHERE si.story_id = s.id"
+        )).rowcount
+        # Detaching fires no DELETE trigger, so the story counters are adjusted here
+        library_stats.remove_rows(connection, STORY_TABLE, partition)
+        detach_partition(connection, STORY_TABLE, partition, drop=drop)
+
+    logger.info(f"Archived {archived} stories from {partition} to {path}"
+                f"{'' if drop else f' and kept {partition} as a detached table'}")
+    return {
+        'partition': partition,
+        'stories': archived,
+        'links': links,
+        'archive': path,
+        'dropped': drop
+    }
+
+def apply_retention(retention_months: int = RETENTION_MONTHS, file_format: str = 'ndjson',
+                    directory: Optional[str] = None, drop: bool = True, dry_run: bool = False,
+                    today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """
+    Archive every monthly partition older than the retention period, oldest first. Stories
+    stranded in the DEFAULT partition are first moved into their months (roll_partitions),
+    so they are archived like the rest.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        raise RuntimeError("Story archiving requires PostgreSQL")
+
+    with db.engine.begin() as connection:
+        roll_partitions(connection, (STORY_TABLE,))
+        expired = expired_partitions(connection, STORY_TABLE, retention_months, today)
+
+    results = []
+    for partition, start, end in expired:
+        if dry_run:
+            logger.info(f"[dry run] would archive {partition} ({start} to {end})")
+            results.append({'partition': partition, 'archive': archive_path(partition, file_format, directory),
+                            'dry_run': True})
+        else:
+            results.append(archive_partition(partition, file_format, directory, drop))
+    return results
+
+def _read_parquet(path: str) -> Iterator[Dict[str, Any]]:
+    if pq is None:
+        raise RuntimeError("pyarrow is required for Parquet archives")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=ARCHIVE_BATCH_SIZE):
+        for record in batch.to_pylist():
+            if record['generated_story'] is not None:
+                record['generated_story'] = json.loads(record['generated_story'])
+            yield record
+
+def _archive_month(path: str) -> date:
+    """The month an archive file holds, from its story_generation_YYYY_MM name"""
+    name = os.path.basename(path).split('.', 1)[0]
+    try:
+        year, month = name[len(STORY_TABLE) + 1:].split('_')
+        return date(int(year), int(month), 1)
+    except ValueError:
+        raise ValueError(f"{path} is not named like a story archive ({STORY_TABLE}_YYYY_MM)")
+
+def _restore_batch(records: List[Dict[str, Any]]) -> int:
+    stories = [{column: record[column] for column in COLUMNS} for record in records]
+    for story in stories:
+        if isinstance(story['created_at'], str):
+            story['created_at'] = datetime.fromisoformat(story['created_at'])
+    restored = db.session.execute(
+        pg_insert(StoryGeneration.__table__).values(stories).on_conflict_do_nothing()
+    ).rowcount
+
+    # Links to images deleted since the archive was written are skipped
+    wanted = {image_id for record in records for image_id in record['image_ids'] or []}
+    existing = set(db.session.execute(
+        db.select(ImageAnalysis.id).where(ImageAnalysis.id.in_(wanted))
+    ).scalars()) if wanted else set()
+    links = [{'story_id': record['id'], 'image_id': image_id}
+             for record in records for image_id in record['image_ids'] or [] if image_id in existing]
+    if links:
+        db.session.execute(pg_insert(story_images).values(links).on_conflict_do_nothing())
+    return restored
+
+def restore_archive(path: str, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Load an archive file back into story_generation, recreating its monthly partition.
+    Stories already present are left alone, so a restore can be re-run. Returns how
+    many stories were inserted.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        raise RuntimeError("Story restore requires PostgreSQL")
+    month_start, month_end = month_bounds(_archive_month(path))
+    with db.engine.begin() as connection:
+        partition = create_monthly_partition(connection, STORY_TABLE, month_start)
+
+    records = _read_parquet(path) if path.endswith('.parquet') else read_ndjson(path)
+    restored = 0
+    batch = []
+    try:
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                restored += _restore_batch(batch)
+                db.session.commit()
+                batch = []
+        if batch:
+            restored += _restore_batch(batch)
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Restored {restored} stories from {path} into {partition} ({month_start} to {month_end})")
+    return restored
@@ -1,90 +1,11 @@
-import os
 import json
 import logging
 from typing import Dict, List, Tuple, Optional, Any
-from openai import OpenAI
+from services.openai_client import find_api_key, get_openai_client
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Get OpenAI API key from environment variables
-api_key = os.environ.get("OPENAI_API_KEY")
-
-# Debug environment information
-is_deployment = os.environ.get("REPLIT_DEPLOYMENT") == "1"
-logger.info(f"Running in deployment mode: {is_deployment}")
-logger.info(f"Environment variables available: {', '.join(list(os.environ.keys()))}")
-
-# Debug: Show all environment variables that contain "sk-"
-for env_var, value in os.environ.items():
-    if isinstance(value, str) and value.startswith("sk-"):
-        logger.info(f"Found API key in {env_var}: {value[:10]}...{value[-4:]}")
-
-# Debug: Show OPENAI_API_KEY specifically
-openai_key = os.environ.get("OPENAI_API_KEY")
-if openai_key:
-    logger.info(f"OPENAI_API_KEY found: {openai_key[:10]}...{openai_key[-4:]}")
-else:
-    logger.info("OPENAI_API_KEY not found")
-
-if not api_key:
-    if is_deployment:
-        logger.error("OpenAI API key not found in deployment environment! Make sure to add it in the Secrets tab of your deployment.")
-    else:
-        logger.warning("OpenAI API key not found. Please add it to your Replit Secrets.")
-    
-    # Check for alternative environment variable names that might be used in deployment
-    potential_keys = ["OPENAI_KEY", "OPENAI_SECRET_KEY", "OPENAI_TOKEN", "OPENAI_ACCESS_TOKEN", 
-                     "OPEN_AI_KEY", "OPEN_AI_API_KEY", "OPENAI", "OPENAI_API"]
-    
-    for key_name in potential_keys:
-        potential_key = os.environ.get(key_name)
-        if potential_key:
-            logger.info(f"Found alternative API key environment variable: {key_name}")
-            api_key = potential_key
-            # Set the standard environment variable for all code to use
-            os.environ["OPENAI_API_KEY"] = potential_key
-            break
-    
-    # Force check if API key starts with "sk-" pattern
-    for env_var, value in os.environ.items():
-        if isinstance(value, str) and value.startswith("sk-") and "OPENAI" not in env_var:
-            logger.info(f"Found potential API key in unexpected variable: {env_var}")
-            api_key = value
-            os.environ["OPENAI_API_KEY"] = value
-            break
-
-# Initialize OpenAI client only when needed
-client = None
-
-def get_openai_client():
-    """Get or initialize OpenAI client with proper API key handling"""
-    global client, api_key
-    
-    if client is not None:
-        return client
-        
-    # If no API key was found during module initialization, try one more time
-    if not api_key:
-        # Check for environment variables again (might have been set after import)
-        api_key = os.environ.get("OPENAI_API_KEY")
-        
-        # Check common alternate names used in deployments
-        if not api_key:
-            potential_keys = ["OPENAI_KEY", "OPENAI_SECRET_KEY", "OPENAI_TOKEN", "OPENAI_ACCESS_TOKEN"]
-            for key_name in potential_keys:
-                potential_key = os.environ.get(key_name)
-                if potential_key:
-                    logger.info(f"Found alternative API key: {key_name}")
-                    api_key = potential_key
-                    # Set the standard environment variable for consistency
-                    os.environ["OPENAI_API_KEY"] = api_key
-                    break
-    
-    # Create the client with whatever key we have (might be None)
-    client = OpenAI(api_key=api_key)
-    return client
-
 # Default story options
 STORY_OPTIONS = {
     "conflicts": [
@@ -131,7 +52,7 @@ def generate_story(
     additional_characters: Optional[List[Dict[str, Any]]] = None
 ) -> Dict[str, Any]:
     """Generate a story based on selected or custom parameters and character info"""
-    if not api_key:
+    if not find_api_key():
         raise ValueError("OpenAI API key not found. Please add it to your environment variables.")
 
     # Use custom values if provided, otherwise use selected options
@@ -66,6 +66,9 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentImageFilter = '';
     let currentImageSearch = '';
     let currentStorySearch = '';
+    // Keyset cursors: cursors[n - 1] is the cursor that loads page n ('' for the first page)
+    let imageCursors = [''];
+    let storyCursors = [''];
     
     // Show notification toast
     function showNotification(title, message, isError = false) {
@@ -754,10 +757,19 @@ document.addEventListener('DOMContentLoaded', function() {
             </tr>
         `;
         
-        let url = `/api/images/all?page=${page}&per_page=20`;
+        if (page === 1) imageCursors = [''];
+        const cursor = imageCursors[page - 1];
+        let url = `/api/images/all?per_page=20&count=approx`;
+        url += cursor !== undefined && cursor !== null ? `&cursor=${cursor}` : `&page=${page}`;
         if (filter) url += `&type=${filter}`;
         if (search) url += `&search=${encodeURIComponent(search)}`;
         
+        // Free-text searches go through the ranked search index instead of the listing
+        const useSearchIndex = search && !/^\d+$/.test(search);
+        if (useSearchIndex) {
+            url = `/api/search?q=${encodeURIComponent(search)}&type=${filter || 'character,scene'}&limit=50`;
+        }
+        
         fetch(url)
             .then(response => response.json())
             .then(data => {
@@ -766,6 +778,10 @@ document.addEventListener('DOMContentLoaded', function() {
                     return;
                 }
                 
+                if (useSearchIndex) {
+                    data = { images: data.results, pagination: null };
+                }
+                
                 if (data.images.length === 0) {
                     allImagesTableBody.innerHTML = `
                         <tr>
@@ -802,8 +818,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     `;
                 });
                 
+                // Remember where the next page starts
+                if (data.pagination) imageCursors[page] = data.pagination.next_cursor;
+                
                 // Create pagination controls
-                createImagePagination(data.pagination);
+                createImagePagination(data.pagination, page);
             })
             .catch(error => {
                 allImagesTableBody.innerHTML = `
@@ -815,45 +834,47 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
-    // Create image pagination controls
-    function createImagePagination(pagination) {
+    // Create image pagination controls for `page`, the page that was requested; cursor
+    // requests do not tell the server which page they load
+    function createImagePagination(pagination, page) {
         if (!imagesPagination) return;
         
         imagesPagination.innerHTML = '';
+        if (!pagination) return;  // Search results are ranked, not paginated
         
         // Previous button
         const prevItem = document.createElement('li');
-        prevItem.className = `page-item ${pagination.page <= 1 ? 'disabled' : ''}`;
+        prevItem.className = `page-item ${page <= 1 ? 'disabled' : ''}`;
         
         const prevLink = document.createElement('a');
         prevLink.className = 'page-link';
         prevLink.href = '#';
         prevLink.textContent = 'Previous';
         prevLink.setAttribute('aria-label', 'Previous');
-        if (pagination.page > 1) {
+        if (page > 1) {
             prevLink.addEventListener('click', (e) => {
                 e.preventDefault();
-                loadAllImages(pagination.page - 1, currentImageFilter, currentImageSearch);
+                loadAllImages(page - 1, currentImageFilter, currentImageSearch);
             });
         }
         
         prevItem.appendChild(prevLink);
         imagesPagination.appendChild(prevItem);
         
-        // Page numbers
-        const startPage = Math.max(1, pagination.page - 2);
-        const endPage = Math.min(pagination.pages, pagination.page + 2);
+        // Page numbers (only pages whose keyset cursor is already known)
+        const startPage = Math.max(1, page - 2);
+        const endPage = Math.min(imageCursors.filter(c => c !== null).length, page + 2);
         
         for (let i = startPage; i <= endPage; i++) {
             const pageItem = document.createElement('li');
-            pageItem.className = `page-item ${i === pagination.page ? 'active' : ''}`;
+            pageItem.className = `page-item ${i === page ? 'active' : ''}`;
             
             const pageLink = document.createElement('a');
             pageLink.className = 'page-link';
             pageLink.href = '#';
             pageLink.textContent = i;
             
-            if (i !== pagination.page) {
+            if (i !== page) {
                 pageLink.addEventListener('click', (e) => {
                     e.preventDefault();
                     loadAllImages(i, currentImageFilter, currentImageSearch);
@@ -866,17 +887,17 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Next button
         const nextItem = document.createElement('li');
-        nextItem.className = `page-item ${pagination.page >= pagination.pages ? 'disabled' : ''}`;
+        nextItem.className = `page-item ${!pagination.has_more ? 'disabled' : ''}`;
         
         const nextLink = document.createElement('a');
         nextLink.className = 'page-link';
         nextLink.href = '#';
         nextLink.textContent = 'Next';
         nextLink.setAttribute('aria-label', 'Next');
-        if (pagination.page < pagination.pages) {
+        if (pagination.has_more) {
             nextLink.addEventListener('click', (e) => {
                 e.preventDefault();
-                loadAllImages(pagination.page + 1, currentImageFilter, currentImageSearch);
+                loadAllImages(page + 1, currentImageFilter, currentImageSearch);
             });
         }
         
@@ -933,7 +954,10 @@ document.addEventListener('DOMContentLoaded', function() {
             </tr>
         `;
         
-        let url = `/api/stories/all?page=${page}&per_page=20`;
+        if (page === 1) storyCursors = [''];
+        const cursor = storyCursors[page - 1];
+        let url = `/api/stories/all?per_page=20&count=approx`;
+        url += cursor !== undefined && cursor !== null ? `&cursor=${cursor}` : `&page=${page}`;
         if (search) url += `&search=${encodeURIComponent(search)}`;
         
         fetch(url)
@@ -981,8 +1005,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     `;
                 });
                 
+                // Remember where the next page starts
+                storyCursors[page] = data.pagination.next_cursor;
+                
                 // Create pagination controls
-                createStoryPagination(data.pagination);
+                createStoryPagination(data.pagination, page);
             })
             .catch(error => {
                 allStoriesTableBody.innerHTML = `
@@ -994,45 +1021,45 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
-    // Create story pagination controls
-    function createStoryPagination(pagination) {
+    // Create story pagination controls for `page`, the page that was requested
+    function createStoryPagination(pagination, page) {
         if (!storiesPagination) return;
         
         storiesPagination.innerHTML = '';
         
         // Previous button
         const prevItem = document.createElement('li');
-        prevItem.className = `page-item ${pagination.page <= 1 ? 'disabled' : ''}`;
+        prevItem.className = `page-item ${page <= 1 ? 'disabled' : ''}`;
         
         const prevLink = document.createElement('a');
         prevLink.className = 'page-link';
         prevLink.href = '#';
         prevLink.textContent = 'Previous';
         prevLink.setAttribute('aria-label', 'Previous');
-        if (pagination.page > 1) {
+        if (page > 1) {
             prevLink.addEventListener('click', (e) => {
                 e.preventDefault();
-                loadAllStories(pagination.page - 1, currentStorySearch);
+                loadAllStories(page - 1, currentStorySearch);
             });
         }
         
         prevItem.appendChild(prevLink);
         storiesPagination.appendChild(prevItem);
         
-        // Page numbers
-        const startPage = Math.max(1, pagination.page - 2);
-        const endPage = Math.min(pagination.pages, pagination.page + 2);
+        // Page numbers (only pages whose keyset cursor is already known)
+        const startPage = Math.max(1, page - 2);
+        const endPage = Math.min(storyCursors.filter(c => c !== null).length, page + 2);
         
         for (let i = startPage; i <= endPage; i++) {
             const pageItem = document.createElement('li');
-            pageItem.className = `page-item ${i === pagination.page ? 'active' : ''}`;
+            pageItem.className = `page-item ${i === page ? 'active' : ''}`;
             
             const pageLink = document.createElement('a');
             pageLink.className = 'page-link';
             pageLink.href = '#';
             pageLink.textContent = i;
             
-            if (i !== pagination.page) {
+            if (i !== page) {
                 pageLink.addEventListener('click', (e) => {
                     e.preventDefault();
                     loadAllStories(i, currentStorySearch);
@@ -1045,17 +1072,17 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Next button
         const nextItem = document.createElement('li');
-        nextItem.className = `page-item ${pagination.page >= pagination.pages ? 'disabled' : ''}`;
+        nextItem.className = `page-item ${!pagination.has_more ? 'disabled' : ''}`;
         
         const nextLink = document.createElement('a');
         nextLink.className = 'page-link';
         nextLink.href = '#';
         nextLink.textContent = 'Next';
         nextLink.setAttribute('aria-label', 'Next');
-        if (pagination.page < pagination.pages) {
+        if (pagination.has_more) {
             nextLink.addEventListener('click', (e) => {
                 e.preventDefault();
-                loadAllStories(pagination.page + 1, currentStorySearch);
+                loadAllStories(page + 1, currentStorySearch);
             });
         }
         
@@ -1,43 +1,24 @@
-
-from app import app, db
-from models import ImageAnalysis
-from flask import Flask
+import argparse
 import logging
+from app import app
+from services.maintenance import DEFAULT_BATCH_SIZE, run_fixes
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def update_existing_records():
+def update_existing_records(dry_run=False, batch_size=DEFAULT_BATCH_SIZE, after_id=0):
     """Update existing records to ensure name and plot_lines are properly stored"""
     with app.app_context():
-        # Get all character records
-        characters = ImageAnalysis.query.filter_by(image_type='character').all()
-        count = 0
-        
-        for character in characters:
-            if character.analysis_result:
-                # Extract name and plot_lines from analysis_result
-                name = character.analysis_result.get('name', '')
-                plot_lines = character.analysis_result.get('plot_lines', [])
-                
-                # Update the record if needed
-                if name and not character.character_name:
-                    character.character_name = name
-                    count += 1
-                    logger.info(f"Updating character name for record {character.id} to {name}")
-                
-                if plot_lines and (not character.plot_lines or len(character.plot_lines) == 0):
-                    character.plot_lines = plot_lines
-                    count += 1
-                    logger.info(f"Updating plot_lines for record {character.id}")
-            
-        # Save changes if any were made
-        if count > 0:
-            db.session.commit()
-            logger.info(f"Updated {count} records with name or plot_lines data")
-        else:
-            logger.info("No records needed updating")
+        return run_fixes(['analysis_names', 'plot_lines'], dry_run=dry_run, batch_size=batch_size, after_id=after_id)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill missing character names and plot lines from their analysis")
+    parser.add_argument('--dry-run', action='store_true', help="Report the changes without writing them")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--after-id', type=int, default=0, help="Resume after this id")
+    args = parser.parse_args()
+    update_existing_records(args.dry_run, args.batch_size, args.after_id)
 
 if __name__ == "__main__":
-    update_existing_records()
+    main()